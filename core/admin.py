@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import IdempotencyKey, OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'topic', 'aggregate_type', 'aggregate_id', 'created_at', 'dispatched_at', 'attempts']
+    list_filter = ['topic', 'dispatched_at']
+    search_fields = ['aggregate_id']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'status', 'response_status', 'created_at', 'expires_at']
+    list_filter = ['status']
+    search_fields = ['key', 'user__username']
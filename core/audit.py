@@ -0,0 +1,232 @@
+"""
+Buffered writer for audit rows such as PrescriptionHistory and StaffActivity.
+
+record() collects unsaved rows instead of inserting them one by one:
+
+- inside a transaction each row is held by an on_commit callback, so it is
+  kept once the transaction commits and dropped if the transaction, or the
+  savepoint it was recorded in, rolls back;
+- during a request, kept rows are collected by AuditMiddleware and written
+  with one bulk_create per model once the view has returned, unless it
+  failed with a server error;
+- anywhere else (commands, shell) they are written as soon as they are
+  kept, or when a buffered() block exits.
+
+Rows recorded with the same ``key`` in one buffer are merged, so a write
+path that records the same event twice produces one row.
+
+With settings.AUDIT_SPOOL_DIR set, flushes append the rows to a JSON-lines
+spool file instead of touching the database, and `manage.py drain_audit_spool`
+loads them later in large batches.
+"""
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+_request_buffer = ContextVar('audit_request_buffer', default=None)
+_spool_lock = threading.Lock()
+
+
+def _lock_file(handle):
+    # fcntl is POSIX only; without it, writers in one process are still
+    # serialised by _spool_lock
+    try:
+        import fcntl
+    except ImportError:
+        return
+    fcntl.flock(handle, fcntl.LOCK_EX)
+
+
+class AuditBuffer:
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, model, key, fields):
+        key = (model._meta.label, key if key is not None else object())
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = (model, fields)
+        else:
+            # Keep the first values, filling in anything it left blank
+            for name, value in fields.items():
+                if entry[1].get(name) in (None, ''):
+                    entry[1][name] = value
+
+    def flush(self):
+        entries, self.entries = self.entries, {}
+        if entries:
+            write(list(entries.values()))
+
+
+def _keep(model, key, fields):
+    buffer = _request_buffer.get()
+    if buffer is not None:
+        buffer.add(model, key, fields)
+        return
+    write([(model, fields)])
+
+
+def record(model, key=None, **fields):
+    """
+    Record an audit row, e.g.
+    ``record(PrescriptionHistory, key=(prescription.pk, 'updated'), prescription=prescription, ...)``.
+    """
+    # Stamp the time of the event, not of the flush
+    now = timezone.now()
+    for field in model._meta.concrete_fields:
+        if field.default is timezone.now:
+            fields.setdefault(field.name, now)
+    if connection.in_atomic_block:
+        # Discarded with the savepoint or transaction it was registered in
+        transaction.on_commit(partial(_keep, model, key, fields))
+        return
+    _keep(model, key, fields)
+
+
+@contextmanager
+def buffered():
+    """
+    Collect rows kept in the block and write them when it exits normally.
+    Rows are dropped if the block raises.
+    """
+    buffer = AuditBuffer()
+    token = _request_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _request_buffer.reset(token)
+    buffer.flush()
+
+
+class AuditMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        buffer = AuditBuffer()
+        token = _request_buffer.set(buffer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_buffer.reset(token)
+        # A view that raised reaches here as a 500 response
+        if response.status_code < 500:
+            buffer.flush()
+        return response
+
+
+def write(entries):
+    """
+    Write (model, fields) rows to the spool if one is configured, otherwise
+    with one bulk_create per model.
+    """
+    if getattr(settings, 'AUDIT_SPOOL_DIR', None):
+        spool(entries)
+        return
+    by_model = {}
+    for model, fields in entries:
+        by_model.setdefault(model, []).append(model(**fields))
+    for model, objects in by_model.items():
+        model.objects.bulk_create(objects)
+
+
+def _to_attnames(model, fields):
+    data = {}
+    for name, value in fields.items():
+        field = model._meta.get_field(name)
+        if field.is_relation and not field.many_to_many:
+            data[field.attname] = value.pk if hasattr(value, 'pk') else value
+        else:
+            data[field.attname] = value
+    return data
+
+
+def spool_path():
+    return os.path.join(settings.AUDIT_SPOOL_DIR, f'audit-{socket.gethostname()}-{os.getpid()}.jsonl')
+
+
+def spool(entries):
+    lines = ''.join(
+        json.dumps(
+            {'model': model._meta.label, 'fields': _to_attnames(model, fields)},
+            cls=DjangoJSONEncoder, separators=(',', ':')
+        ) + '\n'
+        for model, fields in entries
+    )
+    path = spool_path()
+    os.makedirs(settings.AUDIT_SPOOL_DIR, exist_ok=True)
+    with _spool_lock:
+        while True:
+            handle = open(path, 'a', encoding='utf-8')
+            _lock_file(handle)
+            # drain_spool() may have renamed the file between open and lock
+            try:
+                same_file = os.fstat(handle.fileno()).st_ino == os.stat(path).st_ino
+            except FileNotFoundError:
+                same_file = False
+            if same_file:
+                break
+            handle.close()
+        try:
+            handle.write(lines)
+            handle.flush()
+            if getattr(settings, 'AUDIT_SPOOL_FSYNC', True):
+                os.fsync(handle.fileno())
+        finally:
+            handle.close()
+
+
+def _load(path, batch_size):
+    by_model = {}
+    with open(path, encoding='utf-8') as handle:
+        _lock_file(handle)
+        for line in handle:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            model = apps.get_model(entry['model'])
+            fields = entry['fields']
+            for field in model._meta.concrete_fields:
+                if field.get_internal_type() == 'DateTimeField' and isinstance(fields.get(field.attname), str):
+                    fields[field.attname] = parse_datetime(fields[field.attname])
+            by_model.setdefault(model, []).append(model(**fields))
+    with transaction.atomic():
+        for model, objects in by_model.items():
+            model.objects.bulk_create(objects, batch_size=batch_size)
+    return sum(len(objects) for objects in by_model.values())
+
+
+def drain_spool(batch_size=1000):
+    """
+    Load every spool file into the database. Each file is renamed before it
+    is read so writers start a new one, and deleted once its rows are
+    committed; a file left over from a failed drain is picked up next time.
+    Returns the number of rows written.
+    """
+    directory = settings.AUDIT_SPOOL_DIR
+    if not directory or not os.path.isdir(directory):
+        return 0
+    loaded = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith('.jsonl'):
+            draining = f'{path}.{timezone.now():%Y%m%d%H%M%S%f}.draining'
+            os.rename(path, draining)
+        elif name.endswith('.draining'):
+            draining = path
+        else:
+            continue
+        loaded += _load(draining, batch_size)
+        os.remove(draining)
+    return loaded
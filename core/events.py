@@ -0,0 +1,207 @@
+"""
+Database-backed broadcaster for change events pushed to clients over SSE
+(core/sse.py). Events are published from synchronous Django code as
+StreamEvent rows, so writes handled by any process (WSGI or ASGI workers,
+management commands) reach every stream.
+
+Each process serving streams runs one poller while it has subscribers. It
+reads new rows every EVENT_STREAM_POLL_INTERVAL seconds and delivers them to
+the asyncio queues of its streams. Rows are published once their
+transaction commits, but ids are handed out at insert time, so a missing id
+may still be committing: the poller waits up to EVENT_STREAM_GAP_TIMEOUT
+seconds for it before moving on. Old rows are removed by
+`manage.py purge_stream_events`.
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import StreamEvent
+
+STOCK_ROLES = ('admin', 'pharmacist')
+PHARMACIST_PRESCRIPTION_STATUSES = ('active', 'pending')
+
+
+class Event:
+    __slots__ = ('id', 'type', 'data', 'audience')
+
+    def __init__(self, id, type, data, audience):
+        self.id = id
+        self.type = type
+        self.data = data
+        # Server-side only: what the role filter needs to know about the event
+        self.audience = audience
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.type, row.data, row.audience)
+
+
+def can_receive(event, user_id, role):
+    """
+    Mirror the list filtering of the REST endpoints: stock events go to
+    admins and pharmacists, doctors see their own prescriptions and
+    pharmacists see prescriptions that are (or just stopped being) active
+    or pending.
+    """
+    if role == 'admin':
+        return True
+    audience = event.audience
+    if audience.get('kind') == 'stock':
+        return role in STOCK_ROLES
+    if audience.get('kind') == 'prescription':
+        if role == 'doctor':
+            return audience.get('prescribed_by_id') == user_id
+        if role == 'pharmacist':
+            return any(
+                value in PHARMACIST_PRESCRIPTION_STATUSES for value in audience.get('statuses', ())
+            )
+    return False
+
+
+class Subscriber:
+    def __init__(self, queue, user_id, role):
+        self.queue = queue
+        self.user_id = user_id
+        self.role = role
+        # Set when the client fell too far behind; the stream then closes so
+        # the client reconnects and resumes from Last-Event-ID
+        self.overflowed = False
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            return
+        self.queue.put_nowait(event)
+
+
+def poll_interval():
+    return getattr(settings, 'EVENT_STREAM_POLL_INTERVAL', 1)
+
+
+def gap_timeout():
+    return getattr(settings, 'EVENT_STREAM_GAP_TIMEOUT', 5)
+
+
+class Broadcaster:
+    def __init__(self, history_size):
+        self.history_size = history_size
+        self._lock = asyncio.Lock()
+        self._subscribers = set()
+        self._task = None
+        # Id of the last event handed to the subscribers
+        self._cursor = None
+        self._gap_seen_at = None
+
+    async def subscribe(self, queue, user_id, role):
+        async with self._lock:
+            if self._task is None:
+                # Streams only receive events published from now on; older
+                # ones are replayed through since()
+                self._cursor = await sync_to_async(newest_event_id)()
+                self._gap_seen_at = None
+                self._task = asyncio.ensure_future(self._run())
+            subscriber = Subscriber(queue, user_id, role)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        # The poller stops once the last subscriber has gone
+        self._subscribers.discard(subscriber)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                await asyncio.sleep(poll_interval())
+                try:
+                    events = await sync_to_async(self.poll)()
+                except DatabaseError:
+                    # Try again on the next tick
+                    continue
+                for event in events:
+                    for subscriber in list(self._subscribers):
+                        if can_receive(event, subscriber.user_id, subscriber.role):
+                            subscriber.deliver(event)
+        finally:
+            self._task = None
+
+    def poll(self):
+        """
+        Events published after the cursor, in id order, stopping at a missing
+        id until it turns up or EVENT_STREAM_GAP_TIMEOUT has passed.
+        """
+        close_old_connections()
+        events = []
+        for row in StreamEvent.objects.filter(id__gt=self._cursor).order_by('id')[:self.history_size]:
+            if row.id > self._cursor + 1:
+                if self._gap_seen_at is None:
+                    self._gap_seen_at = time.monotonic()
+                if time.monotonic() - self._gap_seen_at < gap_timeout():
+                    break
+            self._gap_seen_at = None
+            self._cursor = row.id
+            events.append(Event.from_row(row))
+        return events
+
+    def since(self, last_id, subscriber):
+        """
+        Events after ``last_id``, up to the last one handed to the
+        subscribers, that the subscriber may receive. Returns None when more
+        than history_size were missed, when the rows after ``last_id`` have
+        been purged, or when ``last_id`` is newer than any event (the table
+        was reset).
+        """
+        bounds = StreamEvent.objects.aggregate(oldest=Min('id'), newest=Max('id'))
+        newest = bounds['newest'] or 0
+        if last_id > newest or (bounds['oldest'] is not None and bounds['oldest'] > last_id + 1):
+            return None
+        upto = self._cursor if self._cursor is not None else newest
+        rows = list(
+            StreamEvent.objects.filter(id__gt=last_id, id__lte=upto).order_by('id')[:self.history_size + 1]
+        )
+        if len(rows) > self.history_size:
+            return None
+        events = [Event.from_row(row) for row in rows]
+        return [event for event in events if can_receive(event, subscriber.user_id, subscriber.role)]
+
+
+broadcaster = Broadcaster(getattr(settings, 'EVENT_STREAM_HISTORY_SIZE', 1000))
+
+
+def newest_event_id():
+    return StreamEvent.objects.aggregate(newest=Max('id'))['newest'] or 0
+
+
+def publish(type, data, audience):
+    return Event.from_row(StreamEvent.objects.create(type=type, data=data, audience=audience))
+
+
+def publish_on_commit(type, data, audience):
+    """
+    Publish once the surrounding transaction commits, so clients never see
+    changes that were rolled back.
+    """
+    transaction.on_commit(lambda: publish(type, data, audience))
+
+
+def purge_events(batch_size=1000):
+    """
+    Delete events older than EVENT_STREAM_RETENTION seconds in batches.
+    Returns the number deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'EVENT_STREAM_RETENTION', 60 * 60))
+    deleted = 0
+    while True:
+        ids = list(StreamEvent.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        count, _ = StreamEvent.objects.filter(id__in=ids).delete()
+        deleted += count
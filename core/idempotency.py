@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that may retry a request sends the same Idempotency-Key header on
+every attempt. The first attempt claims the key by inserting a row, relying
+on the (user, key) unique constraint rather than a lock, so that of two
+concurrent duplicates exactly one runs the view. Its response is stored in
+the same transaction as the view's writes and replayed for later attempts
+without running the view again.
+
+Responses that are worth retrying (5xx and 409) are not stored: their writes
+are rolled back and the key is released. A key left in processing by a
+request that died is taken over after IDEMPOTENCY_PROCESSING_TIMEOUT; this is
+safe because the dead request's writes were rolled back with its transaction.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def processing_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_PROCESSING_TIMEOUT', 60))
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(user, key, request_hash):
+    """
+    Insert the key for this request. Returns (record, created); record is
+    None if the key kept disappearing under us.
+    """
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=request_hash,
+                    locked_at=now, expires_at=now + key_ttl(),
+                ), True
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            continue
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+        return record, False
+    return None, False
+
+
+def _take_over(record):
+    """
+    Claim a key stuck in processing. Compare-and-swap on locked_at so only one
+    retry wins, and so the original request, should it still be running,
+    finds it no longer owns the key and rolls back.
+    """
+    now = timezone.now()
+    if record.locked_at > now - processing_timeout():
+        return False
+    claimed = IdempotencyKey.objects.filter(
+        pk=record.pk, status='processing', locked_at=record.locked_at
+    ).update(locked_at=now)
+    if claimed:
+        record.locked_at = now
+    return claimed == 1
+
+
+def _in_progress():
+    return Response(
+        {'error': 'A request with this Idempotency-Key is still being processed'},
+        status=status.HTTP_409_CONFLICT,
+        headers={'Retry-After': '1'},
+    )
+
+
+def _replay(record):
+    return Response(record.response_body, status=record.response_status, headers={REPLAYED_HEADER: 'true'})
+
+
+def _is_final(response):
+    return (
+        hasattr(response, 'data')
+        and response.status_code < 500
+        and response.status_code != status.HTTP_409_CONFLICT
+    )
+
+
+def idempotent(view):
+    """
+    Make a DRF view function or viewset action honour the Idempotency-Key
+    header. Requests without the header are not affected.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {'error': f'{HEADER} must be at most 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_hash = request_fingerprint(request)
+        record, created = _claim(request.user, key, request_hash)
+        if not created:
+            if record is None:
+                return _in_progress()
+            if record.request_hash != request_hash:
+                return Response(
+                    {'error': f'{HEADER} has already been used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status == 'completed':
+                return _replay(record)
+            if not _take_over(record):
+                return _in_progress()
+
+        try:
+            with transaction.atomic():
+                response = view(*args, **kwargs)
+                if _is_final(response):
+                    stored = IdempotencyKey.objects.filter(
+                        pk=record.pk, status='processing', locked_at=record.locked_at
+                    ).update(
+                        status='completed',
+                        response_status=response.status_code,
+                        response_body=response.data,
+                    )
+                    if not stored:
+                        # Another attempt took the key over; let its result stand
+                        transaction.set_rollback(True)
+                        return _in_progress()
+                    return response
+                transaction.set_rollback(True)
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at).delete()
+            raise
+        IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at).delete()
+        return response
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """
+    Delete expired keys in batches. Returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        count, _ = IdempotencyKey.objects.filter(id__in=ids).delete()
+        deleted += count
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.audit import drain_spool
+
+
+class Command(BaseCommand):
+    help = 'Load audit rows spooled to settings.AUDIT_SPOOL_DIR into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once drained')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            loaded = drain_spool(options['batch_size'])
+            if loaded or not options['loop']:
+                self.stdout.write(f'Loaded {loaded} audit rows')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.events import purge_events
+
+
+class Command(BaseCommand):
+    help = 'Delete Server-Sent Events older than settings.EVENT_STREAM_RETENTION'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_events(options['batch_size'])
+        self.stdout.write(f'Purged {deleted} stream events')
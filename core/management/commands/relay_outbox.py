@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import OutboxDeliveryError, get_sink, purge_dispatched, relay
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending outbox events to the configured sink (settings.OUTBOX_SINK)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once drained')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between polls with --loop')
+        parser.add_argument('--purge-days', type=int,
+                            help='Also delete events dispatched more than this many days ago')
+
+    def handle(self, *args, **options):
+        sink = get_sink()
+        while True:
+            try:
+                delivered = relay(sink, options['batch_size'])
+                if delivered:
+                    self.stdout.write(f'Delivered {delivered} events')
+            except OutboxDeliveryError as exc:
+                self.stderr.write(f'Delivery failed, will retry: {exc}')
+                if not options['loop']:
+                    raise SystemExit(1)
+            if options['purge_days'] is not None:
+                purged = purge_dispatched(options['purge_days'])
+                if purged:
+                    self.stdout.write(f'Purged {purged} dispatched events')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
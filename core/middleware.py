@@ -0,0 +1,122 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+def _accepted_encodings(header):
+    """
+    Parse an Accept-Encoding header into {coding: q}.
+    """
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def accepts_encoding(header, coding):
+    """
+    Whether an Accept-Encoding header allows ``coding`` (q > 0).
+    """
+    accepted = _accepted_encodings(header)
+    return accepted.get(coding, accepted.get('*', 0.0)) > 0
+
+
+def negotiate_encoding(header):
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _gzip_compressor():
+    level = getattr(settings, 'RESPONSE_COMPRESSION_GZIP_LEVEL', 6)
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        quality = getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 5)
+        return brotli.compress(data, quality=quality)
+    compressor = _gzip_compressor()
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    if encoding == 'br':
+        quality = getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 5)
+        compressor = brotli.Compressor(quality=quality)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = _gzip_compressor()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress large responses with brotli or gzip depending on what the
+    client accepts. Small responses are passed through untouched.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if getattr(response, 'is_async', False):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress_bytes(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Compressed bytes differ from the identity representation, so a strong
+        # ETag has to become weak.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    Change event written in the same transaction as the change itself and
+    delivered to downstream consumers by the relay_outbox command.
+    """
+    topic = models.CharField(max_length=100)
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['dispatched_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.topic} {self.aggregate_type} #{self.aggregate_id}"
+
+    def as_message(self):
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'aggregate_type': self.aggregate_type,
+            'aggregate_id': self.aggregate_id,
+            'occurred_at': self.created_at,
+            'data': self.payload,
+        }
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a write request made with an Idempotency-Key header, replayed
+    when the client retries with the same key (see core.idempotency).
+    """
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    locked_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class StreamEvent(models.Model):
+    """
+    Change event pushed to Server-Sent Event streams (core.events). Every
+    process that serves streams polls this table, so events published by any
+    process reach every stream.
+    """
+    type = models.CharField(max_length=50)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    # Server-side only: what the role filter needs to know about the event
+    audience = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.type} #{self.id}"
@@ -0,0 +1,154 @@
+"""
+Transactional outbox. Views call enqueue() inside the transaction that makes
+the change, and the relay_outbox command delivers pending events in id
+order to the configured sink (settings.OUTBOX_SINK).
+
+Delivery is at least once: a batch is marked dispatched only after the sink
+accepted it, so consumers should de-duplicate on the event id.
+"""
+import json
+import os
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+
+class OutboxDeliveryError(Exception):
+    pass
+
+
+def enqueue(topic, aggregate_type, aggregate_id, payload):
+    """
+    Record an event. Call inside the transaction that makes the change so
+    the event exists if and only if the change was committed.
+    """
+    return OutboxEvent.objects.create(
+        topic=topic,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=payload,
+    )
+
+
+def enqueue_many(events):
+    """
+    Record several (topic, aggregate_type, aggregate_id, payload) events with
+    a single insert. Same transaction rule as enqueue().
+    """
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            topic=topic,
+            aggregate_type=aggregate_type,
+            aggregate_id=str(aggregate_id),
+            payload=payload,
+        )
+        for topic, aggregate_type, aggregate_id, payload in events
+    ])
+
+
+def encode(messages):
+    return [json.dumps(message, cls=DjangoJSONEncoder, separators=(',', ':')) for message in messages]
+
+
+class FileSink:
+    """
+    Appends events as JSON lines to a local file.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def send(self, messages):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            handle.write(''.join(f'{line}\n' for line in encode(messages)))
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+class WebhookSink:
+    """
+    POSTs each batch as {"events": [...]} to a URL; any non-2xx response
+    fails the batch so it is retried.
+    """
+
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def send(self, messages):
+        body = '{"events":[' + ','.join(encode(messages)) + ']}'
+        request = urllib.request.Request(
+            self.url,
+            data=body.encode(),
+            headers={'Content-Type': 'application/json', **self.headers},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if not 200 <= response.status < 300:
+                raise OutboxDeliveryError(f'Webhook returned HTTP {response.status}')
+
+
+def get_sink():
+    sink_class = import_string(getattr(settings, 'OUTBOX_SINK', 'core.outbox.FileSink'))
+    return sink_class(**getattr(settings, 'OUTBOX_SINK_OPTIONS', {}))
+
+
+def relay_batch(sink, batch_size=100):
+    """
+    Deliver the oldest pending events. Rows stay locked while the sink is
+    called so concurrent relays skip them rather than send them twice.
+    Returns the number of events delivered.
+    """
+    failure = None
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        ids = [event.id for event in events]
+        try:
+            sink.send([event.as_message() for event in events])
+        except Exception as exc:
+            failure = exc
+            OutboxEvent.objects.filter(id__in=ids).update(
+                attempts=F('attempts') + 1, last_error=str(exc)[:1000]
+            )
+        else:
+            OutboxEvent.objects.filter(id__in=ids).update(
+                attempts=F('attempts') + 1, dispatched_at=timezone.now(), last_error=''
+            )
+    if failure is not None:
+        raise OutboxDeliveryError(str(failure)) from failure
+    return len(events)
+
+
+def relay(sink=None, batch_size=100):
+    """
+    Drain the outbox. Returns the number of events delivered.
+    """
+    sink = sink or get_sink()
+    delivered = 0
+    while True:
+        count = relay_batch(sink, batch_size)
+        delivered += count
+        if count < batch_size:
+            return delivered
+
+
+def purge_dispatched(older_than_days):
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = OutboxEvent.objects.filter(dispatched_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,24 @@
+from rest_framework.response import Response
+
+
+class FastListMixin:
+    """
+    Serve the list action (and streaming chunks) through a values()-based
+    reader instead of the ModelSerializer. ``list_reader`` takes a queryset
+    or a list of instances and returns the same dicts the serializer would.
+    """
+    list_reader = None
+
+    def list(self, request, *args, **kwargs):
+        if self.list_reader is None or request.query_params.get('stream'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.list_reader(page))
+        return Response(self.list_reader(queryset))
+
+    def serialize_chunk(self, rows):
+        if self.list_reader is None:
+            return super().serialize_chunk(rows)
+        return self.list_reader(rows)
@@ -0,0 +1,66 @@
+import decimal
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # orjson handles dict/list/str/int/float/date/datetime natively; everything
+    # else falls back to DRF's encoder so the wire format stays the same.
+    if isinstance(obj, decimal.Decimal):
+        return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+    return _encoder.default(obj)
+
+
+def dumps(data, indent=False):
+    """
+    Serialise data to JSON bytes with the same conventions as the API renderer.
+    """
+    if orjson is None:
+        return JSONRenderer().render(data, 'application/json; indent=2' if indent else None)
+    option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_default, option=option)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer backed by orjson.
+    Falls back to the stock renderer when orjson is not installed.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return dumps(data, indent=bool(indent))
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSON parser backed by orjson. Falls back to DRF's JSONParser when
+    orjson is not installed.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
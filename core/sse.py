@@ -0,0 +1,129 @@
+"""
+Server-Sent Events endpoint (/api/events/stream/) served directly by the
+ASGI application, outside Django's request cycle so an open stream does not
+hold a worker thread. Events come from the database-backed broadcaster in
+core/events.py.
+
+Browsers' EventSource cannot set headers, so the JWT access token may be
+passed as ?token= as well as in the Authorization header.
+"""
+import asyncio
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .events import broadcaster
+from .renderers import dumps
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+@sync_to_async
+def _authenticate(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None, None
+    profile = getattr(user, 'userprofile', None)
+    return user, profile.role if profile else None
+
+
+def format_event(event):
+    return (
+        f'id: {event.id}\nevent: {event.type}\ndata: '.encode()
+        + dumps(event.data)
+        + b'\n\n'
+    )
+
+
+async def _send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': dumps({'error': message})})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def event_stream(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await _send_error(send, 405, 'Method not allowed')
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    raw_token = query.get('token', [None])[0]
+    authorization = _header(scope, b'authorization')
+    if not raw_token and authorization and authorization.startswith('Bearer '):
+        raw_token = authorization[len('Bearer '):]
+    if not raw_token:
+        return await _send_error(send, 401, 'Authentication credentials were not provided')
+    user, role = await _authenticate(raw_token)
+    if user is None or role is None:
+        return await _send_error(send, 401, 'Invalid or expired token')
+
+    queue = asyncio.Queue(maxsize=getattr(settings, 'EVENT_STREAM_QUEUE_SIZE', 500))
+    subscriber = await broadcaster.subscribe(queue, user.id, role)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+        # Events delivered to the queue while the replay was read are in both
+        replayed_id = 0
+        last_event_id = _header(scope, b'last-event-id') or query.get('last_event_id', [None])[0]
+        if last_event_id and last_event_id.isdigit():
+            missed = await sync_to_async(broadcaster.since)(int(last_event_id), subscriber)
+            if missed is None:
+                # Too far behind to replay; the client should reload its lists
+                await send({'type': 'http.response.body', 'body': b'event: reset\ndata: {}\n\n', 'more_body': True})
+            else:
+                for event in missed:
+                    await send({'type': 'http.response.body', 'body': format_event(event), 'more_body': True})
+                    replayed_id = event.id
+
+        keepalive = getattr(settings, 'EVENT_STREAM_KEEPALIVE', 15)
+        while not disconnected.done():
+            if subscriber.overflowed and queue.empty():
+                break
+            next_event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_event in done:
+                event = next_event.result()
+                if event.id <= replayed_id:
+                    continue
+                body = format_event(event)
+            else:
+                next_event.cancel()
+                if disconnected in done:
+                    break
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
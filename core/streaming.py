@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .renderers import dumps
+
+
+class StreamingListMixin:
+    """
+    Adds a streaming mode to a ViewSet's list action. Requesting
+    ``?stream=true`` serialises the queryset in primary key order, one
+    keyset-paginated query per chunk (``pk > last pk LIMIT chunk size``), and
+    yields one JSON array incrementally, so memory use is bounded by the
+    chunk size rather than the table size. queryset.iterator() is not used
+    because MySQL's driver buffers the whole result set on the client.
+    """
+    stream_chunk_size = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+            return self.stream_list(request)
+        return super().list(request, *args, **kwargs)
+
+    def get_stream_chunk_size(self):
+        return self.stream_chunk_size or getattr(settings, 'STREAMING_LIST_CHUNK_SIZE', 500)
+
+    def serialize_chunk(self, rows):
+        return self.get_serializer(rows, many=True).data
+
+    def stream_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            self._stream_rows(queryset, self.get_stream_chunk_size()),
+            content_type='application/json'
+        )
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def _stream_rows(self, queryset, chunk_size):
+        queryset = queryset.order_by('pk')
+        yield b'['
+        first = True
+        last_pk = None
+        while True:
+            page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            chunk = list(page[:chunk_size])
+            if chunk:
+                yield from self._render_chunk(chunk, first)
+                first = False
+            if len(chunk) < chunk_size:
+                break
+            last_pk = chunk[-1].pk
+        yield b']'
+
+    def _render_chunk(self, rows, first):
+        # Render the chunk as a JSON array and strip its brackets so the
+        # chunks join into a single array
+        body = dumps(self.serialize_chunk(rows))[1:-1]
+        if body:
+            yield body if first else b',' + body
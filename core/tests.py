@@ -0,0 +1,215 @@
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory.models import Batch, Medicine
+from patients.models import Patient
+from prescriptions.models import Prescription, PrescriptionHistory
+from . import audit, events
+from .events import Broadcaster, Subscriber
+from .idempotency import REPLAYED_HEADER
+from .models import IdempotencyKey, StreamEvent
+
+
+class AuditBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('doctor')
+        cls.prescription = Prescription.objects.create(
+            patient=Patient.objects.create(name='John Doe'), prescribed_by=cls.user
+        )
+
+    def record(self, notes, key=None):
+        audit.record(
+            PrescriptionHistory, key=key, prescription=self.prescription,
+            action='updated', performed_by=self.user, notes=notes
+        )
+
+    def history(self):
+        return sorted(PrescriptionHistory.objects.values_list('notes', flat=True))
+
+    def test_rows_are_written_once_on_commit(self):
+        with audit.buffered():
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.record('first')
+                    self.record('second')
+                    self.assertEqual(self.history(), [])
+            self.assertEqual(self.history(), [])
+        self.assertEqual(self.history(), ['first', 'second'])
+
+    def test_rows_are_dropped_with_the_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.record('rolled-back')
+                transaction.set_rollback(True)
+        self.assertEqual(self.history(), [])
+
+    def test_rows_are_dropped_with_their_savepoint(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.record('outer')
+                try:
+                    with transaction.atomic():
+                        self.record('inner-rolled-back')
+                        raise ValueError
+                except ValueError:
+                    pass
+                with transaction.atomic():
+                    self.record('inner-released')
+                self.record('after')
+        self.assertEqual(self.history(), ['after', 'inner-released', 'outer'])
+
+    def test_keyed_rows_are_merged(self):
+        with audit.buffered(), self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.record('outer', key='same')
+                with transaction.atomic():
+                    self.record('', key='same')
+                    self.record('inner', key='other')
+                self.record('', key='other')
+        self.assertEqual(self.history(), ['inner', 'outer'])
+
+    def test_buffered_block_that_raises_writes_nothing(self):
+        with self.assertRaises(ValueError):
+            with audit.buffered():
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.record('failed')
+                raise ValueError
+        self.assertEqual(self.history(), [])
+
+    def test_middleware_skips_failed_requests(self):
+        def view(status):
+            def get_response(request):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.record(f'status {status}')
+                return HttpResponse(status=status)
+            return get_response
+
+        for status in (500, 200):
+            audit.AuditMiddleware(view(status))(None)
+        self.assertEqual(self.history(), ['status 200'])
+
+    def test_drained_rows_keep_the_recorded_time(self):
+        recorded_at = (timezone.now() - timedelta(hours=2)).replace(microsecond=0)
+        with tempfile.TemporaryDirectory() as directory, override_settings(AUDIT_SPOOL_DIR=directory):
+            audit.write([(PrescriptionHistory, {
+                'prescription': self.prescription, 'action': 'updated',
+                'performed_by': self.user, 'notes': 'spooled', 'timestamp': recorded_at,
+            })])
+            self.assertEqual(self.history(), [])
+            self.assertEqual(audit.drain_spool(), 1)
+        self.assertEqual(PrescriptionHistory.objects.get().timestamp, recorded_at)
+
+
+class BroadcasterTests(TestCase):
+    def setUp(self):
+        self.broadcaster = Broadcaster(history_size=2)
+        self.subscriber = Subscriber(None, user_id=1, role='admin')
+
+    def publish(self, count):
+        return [events.publish('stock.alert', {}, {'kind': 'stock'}).id for _ in range(count)]
+
+    def test_replays_events_after_last_id(self):
+        first, second = self.publish(2)
+        self.assertEqual([event.id for event in self.broadcaster.since(first, self.subscriber)], [second])
+        self.assertEqual(self.broadcaster.since(second, self.subscriber), [])
+        doctor = Subscriber(None, user_id=2, role='doctor')
+        self.assertEqual(self.broadcaster.since(first - 1, doctor), [])
+
+    def test_replay_stops_at_the_events_already_polled(self):
+        # Later events reach the stream through its queue
+        first, = self.publish(1)
+        self.broadcaster._cursor = first
+        self.publish(1)
+        self.assertEqual([event.id for event in self.broadcaster.since(first - 1, self.subscriber)], [first])
+
+    def test_too_many_missed_events_reset(self):
+        first, _, _ = self.publish(3)
+        self.assertIsNone(self.broadcaster.since(first - 1, self.subscriber))
+
+    def test_purged_events_reset(self):
+        first, _ = self.publish(2)
+        StreamEvent.objects.filter(id=first).delete()
+        self.assertIsNone(self.broadcaster.since(first - 1, self.subscriber))
+
+    def test_id_newer_than_any_event_resets(self):
+        last, = self.publish(1)
+        self.assertIsNone(self.broadcaster.since(last + 40, self.subscriber))
+
+    def test_poll_waits_for_an_id_that_may_still_be_committing(self):
+        first, missing, last = self.publish(3)
+        row = StreamEvent.objects.get(id=missing)
+        row.delete()
+        self.broadcaster._cursor = first - 1
+        self.assertEqual([event.id for event in self.broadcaster.poll()], [first])
+        self.assertEqual(self.broadcaster.poll(), [])
+        StreamEvent.objects.create(id=missing, type=row.type, data=row.data, audience=row.audience)
+        self.assertEqual([event.id for event in self.broadcaster.poll()], [missing, last])
+
+    def test_poll_skips_a_missing_id_after_the_timeout(self):
+        first, missing, last = self.publish(3)
+        StreamEvent.objects.filter(id=missing).delete()
+        self.broadcaster._cursor = first - 1
+        with override_settings(EVENT_STREAM_GAP_TIMEOUT=0):
+            self.assertEqual([event.id for event in self.broadcaster.poll()], [first, last])
+
+
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('doctor')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        Batch.objects.create(
+            medicine=cls.medicine, batch_number='B1', quantity=100,
+            expiration_date=timezone.localdate() + timedelta(days=90), cost_per_unit='2.00'
+        )
+
+    def create(self, quantity=1, key='key-1'):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post('/api/prescriptions/create/', {
+            'patient_id': self.patient.pk, 'items': [{'medicine_id': self.medicine.pk, 'quantity': quantity}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.create()
+        second = self.create()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second[REPLAYED_HEADER], 'true')
+        self.assertEqual(Prescription.objects.count(), 1)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.create()
+        self.assertEqual(self.create(quantity=2).status_code, 422)
+        self.assertEqual(self.create(quantity=2, key='key-2').status_code, 200)
+        self.assertEqual(Prescription.objects.count(), 2)
+
+    def test_key_still_processing_conflicts_until_it_times_out(self):
+        self.create()
+        IdempotencyKey.objects.update(status='processing', locked_at=timezone.now())
+        response = self.create()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Prescription.objects.count(), 1)
+
+        # The request holding it died; a retry takes it over and runs again
+        IdempotencyKey.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.create().status_code, 200)
+        self.assertEqual(Prescription.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+    def test_rejected_request_is_replayed(self):
+        # A 4xx other than 409 is final, so the retry gets the stored error
+        self.assertEqual(self.create(quantity=1000).status_code, 400)
+        response = self.create(quantity=1000)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
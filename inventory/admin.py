@@ -1,7 +1,10 @@
 from django.contrib import admin
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
-from .models import Medicine, Supplier, Category, Batch, InventoryLog
+from .models import (
+    Medicine, Supplier, Category, Batch, InventoryLog, ValuationSnapshot, StockForecast,
+    StockLedgerEntry, StockAlert
+)
 
 class MedicineResource(resources.ModelResource):
     class Meta:
@@ -55,3 +58,27 @@ class InventoryLogAdmin(ImportExportModelAdmin):
     list_display = ['medicine', 'batch', 'action', 'quantity', 'timestamp', 'performed_by']
     list_filter = ['action', 'timestamp']
     search_fields = ['medicine__name', 'batch__batch_number', 'performed_by']
+
+@admin.register(ValuationSnapshot)
+class ValuationSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['as_of', 'category', 'supplier', 'quantity', 'cost_value', 'retail_value']
+    list_filter = ['as_of', 'category', 'supplier']
+
+@admin.register(StockForecast)
+class StockForecastAdmin(admin.ModelAdmin):
+    list_display = ['medicine', 'avg_daily_consumption', 'on_hand', 'days_of_cover',
+                    'reorder_point', 'reorder_quantity', 'needs_reorder', 'computed_at']
+    list_filter = ['needs_reorder']
+    search_fields = ['medicine__name']
+
+@admin.register(StockLedgerEntry)
+class StockLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['timestamp', 'medicine', 'batch', 'reason', 'delta', 'balance', 'reference']
+    list_filter = ['reason', 'timestamp']
+    search_fields = ['medicine__name', 'batch__batch_number', 'reference']
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ['medicine', 'kind', 'status', 'quantity', 'min_quantity', 'opened_at', 'resolved_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['medicine__name']
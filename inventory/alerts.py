@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.events import publish_on_commit
+from .models import Medicine, Batch, StockAlert
+
+ACTIVE_STATUSES = ('open', 'acknowledged')
+
+
+def alert_kind(quantity, min_quantity):
+    if quantity <= 0:
+        return 'out_of_stock'
+    if quantity <= min_quantity:
+        return 'low_stock'
+    return None
+
+
+def evaluate_stock_alerts(medicine_ids=None):
+    """
+    Bring the alerts of the given medicines (default: all) in line with
+    their current stock. Alerts whose condition cleared are resolved, a
+    change between low and out of stock resolves the old alert and opens a
+    new one, and existing alerts get their quantity refreshed.
+    Returns the newly opened alerts.
+
+    Runs in its own transaction with the medicines' rows locked, so
+    concurrent evaluations of the same medicine cannot both open an alert.
+    """
+    medicines = Medicine.objects.all()
+    batches = Batch.objects.all()
+    alerts = StockAlert.objects.filter(status__in=ACTIVE_STATUSES)
+    if medicine_ids is not None:
+        medicine_ids = set(medicine_ids)
+        if not medicine_ids:
+            return []
+        medicines = medicines.filter(id__in=medicine_ids)
+        batches = batches.filter(medicine_id__in=medicine_ids)
+        alerts = alerts.filter(medicine_id__in=medicine_ids)
+
+    with transaction.atomic():
+        # Locked in id order to avoid deadlocks; the medicine rows exist even
+        # when there is no alert row to lock yet
+        thresholds = dict(medicines.select_for_update().order_by('id').values_list('id', 'min_quantity'))
+        totals = dict(batches.values_list('medicine_id').annotate(total=Sum('quantity')).order_by())
+        active = {alert.medicine_id: alert for alert in alerts}
+
+        now = timezone.now()
+        created, updated, resolved = [], [], []
+        for medicine_id, min_quantity in thresholds.items():
+            quantity = totals.get(medicine_id, 0)
+            kind = alert_kind(quantity, min_quantity)
+            alert = active.get(medicine_id)
+            if alert and alert.kind != kind:
+                resolved.append(alert.id)
+                alert = None
+            if alert:
+                if (alert.quantity, alert.min_quantity) != (quantity, min_quantity):
+                    alert.quantity, alert.min_quantity, alert.updated_at = quantity, min_quantity, now
+                    updated.append(alert)
+            elif kind:
+                created.append(StockAlert(
+                    medicine_id=medicine_id, kind=kind, quantity=quantity, min_quantity=min_quantity
+                ))
+
+        if resolved:
+            StockAlert.objects.filter(id__in=resolved).update(
+                status='resolved', resolved_at=now, updated_at=now
+            )
+        if updated:
+            StockAlert.objects.bulk_update(updated, ['quantity', 'min_quantity', 'updated_at'])
+        if created:
+            StockAlert.objects.bulk_create(created)
+        if created or resolved:
+            publish_on_commit('stock.alert', {
+                'opened': [
+                    {'medicine_id': alert.medicine_id, 'kind': alert.kind, 'quantity': alert.quantity}
+                    for alert in created
+                ],
+                'resolved': resolved,
+            }, {'kind': 'stock'})
+    return created
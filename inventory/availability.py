@@ -0,0 +1,94 @@
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Medicine, Batch
+
+
+def parse_items(items):
+    """
+    Turn [{'medicine_id': .., 'quantity': ..}, ...] into (medicine_id, quantity)
+    pairs. Quantity defaults to 1. Raises ValueError on malformed input.
+    """
+    if not isinstance(items, list):
+        raise ValueError('items must be a list')
+    pairs = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('each item must be an object')
+        try:
+            medicine_id = int(item.get('medicine_id'))
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise ValueError('medicine_id and quantity must be integers')
+        if quantity <= 0:
+            raise ValueError('quantity must be positive')
+        pairs.append((medicine_id, quantity))
+    return pairs
+
+
+def check_availability(pairs, today=None):
+    """
+    Check (medicine_id, quantity) pairs against usable stock, i.e. batches
+    that have units left and have not expired. Quantities requested for the
+    same medicine are added up.
+
+    Everything is answered by one aggregated query with the earliest-expiry
+    usable batch of each medicine attached. Returns
+    {'items': [...], 'missing': [medicine_id, ...], 'all_available': bool},
+    with items in the order the medicines were first requested.
+    """
+    today = today or timezone.localdate()
+    requested = {}
+    for medicine_id, quantity in pairs:
+        requested[medicine_id] = requested.get(medicine_id, 0) + quantity
+    if not requested:
+        return {'items': [], 'missing': [], 'all_available': True}
+
+    usable = Q(batches__quantity__gt=0, batches__expiration_date__gte=today)
+    earliest = (
+        Batch.objects.filter(medicine=OuterRef('pk'), quantity__gt=0, expiration_date__gte=today)
+        .order_by('expiration_date', 'id')
+    )
+    rows = (
+        Medicine.objects.filter(id__in=requested)
+        .annotate(
+            available=Coalesce(Sum('batches__quantity', filter=usable), Value(0), output_field=IntegerField()),
+            earliest_batch_id=Subquery(earliest.values('id')[:1]),
+            earliest_batch_number=Subquery(earliest.values('batch_number')[:1]),
+            earliest_expiration_date=Subquery(earliest.values('expiration_date')[:1]),
+        )
+        .values_list(
+            'id', 'name', 'available', 'earliest_batch_id',
+            'earliest_batch_number', 'earliest_expiration_date'
+        )
+    )
+    found = {row[0]: row for row in rows}
+
+    items = []
+    for medicine_id, quantity in requested.items():
+        if medicine_id not in found:
+            continue
+        _, name, available, batch_id, batch_number, expiration_date = found[medicine_id]
+        items.append({
+            'medicine_id': medicine_id,
+            'medicine': name,
+            'requested': quantity,
+            'available': available,
+            'short_by': max(quantity - available, 0),
+            'earliest_batch': {
+                'id': batch_id,
+                'batch_number': batch_number,
+                'expiration_date': expiration_date,
+            } if batch_id is not None else None,
+        })
+    missing = [medicine_id for medicine_id in requested if medicine_id not in found]
+    return {
+        'items': items,
+        'missing': missing,
+        'all_available': not missing and all(item['short_by'] == 0 for item in items),
+    }
+
+
+def shortages(availability):
+    return [item for item in availability['items'] if item['short_by']]
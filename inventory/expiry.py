@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ledger import record_entries
+from .models import Batch, InventoryLog
+
+
+def expired_batches(today=None):
+    return Batch.objects.filter(expiration_date__lt=today or timezone.localdate(), quantity__gt=0)
+
+
+def _expire_chunk(ids, today, performed_by):
+    # Rows are re-read under lock so a batch dispensed or edited since the id
+    # scan is expired with its current quantity, or skipped if already empty
+    rows = list(
+        expired_batches(today).select_for_update().filter(id__in=ids)
+        .values_list('id', 'medicine_id', 'batch_number', 'quantity', 'cost_per_unit', 'expiration_date')
+    )
+    if not rows:
+        return 0, 0, Decimal('0.00')
+
+    # updated_at is set explicitly so the catalogue snapshot version changes
+    Batch.objects.filter(id__in=[row[0] for row in rows]).update(
+        quantity=0, version=F('version') + 1, updated_at=timezone.now()
+    )
+    logs = []
+    units = 0
+    value = Decimal('0.00')
+    for batch_id, medicine_id, batch_number, quantity, cost_per_unit, expiration_date in rows:
+        batch_value = quantity * cost_per_unit
+        units += quantity
+        value += batch_value
+        logs.append(InventoryLog(
+            medicine_id=medicine_id,
+            batch_id=batch_id,
+            action='EXPIRE',
+            quantity=-quantity,
+            performed_by=performed_by,
+            notes=f'Batch {batch_number} expired on {expiration_date}; written off {batch_value} at cost',
+            cost_value=batch_value,
+        ))
+    InventoryLog.objects.bulk_create(logs)
+    record_entries(
+        [(row[0], row[1], -row[3], 0) for row in rows],
+        reason='EXPIRE',
+        reference='Expiry sweep'
+    )
+    return len(rows), units, value
+
+
+def expire_batches(today=None, chunk_size=1000, performed_by='system'):
+    """
+    Zero the stock of every batch past its expiration date, writing an EXPIRE
+    log with the written-off value for each. Batches are walked in
+    (expiration_date, id) order, keyset-paginated along the
+    (expiration_date, quantity) index, and each chunk is committed on its
+    own, so an interrupted run can simply be started again; batches already
+    at zero are never touched twice. Returns totals for the run.
+    """
+    today = today or timezone.localdate()
+    totals = {'batches': 0, 'units': 0, 'cost_value': Decimal('0.00')}
+    last = None
+    while True:
+        batches = expired_batches(today)
+        if last is not None:
+            batches = batches.filter(expiration_date__gte=last[0]).exclude(
+                expiration_date=last[0], id__lte=last[1]
+            )
+        rows = list(
+            batches.order_by('expiration_date', 'id')
+            .values_list('expiration_date', 'id')[:chunk_size]
+        )
+        if not rows:
+            break
+        last = rows[-1]
+        ids = [batch_id for _, batch_id in rows]
+        with transaction.atomic():
+            batches, units, value = _expire_chunk(ids, today, performed_by)
+        totals['batches'] += batches
+        totals['units'] += units
+        totals['cost_value'] += value
+    return totals
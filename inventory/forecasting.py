@@ -0,0 +1,127 @@
+import math
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .alerts import evaluate_stock_alerts
+from .models import Medicine, Batch, InventoryLog, StockForecast
+from .snapshots import schedule_catalogue_rebuild
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def compute_forecasts(window_days=730, lead_time_days=7, review_days=14,
+                      service_z=1.65, today=None):
+    """
+    Forecast daily consumption for the whole catalogue in one pass.
+
+    DISPENSE logs are summed per (medicine, day) in the database and laid out
+    as a medicines x days matrix, so mean, variability, reorder points and
+    days of cover are computed with vectorised NumPy operations.
+    Returns a list of unsaved StockForecast objects.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=window_days)
+
+    catalogue = list(Medicine.objects.order_by('id').values_list('id', 'created_at'))
+    if not catalogue:
+        return []
+    medicine_ids = np.fromiter((row[0] for row in catalogue), dtype=np.int64, count=len(catalogue))
+
+    # Days each medicine has existed within the window, so new items are not
+    # diluted by days before they were stocked
+    created = np.fromiter(
+        ((today - timezone.localtime(row[1]).date()).days for row in catalogue),
+        dtype=np.int64, count=len(catalogue)
+    )
+    active_days = np.clip(created, 1, window_days).astype(np.float64)
+
+    usage = (
+        InventoryLog.objects.filter(
+            action='DISPENSE', timestamp__gte=_day_start(start), timestamp__lt=_day_start(today)
+        )
+        .annotate(day=TruncDate('timestamp'))
+        .values_list('medicine_id', 'day')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    usage = list(usage)
+
+    sums = np.zeros(len(catalogue))
+    sums_sq = np.zeros(len(catalogue))
+    if usage:
+        ids = np.fromiter((row[0] for row in usage), dtype=np.int64, count=len(usage))
+        days = np.fromiter(((row[1] - start).days for row in usage), dtype=np.int64, count=len(usage))
+        # Dispensed quantities are logged as negative movements
+        totals = -np.fromiter((row[2] for row in usage), dtype=np.float64, count=len(usage))
+        rows = np.searchsorted(medicine_ids, ids)
+        valid = (rows < len(medicine_ids)) & (days >= 0) & (days < window_days)
+        rows, days, totals = rows[valid], days[valid], totals[valid]
+        matrix = np.bincount(
+            rows * window_days + days, weights=totals, minlength=len(catalogue) * window_days
+        ).reshape(len(catalogue), window_days)
+        sums = matrix.sum(axis=1)
+        sums_sq = np.square(matrix).sum(axis=1)
+
+    mean = sums / active_days
+    std = np.sqrt(np.maximum(sums_sq / active_days - np.square(mean), 0))
+
+    on_hand_rows = dict(
+        Batch.objects.filter(quantity__gt=0, expiration_date__gte=today)
+        .values_list('medicine_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    on_hand = np.fromiter(
+        (on_hand_rows.get(medicine_id, 0) for medicine_id in medicine_ids.tolist()),
+        dtype=np.float64, count=len(catalogue)
+    )
+
+    safety_stock = service_z * std * math.sqrt(lead_time_days)
+    reorder_point = np.ceil(mean * lead_time_days + safety_stock)
+    order_up_to = mean * (lead_time_days + review_days) + safety_stock
+    reorder_quantity = np.maximum(np.ceil(order_up_to - on_hand), 0)
+    needs_reorder = (on_hand <= reorder_point) & (mean > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(mean > 0, on_hand / mean, np.nan)
+
+    computed_at = timezone.now()
+    forecasts = []
+    for i, medicine_id in enumerate(medicine_ids.tolist()):
+        cover = days_of_cover[i]
+        forecasts.append(StockForecast(
+            medicine_id=medicine_id,
+            avg_daily_consumption=round(float(mean[i]), 4),
+            consumption_std=round(float(std[i]), 4),
+            on_hand=int(on_hand[i]),
+            days_of_cover=None if np.isnan(cover) else round(float(cover), 1),
+            reorder_point=int(reorder_point[i]),
+            reorder_quantity=int(reorder_quantity[i]) if needs_reorder[i] else 0,
+            needs_reorder=bool(needs_reorder[i]),
+            window_days=window_days,
+            lead_time_days=lead_time_days,
+            computed_at=computed_at,
+        ))
+    return forecasts
+
+
+def store_forecasts(forecasts, apply_min_quantity=False):
+    with transaction.atomic():
+        StockForecast.objects.all().delete()
+        StockForecast.objects.bulk_create(forecasts, batch_size=1000)
+        if apply_min_quantity:
+            # Only medicines with dispensing history get a computed threshold
+            updated_at = timezone.now()
+            medicines = [
+                Medicine(id=forecast.medicine_id, min_quantity=forecast.reorder_point, updated_at=updated_at)
+                for forecast in forecasts if forecast.avg_daily_consumption > 0
+            ]
+            Medicine.objects.bulk_update(medicines, ['min_quantity', 'updated_at'], batch_size=1000)
+            transaction.on_commit(schedule_catalogue_rebuild)
+            transaction.on_commit(lambda: evaluate_stock_alerts(medicine.id for medicine in medicines))
@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Batch, StockLedgerEntry, StockCheckpoint
+
+# Sent after ledger entries are written, with entries=[StockLedgerEntry, ...]
+stock_changed = Signal()
+
+_ledger_context = ContextVar('stock_ledger_context', default=('EDIT', ''))
+
+
+@contextmanager
+def ledger_reason(reason, reference=''):
+    """
+    Attribute the batch quantity changes made inside the block, e.g.
+    ``with ledger_reason('DISPENSE', 'Prescription #12'):``
+    """
+    token = _ledger_context.set((reason, reference))
+    try:
+        yield
+    finally:
+        _ledger_context.reset(token)
+
+
+def record_entries(changes, reason=None, reference=None):
+    """
+    Bulk-write ledger entries for (batch_id, medicine_id, delta, balance)
+    tuples. Callers that change quantities with queryset.update() must call
+    this themselves; model saves are recorded by inventory/signals.py.
+    """
+    default_reason, default_reference = _ledger_context.get()
+    now = timezone.now()
+    entries = [
+        StockLedgerEntry(
+            batch_id=batch_id,
+            medicine_id=medicine_id,
+            delta=delta,
+            balance=balance,
+            reason=reason or default_reason,
+            reference=default_reference if reference is None else reference,
+            timestamp=now,
+        )
+        for batch_id, medicine_id, delta, balance in changes
+        if delta
+    ]
+    if entries:
+        StockLedgerEntry.objects.bulk_create(entries)
+        stock_changed.send(sender=StockLedgerEntry, entries=entries)
+    return entries
+
+
+def _end_of_day(day):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def as_of_cutoff(value):
+    """
+    Accept a date (meaning the end of that day) or a datetime.
+    """
+    if isinstance(value, datetime):
+        return value if timezone.is_aware(value) else timezone.make_aware(value)
+    return _end_of_day(value)
+
+
+def batch_balance_as_of(batch_id, at):
+    """
+    Quantity of a batch at ``at``: the running balance of its last entry.
+    """
+    entry = (
+        StockLedgerEntry.objects.filter(batch_id=batch_id, timestamp__lt=as_of_cutoff(at))
+        .order_by('-timestamp', '-id')
+        .values('balance')
+        .first()
+    )
+    return entry['balance'] if entry else 0
+
+
+def medicine_balance_as_of(medicine_id, at):
+    """
+    Stock of a medicine at ``at``: the latest checkpoint before it plus the
+    ledger entries recorded after that checkpoint.
+    Returns (balance, checkpoint, tail_entries).
+    """
+    cutoff = as_of_cutoff(at)
+    checkpoint = (
+        StockCheckpoint.objects.filter(medicine_id=medicine_id, timestamp__lt=cutoff)
+        .order_by('-timestamp', '-id')
+        .first()
+    )
+    tail = StockLedgerEntry.objects.filter(medicine_id=medicine_id, timestamp__lt=cutoff)
+    if checkpoint:
+        tail = tail.filter(id__gt=checkpoint.last_entry_id)
+    tail = tail.aggregate(delta=Sum('delta'), entries=Count('id'))
+    balance = (checkpoint.balance if checkpoint else 0) + (tail['delta'] or 0)
+    return balance, checkpoint, tail['entries']
+
+
+def write_checkpoints(lag_seconds=300):
+    """
+    Checkpoint every medicine with ledger entries since the previous run.
+    Each run covers entries up to one maximum id, so a checkpoint plus the
+    entries after it always gives the full balance. Entries younger than
+    ``lag_seconds`` are left for the next run so that rows from transactions
+    still in flight are not skipped.
+    """
+    with transaction.atomic():
+        previous = StockCheckpoint.objects.aggregate(last=Max('last_entry_id'))['last'] or 0
+        settled = timezone.now() - timedelta(seconds=lag_seconds)
+        upto = StockLedgerEntry.objects.filter(
+            timestamp__lt=settled
+        ).aggregate(last=Max('id'))['last'] or 0
+        if upto <= previous:
+            return []
+
+        changes = (
+            StockLedgerEntry.objects.filter(id__gt=previous, id__lte=upto)
+            .values('medicine_id')
+            .annotate(delta=Sum('delta'), timestamp=Max('timestamp'))
+            .order_by()
+        )
+        changes = {row['medicine_id']: row for row in changes}
+        latest_ids = (
+            StockCheckpoint.objects.filter(medicine_id__in=changes)
+            .values('medicine_id')
+            .annotate(latest=Max('id'))
+            .values('latest')
+        )
+        balances = dict(
+            StockCheckpoint.objects.filter(id__in=latest_ids).values_list('medicine_id', 'balance')
+        )
+        checkpoints = [
+            StockCheckpoint(
+                medicine_id=medicine_id,
+                balance=balances.get(medicine_id, 0) + row['delta'],
+                last_entry_id=upto,
+                timestamp=row['timestamp'],
+            )
+            for medicine_id, row in changes.items()
+        ]
+        StockCheckpoint.objects.bulk_create(checkpoints)
+        return checkpoints
+
+
+def record_opening_balances():
+    """
+    Seed an OPENING entry for every batch that has stock but no ledger history.
+    """
+    batches = (
+        Batch.objects.filter(quantity__gt=0, ledger_entries__isnull=True)
+        .values_list('id', 'medicine_id', 'quantity')
+    )
+    return record_entries(
+        ((batch_id, medicine_id, quantity, quantity) for batch_id, medicine_id, quantity in batches),
+        reason='OPENING',
+        reference='Opening balance'
+    )
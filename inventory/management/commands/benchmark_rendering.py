@@ -0,0 +1,83 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.middleware import brotli, compress_bytes
+from core.renderers import FastJSONRenderer
+from inventory.models import Medicine
+from inventory.serializers import MedicineSerializer
+
+
+def synthetic_medicines(rows, batches_per_medicine=4):
+    """
+    Payload shaped like the nested MedicineSerializer list output.
+    """
+    now = timezone.now().isoformat().replace('+00:00', 'Z')
+    supplier = {
+        'id': 1, 'name': 'Acme Pharma', 'contact_person': 'Jane Doe',
+        'phone': '+1555000000', 'email': 'orders@acme.test',
+        'address': '1 Main Street', 'created_at': now, 'updated_at': now,
+    }
+    category = {'id': 1, 'name': 'Analgesics', 'description': 'Pain relief'}
+    medicines = []
+    for i in range(rows):
+        batches = [{
+            'id': i * batches_per_medicine + b,
+            'batch_number': f'B{i:06d}-{b}',
+            'expiration_date': (date.today() + timedelta(days=30 * b)).isoformat(),
+            'quantity': 100 + b,
+            'cost_per_unit': '1.25',
+            'days_until_expiry': 30 * b,
+            'version': 0,
+            'created_at': now,
+        } for b in range(batches_per_medicine)]
+        medicines.append({
+            'id': i, 'name': f'Medicine {i}', 'barcode': f'{i:012d}',
+            'category': category, 'min_quantity': 50, 'supplier': supplier,
+            'price_per_unit': '2.50', 'batches': batches,
+            'total_quantity': sum(b['quantity'] for b in batches),
+            'low_stock': False, 'created_at': now, 'updated_at': now,
+        })
+    return medicines
+
+
+class Command(BaseCommand):
+    help = 'Compare render time and bytes on the wire for the JSON renderers and compression'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000,
+                            help='Number of synthetic medicines to render')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--from-db', action='store_true',
+                            help='Render the real medicine list instead of synthetic rows')
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            data = MedicineSerializer(
+                Medicine.objects.select_related('category', 'supplier').prefetch_related('batches'),
+                many=True
+            ).data
+        else:
+            data = synthetic_medicines(options['rows'])
+
+        results = {}
+        for name, renderer in (('drf-json', JSONRenderer()), ('orjson', FastJSONRenderer())):
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                body = renderer.render(data)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = (best, body)
+
+        self.stdout.write(f"{'renderer':<10} {'render ms':>10} {'identity':>12} {'gzip':>12} {'br':>12}")
+        for name, (elapsed, body) in results.items():
+            gzip_size = len(compress_bytes(body, 'gzip'))
+            br_size = len(compress_bytes(body, 'br')) if brotli is not None else None
+            self.stdout.write(
+                f"{name:<10} {elapsed * 1000:>10.1f} {len(body):>12} {gzip_size:>12} "
+                f"{br_size if br_size is not None else 'n/a':>12}"
+            )
@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.models import Medicine, Batch, StockLedgerEntry
+from inventory.stock import StockConflict, change_batch_quantity
+
+
+def cas_update(batch_id):
+    with transaction.atomic():
+        return change_batch_quantity(batch_id, -1, reason='ADJUST', reference='Benchmark').attempts
+
+
+def locked_update(batch_id):
+    with transaction.atomic():
+        batch = Batch.objects.select_for_update().get(pk=batch_id)
+        batch.quantity -= 1
+        batch.save(update_fields=['quantity', 'updated_at'])
+        return 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of compare-and-swap stock updates with select_for_update '
+        'when many workers decrement the same batch'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--updates', type=int, default=200, help='Updates per worker')
+        parser.add_argument('--batches', type=int, default=1,
+                            help='Spread the workers over this many batches (1 = worst-case contention)')
+
+    def run(self, strategy, batch_ids, workers, updates):
+        totals = {'ok': 0, 'attempts': 0, 'gave_up': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(index):
+            batch_id = batch_ids[index % len(batch_ids)]
+            ok = attempts = gave_up = errors = 0
+            try:
+                for _ in range(updates):
+                    try:
+                        attempts += strategy(batch_id)
+                        ok += 1
+                    except StockConflict:
+                        gave_up += 1
+                    except Exception:
+                        errors += 1
+            finally:
+                connection.close()
+            with lock:
+                totals['ok'] += ok
+                totals['attempts'] += attempts
+                totals['gave_up'] += gave_up
+                totals['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, totals
+
+    def handle(self, *args, **options):
+        workers, updates = options['workers'], options['updates']
+        medicine = Medicine.objects.create(
+            name='Benchmark medicine', barcode=f'BENCH-{time.time_ns()}', price_per_unit='1.00'
+        )
+        try:
+            self.stdout.write(f"{'strategy':<18} {'seconds':>8} {'updates/s':>10} {'attempts/update':>16} {'gave up':>8} {'errors':>7}")
+            for name, strategy in (('compare-and-swap', cas_update), ('select_for_update', locked_update)):
+                Batch.objects.filter(medicine=medicine).delete()
+                batch_ids = [
+                    Batch.objects.create(
+                        medicine=medicine, batch_number=f'BENCH-{i}', quantity=workers * updates,
+                        expiration_date=date.today() + timedelta(days=365), cost_per_unit='1.00'
+                    ).pk
+                    for i in range(options['batches'])
+                ]
+                elapsed, totals = self.run(strategy, batch_ids, workers, updates)
+                per_update = totals['attempts'] / totals['ok'] if totals['ok'] else 0
+                self.stdout.write(
+                    f"{name:<18} {elapsed:>8.2f} {totals['ok'] / elapsed:>10.0f} {per_update:>16.2f} "
+                    f"{totals['gave_up']:>8} {totals['errors']:>7}"
+                )
+        finally:
+            StockLedgerEntry.objects.filter(medicine=medicine).delete()
+            medicine.delete()
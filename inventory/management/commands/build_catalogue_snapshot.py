@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from inventory.snapshots import catalogue_version, write_catalogue_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Materialise the medicine catalogue into a versioned, compressed snapshot file'
+
+    def handle(self, *args, **options):
+        version = catalogue_version()
+        path = write_catalogue_snapshot(version)
+        self.stdout.write(self.style.SUCCESS(f'Catalogue snapshot {version} written to {path}'))
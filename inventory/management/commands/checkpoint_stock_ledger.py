@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import record_opening_balances, write_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Write stock ledger checkpoints so as-of queries replay a bounded tail (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag-seconds', type=int, default=300,
+                            help='Leave entries younger than this for the next run')
+        parser.add_argument('--seed-opening', action='store_true',
+                            help='First record OPENING entries for batches with no ledger history')
+
+    def handle(self, *args, **options):
+        if options['seed_opening']:
+            entries = record_opening_balances()
+            self.stdout.write(f'Recorded {len(entries)} opening balances')
+        checkpoints = write_checkpoints(lag_seconds=options['lag_seconds'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(checkpoints)} checkpoints'))
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.expiry import expire_batches, expired_batches
+
+
+class Command(BaseCommand):
+    help = 'Zero the stock of expired batches and write EXPIRE logs (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Treat batches expiring before this day (YYYY-MM-DD) as expired; defaults to today')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--performed-by', default='system')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many batches would be expired')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired_batches(today).count()} batches would be expired')
+            return
+
+        totals = expire_batches(today, options['chunk_size'], options['performed_by'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {totals['batches']} batches ({totals['units']} units, "
+            f"{totals['cost_value']} at cost)"
+        ))
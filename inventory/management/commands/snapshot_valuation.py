@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.valuation import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Store the daily inventory valuation snapshot (run once a day, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to snapshot (YYYY-MM-DD); past days are reconstructed from InventoryLog')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+        rows = take_snapshot(as_of)
+        self.stdout.write(self.style.SUCCESS(f'Stored valuation snapshot with {len(rows)} rows'))
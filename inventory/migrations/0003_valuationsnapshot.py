@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_category_remove_medicine_batch_number_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValuationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('cost_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('retail_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.category')),
+                ('supplier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.supplier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['as_of'], name='inventory_v_as_of_12e140_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_valuationsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avg_daily_consumption', models.FloatField(default=0)),
+                ('consumption_std', models.FloatField(default=0)),
+                ('on_hand', models.IntegerField(default=0)),
+                ('days_of_cover', models.FloatField(blank=True, null=True)),
+                ('reorder_point', models.PositiveIntegerField(default=0)),
+                ('reorder_quantity', models.PositiveIntegerField(default=0)),
+                ('needs_reorder', models.BooleanField(default=False)),
+                ('window_days', models.PositiveIntegerField()),
+                ('lead_time_days', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['action', 'timestamp'], name='inventory_i_action_98ea70_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockforecast',
+            name='medicine',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='inventory.medicine'),
+        ),
+        migrations.AddIndex(
+            model_name='stockforecast',
+            index=models.Index(fields=['needs_reorder', 'days_of_cover'], name='inventory_s_needs_r_728ef0_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def record_opening_balances(apps, schema_editor):
+    Batch = apps.get_model('inventory', 'Batch')
+    StockLedgerEntry = apps.get_model('inventory', 'StockLedgerEntry')
+    now = django.utils.timezone.now()
+    StockLedgerEntry.objects.bulk_create([
+        StockLedgerEntry(
+            batch_id=batch_id, medicine_id=medicine_id, delta=quantity, balance=quantity,
+            reason='OPENING', reference='Opening balance', timestamp=now
+        )
+        for batch_id, medicine_id, quantity in
+        Batch.objects.filter(quantity__gt=0).values_list('id', 'medicine_id', 'quantity').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stockforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('balance', models.IntegerField()),
+                ('reason', models.CharField(choices=[('OPENING', 'Opening balance'), ('ADD', 'Added'), ('REMOVE', 'Removed'), ('DISPENSE', 'Dispensed'), ('EXPIRE', 'Expired'), ('ADJUST', 'Adjusted'), ('EDIT', 'Edited')], max_length=10)),
+                ('reference', models.CharField(blank=True, max_length=200)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('batch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='inventory.batch')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='inventory.medicine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'timestamp'], name='inventory_s_batch_i_4658ec_idx'), models.Index(fields=['medicine', 'timestamp'], name='inventory_s_medicin_d0f6ae_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.BigIntegerField()),
+                ('last_entry_id', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.medicine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medicine', 'timestamp'], name='inventory_s_medicin_cb698a_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['expiration_date', 'quantity'], name='inventory_b_expirat_7245a7_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_initial_alerts(apps, schema_editor):
+    Medicine = apps.get_model('inventory', 'Medicine')
+    StockAlert = apps.get_model('inventory', 'StockAlert')
+    alerts = []
+    for medicine_id, min_quantity, quantity in Medicine.objects.annotate(
+            quantity=models.Sum('batches__quantity')).values_list('id', 'min_quantity', 'quantity').iterator():
+        quantity = quantity or 0
+        if quantity <= min_quantity:
+            kind = 'out_of_stock' if quantity <= 0 else 'low_stock'
+            alerts.append(StockAlert(
+                medicine_id=medicine_id, kind=kind, quantity=quantity, min_quantity=min_quantity
+            ))
+    StockAlert.objects.bulk_create(alerts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_batch_expiration_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low_stock', 'Low stock'), ('out_of_stock', 'Out of stock')], max_length=20)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('acknowledged', 'Acknowledged'), ('resolved', 'Resolved')], default='open', max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('min_quantity', models.IntegerField()),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('acknowledged_by', models.CharField(blank=True, max_length=100)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='inventory.medicine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'kind'], name='inventory_s_status_4e01d2_idx'), models.Index(fields=['medicine', 'status'], name='inventory_s_medicin_601298_idx')],
+            },
+        ),
+        migrations.RunPython(open_initial_alerts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stockalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
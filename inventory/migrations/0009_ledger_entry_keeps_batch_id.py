@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_batch_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockledgerentry',
+            name='batch',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='inventory.batch'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_ledger_entry_keeps_batch_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorylog',
+            name='cost_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:13
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def resolve_duplicate_alerts(apps, schema_editor):
+    # Keep the newest unresolved alert of each medicine
+    StockAlert = apps.get_model('inventory', 'StockAlert')
+    newest = {}
+    duplicates = []
+    for alert_id, medicine_id in (
+        StockAlert.objects.exclude(status='resolved').order_by('-opened_at', '-id')
+        .values_list('id', 'medicine_id').iterator()
+    ):
+        if medicine_id in newest:
+            duplicates.append(alert_id)
+        else:
+            newest[medicine_id] = alert_id
+    now = timezone.now()
+    for start in range(0, len(duplicates), 1000):
+        StockAlert.objects.filter(id__in=duplicates[start:start + 1000]).update(
+            status='resolved', resolved_at=now, updated_at=now
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_inventorylog_cost_value'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicate_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'resolved'), _negated=True), fields=('medicine',), name='unique_unresolved_stock_alert_per_medicine'),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 class Supplier(models.Model):
     name = models.CharField(max_length=100)
@@ -35,21 +37,56 @@ class Medicine(models.Model):
     def __str__(self):
         return self.name
 
+class BatchVersionConflict(Exception):
+    """
+    The batch was changed by someone else since it was read.
+    """
+
+
 class Batch(models.Model):
     medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='batches')
     batch_number = models.CharField(max_length=50)
     quantity = models.PositiveIntegerField()
     expiration_date = models.DateField()
     cost_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
+    # Bumped on every write; stock changes compare-and-swap on it (inventory/stock.py)
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['medicine', 'batch_number']
+        indexes = [models.Index(fields=['expiration_date', 'quantity'])]
 
     def __str__(self):
         return f"{self.medicine.name} - {self.batch_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so saves can be written to the stock ledger
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Only overwrite the row if it still has the version this instance
+            # was read with, instead of silently losing a concurrent change.
+            # The row stays locked until the full save below is written.
+            claimed = Batch.objects.filter(pk=self.pk, version=self.version).update(version=F('version') + 1)
+            if not claimed:
+                raise BatchVersionConflict(f'Batch {self.pk} was modified or deleted concurrently')
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version -= 1
+                raise
+
 class InventoryLog(models.Model):
     ACTION_CHOICES = [
         ('ADD', 'Added'),
@@ -66,9 +103,155 @@ class InventoryLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     performed_by = models.CharField(max_length=100)
     notes = models.TextField(blank=True)
+    # Value written off at cost, for EXPIRE entries
+    cost_value = models.DecimalField(max_digits=16, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['action', 'timestamp'])]
 
     def __str__(self):
         return f"{self.action} - {self.medicine.name} ({self.quantity})"
 
+class ValuationSnapshot(models.Model):
+    """
+    Stock value for one (category, supplier) pair on a given day.
+    Rows for a day can be rolled up by category, supplier or in total.
+    """
+    as_of = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True)
+    quantity = models.BigIntegerField(default=0)
+    cost_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    retail_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['as_of'])]
+
+    def __str__(self):
+        return f"Valuation {self.as_of} - {self.category} / {self.supplier}"
+
+
+class StockForecast(models.Model):
+    """
+    Consumption forecast and suggested reorder point for a medicine,
+    refreshed by the forecast_consumption management command.
+    """
+    medicine = models.OneToOneField(Medicine, on_delete=models.CASCADE, related_name='forecast')
+    avg_daily_consumption = models.FloatField(default=0)
+    consumption_std = models.FloatField(default=0)
+    on_hand = models.IntegerField(default=0)
+    days_of_cover = models.FloatField(null=True, blank=True)
+    reorder_point = models.PositiveIntegerField(default=0)
+    reorder_quantity = models.PositiveIntegerField(default=0)
+    needs_reorder = models.BooleanField(default=False)
+    window_days = models.PositiveIntegerField()
+    lead_time_days = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['needs_reorder', 'days_of_cover'])]
+
+    def __str__(self):
+        return f"Forecast for {self.medicine.name}"
+
+
+class StockLedgerEntry(models.Model):
+    """
+    One change to a batch's quantity with the batch balance after it.
+    Every Batch quantity change is recorded here (see inventory/ledger.py).
+    """
+    REASON_CHOICES = [
+        ('OPENING', 'Opening balance'),
+        ('ADD', 'Added'),
+        ('REMOVE', 'Removed'),
+        ('DISPENSE', 'Dispensed'),
+        ('EXPIRE', 'Expired'),
+        ('ADJUST', 'Adjusted'),
+        ('EDIT', 'Edited'),
+    ]
+
+    # Kept after the batch is deleted so its history can still be queried
+    batch = models.ForeignKey(
+        Batch, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='ledger_entries'
+    )
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='ledger_entries')
+    delta = models.IntegerField()
+    balance = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=200, blank=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['batch', 'timestamp']),
+            models.Index(fields=['medicine', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.reason} {self.delta:+d} -> {self.balance} ({self.medicine_id})"
+
+class StockCheckpoint(models.Model):
+    """
+    Medicine stock balance covering every ledger entry up to last_entry_id,
+    so as-of queries only replay the entries after it.
+    """
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    balance = models.BigIntegerField()
+    last_entry_id = models.BigIntegerField()
+    timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['medicine', 'timestamp'])]
+
+    def __str__(self):
+        return f"{self.medicine_id} = {self.balance} at {self.timestamp}"
+
+
+class StockAlert(models.Model):
+    """
+    Low or out of stock state of a medicine, kept up to date whenever its
+    stock or threshold changes (see inventory/alerts.py). A medicine has at
+    most one alert that is not resolved.
+    """
+    KIND_CHOICES = [
+        ('low_stock', 'Low stock'),
+        ('out_of_stock', 'Out of stock'),
+    ]
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('acknowledged', 'Acknowledged'),
+        ('resolved', 'Resolved'),
+    ]
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_alerts')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    quantity = models.IntegerField()
+    min_quantity = models.IntegerField()
+    opened_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+    acknowledged_by = models.CharField(max_length=100, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'kind']),
+            models.Index(fields=['medicine', 'status']),
+        ]
+        constraints = [
+            # Not enforced on MySQL, which has no partial indexes; there
+            # evaluate_stock_alerts() locks the medicines instead
+            models.UniqueConstraint(
+                fields=['medicine'], condition=~models.Q(status='resolved'),
+                name='unique_unresolved_stock_alert_per_medicine',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.medicine.name} ({self.status})"
+
 
 # Create your models here.
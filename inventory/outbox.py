@@ -0,0 +1,34 @@
+"""
+Outbox events for inventory changes (see core/outbox.py).
+"""
+from core.outbox import enqueue
+
+
+def record_batch_added(batch, performed_by):
+    return enqueue('inventory.batch_added', 'batch', batch.pk, {
+        'batch_id': batch.pk,
+        'medicine_id': batch.medicine_id,
+        'batch_number': batch.batch_number,
+        'quantity': batch.quantity,
+        'expiration_date': batch.expiration_date,
+        'cost_per_unit': batch.cost_per_unit,
+        'performed_by': performed_by,
+    })
+
+
+def record_inventory_adjusted(source_type, source_id, logs, performed_by):
+    return enqueue('inventory.adjusted', source_type, source_id, {
+        'source_type': source_type,
+        'source_id': source_id,
+        'performed_by': performed_by,
+        'movements': [
+            {
+                'log_id': log.pk,
+                'medicine_id': log.medicine_id,
+                'batch_id': log.batch_id,
+                'action': log.action,
+                'quantity': log.quantity,
+            }
+            for log in logs
+        ],
+    })
@@ -0,0 +1,165 @@
+"""
+Read-only list serialisation that bypasses ModelSerializer for hot lists.
+
+Each reader pulls tuples with values_list(), resolves nested objects once per
+id and assembles dicts directly. Output matches the corresponding serializer
+in inventory/serializers.py (checked in inventory/tests.py).
+"""
+from datetime import date
+
+from django.db.models import QuerySet
+from rest_framework import serializers
+
+from .models import Supplier, Category, Medicine, Batch
+
+_datetime_field = serializers.DateTimeField()
+_money_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+IN_CHUNK_SIZE = 1000
+
+
+def format_datetime(value):
+    return _datetime_field.to_representation(value)
+
+
+def format_date(value):
+    return value.isoformat() if value else None
+
+
+def format_money(value):
+    return _money_field.to_representation(value) if value is not None else None
+
+
+def in_chunks(ids, size=IN_CHUNK_SIZE):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def read_rows(model, rows, reader, **kwargs):
+    """
+    Run a queryset reader over either a queryset or a list of model
+    instances (e.g. a page), keeping the order of the input.
+    """
+    if isinstance(rows, QuerySet):
+        return reader(rows.prefetch_related(None), **kwargs)
+    ids = [row.pk for row in rows]
+    by_id = {}
+    for chunk in in_chunks(ids):
+        for data in reader(model.objects.filter(pk__in=chunk), **kwargs):
+            by_id[data['id']] = data
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def suppliers_by_id(ids):
+    suppliers = {}
+    for chunk in in_chunks(ids):
+        for (supplier_id, name, contact_person, phone, email, address,
+             created_at, updated_at) in Supplier.objects.filter(pk__in=chunk).values_list(
+                'id', 'name', 'contact_person', 'phone', 'email', 'address',
+                'created_at', 'updated_at'):
+            suppliers[supplier_id] = {
+                'id': supplier_id,
+                'name': name,
+                'contact_person': contact_person,
+                'phone': phone,
+                'email': email,
+                'address': address,
+                'created_at': format_datetime(created_at),
+                'updated_at': format_datetime(updated_at),
+            }
+    return suppliers
+
+
+def categories_by_id(ids):
+    categories = {}
+    for chunk in in_chunks(ids):
+        for category_id, name, description in Category.objects.filter(pk__in=chunk).values_list(
+                'id', 'name', 'description'):
+            categories[category_id] = {'id': category_id, 'name': name, 'description': description}
+    return categories
+
+
+BATCH_FIELDS = ('id', 'batch_number', 'expiration_date', 'quantity', 'cost_per_unit', 'version', 'created_at')
+
+
+def _batch_dict(values, today):
+    batch_id, batch_number, expiration_date, quantity, cost_per_unit, version, created_at = values
+    return {
+        'id': batch_id,
+        'batch_number': batch_number,
+        'expiration_date': format_date(expiration_date),
+        'quantity': quantity,
+        'cost_per_unit': format_money(cost_per_unit),
+        'days_until_expiry': (expiration_date - today).days,
+        'version': version,
+        'created_at': format_datetime(created_at),
+    }
+
+
+def _batch_rows(queryset, today=None):
+    today = today or date.today()
+    return [_batch_dict(values, today) for values in queryset.values_list(*BATCH_FIELDS)]
+
+
+def batch_rows(rows, today=None):
+    """
+    Fast equivalent of BatchSerializer(rows, many=True).data
+    """
+    return read_rows(Batch, rows, _batch_rows, today=today)
+
+
+def batches_by_medicine(medicine_ids, today=None):
+    today = today or date.today()
+    batches = {}
+    for chunk in in_chunks(medicine_ids):
+        queryset = Batch.objects.filter(medicine_id__in=chunk).order_by('medicine_id', 'id')
+        for values in queryset.values_list('medicine_id', *BATCH_FIELDS):
+            batches.setdefault(values[0], []).append(_batch_dict(values[1:], today))
+    return batches
+
+
+def _medicine_rows(queryset, today=None):
+    rows = list(queryset.values_list(
+        'id', 'name', 'barcode', 'category_id', 'min_quantity', 'supplier_id',
+        'price_per_unit', 'created_at', 'updated_at'
+    ))
+    categories = categories_by_id({row[3] for row in rows if row[3] is not None})
+    suppliers = suppliers_by_id({row[5] for row in rows if row[5] is not None})
+    batches = batches_by_medicine([row[0] for row in rows], today)
+
+    medicines = []
+    for (medicine_id, name, barcode, category_id, min_quantity, supplier_id,
+         price_per_unit, created_at, updated_at) in rows:
+        medicine_batches = batches.get(medicine_id, [])
+        total_quantity = sum(batch['quantity'] for batch in medicine_batches)
+        medicines.append({
+            'id': medicine_id,
+            'name': name,
+            'barcode': barcode,
+            'category': categories.get(category_id),
+            'min_quantity': min_quantity,
+            'supplier': suppliers.get(supplier_id),
+            'price_per_unit': format_money(price_per_unit),
+            'batches': medicine_batches,
+            'total_quantity': total_quantity,
+            'low_stock': total_quantity <= min_quantity,
+            'created_at': format_datetime(created_at),
+            'updated_at': format_datetime(updated_at),
+        })
+    return medicines
+
+
+def medicine_rows(rows, today=None):
+    """
+    Fast equivalent of MedicineSerializer(rows, many=True).data
+    """
+    return read_rows(Medicine, rows, _medicine_rows, today=today)
+
+
+def medicines_by_id(ids, today=None):
+    medicines = {}
+    for chunk in in_chunks(ids):
+        for data in _medicine_rows(Medicine.objects.filter(pk__in=chunk), today):
+            medicines[data['id']] = data
+    return medicines
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Supplier, Category, Medicine, Batch, InventoryLog
+from .models import (
+    Supplier, Category, Medicine, Batch, InventoryLog, StockForecast, StockLedgerEntry,
+    StockAlert
+)
 
 class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,8 +26,8 @@ class BatchSerializer(serializers.ModelSerializer):
     class Meta:
         model = Batch
         fields = ['id', 'batch_number', 'expiration_date', 'quantity',
-                 'cost_per_unit', 'supplier', 'supplier_id', 'days_until_expiry', 'created_at']
-        read_only_fields = ['created_at']
+                 'cost_per_unit', 'supplier', 'supplier_id', 'days_until_expiry', 'version', 'created_at']
+        read_only_fields = ['version', 'created_at']
 
     def get_days_until_expiry(self, obj):
         from datetime import date
@@ -81,5 +84,32 @@ class InventoryLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = InventoryLog
         fields = ['id', 'medicine', 'medicine_id', 'batch', 'batch_id',
-                 'action', 'quantity', 'timestamp', 'performed_by', 'notes']
-        read_only_fields = ['timestamp'] 
\ No newline at end of file
+                 'action', 'quantity', 'timestamp', 'performed_by', 'notes', 'cost_value']
+        read_only_fields = ['timestamp', 'cost_value'] 
+
+class StockForecastSerializer(serializers.ModelSerializer):
+    medicine_id = serializers.IntegerField(source='medicine.id', read_only=True)
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+    min_quantity = serializers.IntegerField(source='medicine.min_quantity', read_only=True)
+
+    class Meta:
+        model = StockForecast
+        fields = ['medicine_id', 'medicine_name', 'min_quantity', 'avg_daily_consumption',
+                 'consumption_std', 'on_hand', 'days_of_cover', 'reorder_point',
+                 'reorder_quantity', 'needs_reorder', 'window_days', 'lead_time_days',
+                 'computed_at']
+
+class StockLedgerEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockLedgerEntry
+        fields = ['id', 'batch', 'medicine', 'delta', 'balance', 'reason', 'reference', 'timestamp']
+
+class StockAlertSerializer(serializers.ModelSerializer):
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+
+    class Meta:
+        model = StockAlert
+        fields = ['id', 'medicine', 'medicine_name', 'kind', 'kind_display', 'status',
+                 'quantity', 'min_quantity', 'opened_at', 'updated_at',
+                 'acknowledged_at', 'acknowledged_by', 'resolved_at']
\ No newline at end of file
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core.events import publish_on_commit
+from .alerts import evaluate_stock_alerts
+from .ledger import record_entries, stock_changed
+from .models import Supplier, Category, Medicine, Batch
+from .snapshots import schedule_catalogue_rebuild
+
+
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Medicine)
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Medicine)
+@receiver(post_delete, sender=Batch)
+def catalogue_changed(sender, **kwargs):
+    transaction.on_commit(schedule_catalogue_rebuild)
+
+
+@receiver(pre_save, sender=Batch)
+def remember_batch_quantity(sender, instance, raw=False, **kwargs):
+    # Instances that were not loaded from the database (e.g. Batch(pk=...))
+    # have no remembered quantity, so read it before it is overwritten
+    if raw or instance._state.adding or hasattr(instance, '_loaded_quantity'):
+        return
+    instance._loaded_quantity = (
+        Batch.objects.filter(pk=instance.pk).values_list('quantity', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Batch)
+def record_batch_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = 0 if created else (getattr(instance, '_loaded_quantity', None) or 0)
+    record_entries([(
+        instance.pk, instance.medicine_id, instance.quantity - previous, instance.quantity
+    )], reason='ADD' if created else None)
+    instance._loaded_quantity = instance.quantity
+
+
+@receiver(post_delete, sender=Batch)
+def record_batch_delete(sender, instance, origin=None, **kwargs):
+    # Batches removed along with their medicine take its ledger with them
+    if isinstance(origin, Medicine) or getattr(origin, 'model', None) is Medicine:
+        return
+    record_entries(
+        [(instance.pk, instance.medicine_id, -instance.quantity, 0)],
+        reason='REMOVE',
+        reference=f'Deleted batch {instance.batch_number}'
+    )
+
+
+@receiver(stock_changed)
+def publish_batch_changes(sender, entries, **kwargs):
+    publish_on_commit('batch.quantity_changed', {
+        'batches': [
+            {
+                'batch_id': entry.batch_id,
+                'medicine_id': entry.medicine_id,
+                'delta': entry.delta,
+                'quantity': entry.balance,
+                'reason': entry.reason,
+            }
+            for entry in entries
+        ]
+    }, {'kind': 'stock'})
+
+
+@receiver(stock_changed)
+def stock_alerts_on_stock_change(sender, entries, **kwargs):
+    medicine_ids = {entry.medicine_id for entry in entries}
+    transaction.on_commit(lambda: evaluate_stock_alerts(medicine_ids))
+
+
+@receiver(post_save, sender=Medicine)
+def stock_alerts_on_threshold_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: evaluate_stock_alerts([instance.pk]))
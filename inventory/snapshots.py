@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Supplier, Category, Medicine, Batch
+
+SNAPSHOT_PREFIX = 'catalogue-'
+SNAPSHOT_SUFFIX = '.json.gz'
+
+_rebuild_lock = threading.Lock()
+_rebuild_timer = None
+
+
+def snapshot_dir():
+    return getattr(settings, 'CATALOGUE_SNAPSHOT_DIR', settings.BASE_DIR / 'snapshots')
+
+
+def snapshot_path(version):
+    return os.path.join(snapshot_dir(), f'{SNAPSHOT_PREFIX}{version}{SNAPSHOT_SUFFIX}')
+
+
+def catalogue_version():
+    """
+    Cheap fingerprint of the catalogue tables: changes whenever a row is
+    added, removed or saved in any of them.
+    """
+    parts = []
+    for model in (Supplier, Category, Medicine, Batch):
+        state = model.objects.aggregate(
+            count=Count('id'),
+            last_id=Max('id'),
+            last_update=Max('updated_at')
+        )
+        parts.append(f"{state['count']}:{state['last_id']}:{state['last_update']}")
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def build_catalogue(version):
+    suppliers = list(Supplier.objects.order_by('id').values(
+        'id', 'name', 'contact_person', 'phone', 'email', 'address'
+    ))
+    categories = list(Category.objects.order_by('id').values('id', 'name', 'description'))
+
+    medicines = []
+    rows = Medicine.objects.order_by('id').annotate(
+        total_quantity=Coalesce(Sum('batches__quantity'), 0),
+        batch_count=Count('batches'),
+        earliest_expiry=Min('batches__expiration_date', filter=Q(batches__quantity__gt=0))
+    ).values_list(
+        'id', 'name', 'barcode', 'category_id', 'supplier_id', 'min_quantity',
+        'price_per_unit', 'total_quantity', 'batch_count', 'earliest_expiry'
+    )
+    for (medicine_id, name, barcode, category_id, supplier_id, min_quantity,
+         price_per_unit, total_quantity, batch_count, earliest_expiry) in rows:
+        medicines.append({
+            'id': medicine_id,
+            'name': name,
+            'barcode': barcode,
+            'category_id': category_id,
+            'supplier_id': supplier_id,
+            'min_quantity': min_quantity,
+            'price_per_unit': str(price_per_unit),
+            'total_quantity': total_quantity,
+            'batch_count': batch_count,
+            'earliest_expiry': earliest_expiry,
+            'low_stock': total_quantity <= min_quantity,
+        })
+
+    return {
+        'version': version,
+        'generated_at': timezone.now(),
+        'suppliers': suppliers,
+        'categories': categories,
+        'medicines': medicines,
+    }
+
+
+def write_catalogue_snapshot(version=None):
+    """
+    Materialise the catalogue into a gzipped JSON file named after its
+    version. Returns the path of the snapshot.
+    """
+    version = version or catalogue_version()
+    path = snapshot_path(version)
+    if os.path.exists(path):
+        return path
+
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    payload = json.dumps(build_catalogue(version), cls=JSONEncoder, separators=(',', ':'))
+
+    # Write to a temp file first so readers never see a partial snapshot
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as out:
+        out.write(payload.encode('utf-8'))
+    os.replace(tmp_path, path)
+
+    prune_catalogue_snapshots(keep=path)
+    return path
+
+
+def prune_catalogue_snapshots(keep):
+    directory = snapshot_dir()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX) and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _rebuild():
+    global _rebuild_timer
+    with _rebuild_lock:
+        _rebuild_timer = None
+    try:
+        write_catalogue_snapshot()
+    finally:
+        close_old_connections()
+
+
+def schedule_catalogue_rebuild():
+    """
+    Rebuild the snapshot in a background thread shortly after a change.
+    Bursts of writes collapse into a single rebuild.
+    """
+    global _rebuild_timer
+    if not getattr(settings, 'CATALOGUE_SNAPSHOT_AUTO_REBUILD', True):
+        return
+    with _rebuild_lock:
+        if _rebuild_timer is not None:
+            return
+        delay = getattr(settings, 'CATALOGUE_SNAPSHOT_REBUILD_DELAY', 5)
+        _rebuild_timer = threading.Timer(delay, _rebuild)
+        _rebuild_timer.daemon = True
+        _rebuild_timer.start()
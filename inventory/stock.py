@@ -0,0 +1,292 @@
+"""
+Stock changes as compare-and-swap updates on Batch.version.
+
+Each helper reads the batch, computes the new quantity and writes it only
+if the version is unchanged, retrying a bounded number of times when
+another request got there first. Only quantity, version and updated_at are
+written, and every change is recorded in the stock ledger.
+
+Retries re-read the row, which relies on READ COMMITTED isolation (Django's
+default on MySQL) so that a retry inside a transaction sees the competing
+commit instead of the snapshot it started with.
+"""
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .ledger import record_entries
+from .models import Batch, BatchVersionConflict
+
+StockChange = namedtuple('StockChange', 'batch_id medicine_id delta quantity version attempts')
+# One batch's share of the index-th requested line in dispense_lines()
+Allocation = namedtuple('Allocation', 'index medicine_id batch_id batch_number expiration_date quantity')
+
+
+class InsufficientStock(Exception):
+    def __init__(self, message, available=0, shortages=None):
+        super().__init__(message)
+        self.available = available
+        # [{'index', 'medicine_id', 'requested', 'available'}, ...] from dispense_lines()
+        self.shortages = shortages or []
+
+
+class StockConflict(BatchVersionConflict):
+    """
+    The update kept losing to concurrent writers and gave up.
+    """
+
+
+def max_retries():
+    return getattr(settings, 'STOCK_CAS_MAX_RETRIES', 5)
+
+
+def _backoff(attempt):
+    # Jittered so that writers that collided do not collide again in lockstep
+    time.sleep(random.uniform(0, 0.002 * (2 ** attempt)))
+
+
+def compare_and_swap(batch_id, expected_version, quantity):
+    """
+    Set the quantity if the batch is still at ``expected_version``.
+    Returns True when the row was updated.
+    """
+    return Batch.objects.filter(pk=batch_id, version=expected_version).update(
+        quantity=quantity, version=F('version') + 1, updated_at=timezone.now()
+    ) == 1
+
+
+def change_batch_quantity(batch_id, delta, expected_version=None, retries=None,
+                          reason=None, reference=None):
+    """
+    Add ``delta`` (negative to remove) to a batch's quantity.
+
+    With ``expected_version`` the change only applies to that version and a
+    concurrent change raises BatchVersionConflict immediately; otherwise it is
+    retried on the fresh row up to ``retries`` times before StockConflict.
+    Raises InsufficientStock if the quantity would go below zero.
+    """
+    retries = max_retries() if retries is None else retries
+    for attempt in range(retries + 1):
+        row = Batch.objects.filter(pk=batch_id).values_list('medicine_id', 'quantity', 'version').first()
+        if row is None:
+            raise Batch.DoesNotExist(f'Batch {batch_id} does not exist')
+        medicine_id, quantity, version = row
+        if expected_version is not None and version != expected_version:
+            raise BatchVersionConflict(f'Batch {batch_id} is at version {version}, not {expected_version}')
+        if quantity + delta < 0:
+            raise InsufficientStock(f'Batch {batch_id} has only {quantity} units', available=quantity)
+
+        if compare_and_swap(batch_id, version, quantity + delta):
+            record_entries([(batch_id, medicine_id, delta, quantity + delta)], reason, reference)
+            return StockChange(batch_id, medicine_id, delta, quantity + delta, version + 1, attempt + 1)
+        if expected_version is not None:
+            raise BatchVersionConflict(f'Batch {batch_id} was modified concurrently')
+        _backoff(attempt)
+    raise StockConflict(f'Gave up updating batch {batch_id} after {retries + 1} attempts')
+
+
+def _fefo_takes(batches, quantity, reserved=None):
+    """
+    {batch_id: units} taking ``quantity`` from (batch_id, quantity, ...)
+    rows in order, using the units ``reserved`` ({batch_id: units}) for
+    planned refills only once the rest has run out.
+    """
+    reserved = reserved or {}
+    takes, remaining = {}, quantity
+    for use_reserved in (False, True):
+        for batch_id, batch_quantity, *_ in batches:
+            left = batch_quantity - takes.get(batch_id, 0)
+            if not use_reserved:
+                left -= reserved.get(batch_id, 0)
+            take = min(max(left, 0), remaining)
+            if take:
+                takes[batch_id] = takes.get(batch_id, 0) + take
+                remaining -= take
+            if remaining == 0:
+                return takes
+    return takes
+
+
+def dispense_fefo(medicine_id, quantity, retries=None, reason=None, reference=None, reserved=None,
+                  today=None):
+    """
+    Take ``quantity`` units of a medicine from its batches that are still in
+    date on ``today``, earliest expiry first, leaving units ``reserved`` for
+    planned refills ({batch_id: units}) until the others have run out. A
+    batch that changed since it was read is re-read and the remaining
+    quantity is re-planned, up to ``retries`` times in total.
+    Raises InsufficientStock if the medicine does not have enough units and
+    StockConflict when retries run out. Call it inside a transaction so that
+    a failure part-way is rolled back.
+    Returns the list of StockChange made.
+    """
+    retries = max_retries() if retries is None else retries
+    today = today or timezone.localdate()
+    changes = []
+    remaining = quantity
+    conflicts = 0
+    while remaining > 0:
+        batches = list(
+            Batch.objects.filter(medicine_id=medicine_id, quantity__gt=0, expiration_date__gte=today)
+            .order_by('expiration_date', 'id')
+            .values_list('id', 'quantity', 'version')
+        )
+        available = sum(batch_quantity for _, batch_quantity, _ in batches)
+        if available < remaining:
+            raise InsufficientStock(
+                f'Medicine {medicine_id} has only {available} units', available=available
+            )
+        takes = _fefo_takes(batches, remaining, reserved)
+        for batch_id, batch_quantity, version in batches:
+            take = takes.get(batch_id)
+            if not take:
+                continue
+            if not compare_and_swap(batch_id, version, batch_quantity - take):
+                conflicts += 1
+                if conflicts > retries:
+                    raise StockConflict(
+                        f'Gave up dispensing medicine {medicine_id} after {conflicts} conflicts'
+                    )
+                _backoff(conflicts)
+                break
+            changes.append(StockChange(
+                batch_id, medicine_id, -take, batch_quantity - take, version + 1, conflicts + 1
+            ))
+            remaining -= take
+            if remaining == 0:
+                break
+    record_entries(
+        [(change.batch_id, medicine_id, change.delta, change.quantity) for change in changes],
+        reason, reference
+    )
+    return changes
+
+
+class _LostRace(Exception):
+    pass
+
+
+# Fallback pass of _plan_lines() over the units not reserved for planned refills
+_UNRESERVED = object()
+
+
+def _plan_lines(lines, batches, preferred=None, reserved=None):
+    """
+    Allocate (medicine_id, quantity) lines to batch rows, earliest expiry
+    first, lines in order. Batches in ``preferred`` ({index: [(batch_id,
+    quantity), ...]}) are drawn from first, up to the quantity given, as
+    long as they are still usable. Units ``reserved`` for other planned
+    refills ({batch_id: units}) are used only once the rest has run out.
+    Returns (allocations, takes by batch id, shortages).
+    """
+    by_medicine = {}
+    for row in batches:
+        by_medicine.setdefault(row[1], []).append(row)
+    rows = {row[0]: row for row in batches}
+    left = {row[0]: row[2] for row in batches}
+    held = dict(reserved or {})
+    allocations, shortages = [], []
+    for index, (medicine_id, quantity) in enumerate(lines):
+        available = sum(left[row[0]] for row in by_medicine.get(medicine_id, []))
+        if available < quantity:
+            shortages.append({
+                'index': index, 'medicine_id': medicine_id, 'requested': quantity, 'available': available
+            })
+            continue
+        remaining = quantity
+        planned = []
+        for batch_id, planned_quantity in (preferred or {}).get(index, []):
+            row = rows.get(batch_id)
+            if row is not None and row[1] == medicine_id:
+                planned.append((row, planned_quantity))
+        planned += [(row, _UNRESERVED) for row in by_medicine[medicine_id]]
+        planned += [(row, None) for row in by_medicine[medicine_id]]
+        line_takes = {}
+        for row, limit in planned:
+            if limit is _UNRESERVED:
+                limit = max(left[row[0]] - held.get(row[0], 0), 0)
+            take = min(left[row[0]], remaining if limit is None else min(limit, remaining))
+            if take:
+                left[row[0]] -= take
+                remaining -= take
+                line_takes[row[0]] = line_takes.get(row[0], 0) + take
+                if row[0] in held:
+                    held[row[0]] = min(held[row[0]], left[row[0]])
+            if remaining == 0:
+                break
+        for batch_id, take in line_takes.items():
+            _, _, _, _, batch_number, expiration_date = rows[batch_id]
+            allocations.append(Allocation(index, medicine_id, batch_id, batch_number, expiration_date, take))
+    takes = {}
+    for allocation in allocations:
+        takes[allocation.batch_id] = takes.get(allocation.batch_id, 0) + allocation.quantity
+    return allocations, takes, shortages
+
+
+def dispense_lines(lines, retries=None, reason=None, reference=None, today=None, preferred=None,
+                   reserved=None):
+    """
+    Take stock for several (medicine_id, quantity) lines at once, e.g. all
+    items of a prescription, from unexpired batches earliest expiry first,
+    or from the batches planned for each line in ``preferred`` while they
+    last, keeping units ``reserved`` for other refills until last (see
+    _plan_lines).
+
+    The batches of every line are read with one query and all of them are
+    decremented by one UPDATE that compare-and-swaps each batch's version;
+    if any batch moved on, nothing is applied and the plan is redone, up to
+    ``retries`` times before StockConflict. Raises InsufficientStock, with
+    every short line in ``shortages``, if any line cannot be covered.
+    Call it inside a transaction together with the change it belongs to.
+    Returns the list of Allocation made.
+    """
+    retries = max_retries() if retries is None else retries
+    today = today or timezone.localdate()
+    medicine_ids = {medicine_id for medicine_id, _ in lines}
+    for attempt in range(retries + 1):
+        batches = list(
+            Batch.objects.filter(medicine_id__in=medicine_ids, quantity__gt=0, expiration_date__gte=today)
+            .order_by('medicine_id', 'expiration_date', 'id')
+            .values_list('id', 'medicine_id', 'quantity', 'version', 'batch_number', 'expiration_date')
+        )
+        allocations, takes, shortages = _plan_lines(lines, batches, preferred, reserved)
+        if shortages:
+            raise InsufficientStock(
+                f'Not enough stock for medicine {shortages[0]["medicine_id"]}',
+                available=shortages[0]['available'], shortages=shortages
+            )
+        if not takes:
+            return allocations
+
+        rows = {row[0]: row for row in batches if row[0] in takes}
+        matches = Q()
+        for batch_id, (_, _, _, version, _, _) in rows.items():
+            matches |= Q(pk=batch_id, version=version)
+        try:
+            with transaction.atomic():
+                updated = Batch.objects.filter(matches).update(
+                    quantity=Case(
+                        *[When(pk=batch_id, then=Value(row[2] - takes[batch_id])) for batch_id, row in rows.items()],
+                        output_field=IntegerField(),
+                    ),
+                    version=F('version') + 1,
+                    updated_at=timezone.now(),
+                )
+                if updated != len(rows):
+                    raise _LostRace
+        except _LostRace:
+            if attempt < retries:
+                _backoff(attempt)
+            continue
+
+        record_entries(
+            [(batch_id, row[1], -takes[batch_id], row[2] - takes[batch_id]) for batch_id, row in rows.items()],
+            reason, reference
+        )
+        return allocations
+    raise StockConflict(f'Gave up dispensing after {retries + 1} attempts')
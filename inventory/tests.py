@@ -1,3 +1,380 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import snapshots
+from .alerts import evaluate_stock_alerts
+from .expiry import expire_batches
+from .ledger import batch_balance_as_of
+from .models import (
+    Supplier, Category, Medicine, Batch, BatchVersionConflict, InventoryLog, StockAlert, StockLedgerEntry,
+    ValuationSnapshot,
+)
+from .readers import batch_rows, medicine_rows
+from .serializers import BatchSerializer, MedicineSerializer
+from .stock import InsufficientStock, dispense_fefo
+from .valuation import take_snapshot
+
+
+class FastReaderParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        supplier = Supplier.objects.create(
+            name='Acme', contact_person='Jane', phone='123',
+            email='acme@example.com', address='1 Main St'
+        )
+        category = Category.objects.create(name='Analgesics', description='Pain relief')
+        cls.paracetamol = Medicine.objects.create(
+            name='Paracetamol', category=category, supplier=supplier,
+            min_quantity=50, price_per_unit='2.50', barcode='P-001'
+        )
+        cls.orphan = Medicine.objects.create(
+            name='Unfiled', min_quantity=0, price_per_unit='10.00', barcode='U-001'
+        )
+        Batch.objects.create(
+            medicine=cls.paracetamol, batch_number='B1', quantity=30,
+            expiration_date=date.today() + timedelta(days=10), cost_per_unit='1.25'
+        )
+        Batch.objects.create(
+            medicine=cls.paracetamol, batch_number='B2', quantity=5,
+            expiration_date=date.today() - timedelta(days=3), cost_per_unit='1.10'
+        )
+
+    def test_batch_rows_match_serializer(self):
+        batches = Batch.objects.all()
+        self.assertEqual(batch_rows(batches), BatchSerializer(batches, many=True).data)
+
+    def test_medicine_rows_match_serializer(self):
+        medicines = Medicine.objects.all()
+        self.assertEqual(medicine_rows(medicines), MedicineSerializer(medicines, many=True).data)
+
+    def test_rows_from_instance_list_keep_order(self):
+        medicines = [self.orphan, self.paracetamol]
+        self.assertEqual(medicine_rows(medicines), MedicineSerializer(medicines, many=True).data)
+
+
+class StockAlertAcknowledgeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medicine = Medicine.objects.create(name='Ibuprofen', min_quantity=10, price_per_unit='1.00', barcode='I-001')
+        cls.alert, _ = StockAlert.objects.get_or_create(
+            medicine=medicine, defaults={'kind': 'out_of_stock', 'quantity': 0, 'min_quantity': 10}
+        )
+
+    def client_for(self, role):
+        user = User.objects.create_user(role)
+        user.userprofile.role = role
+        user.userprofile.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def acknowledge(self, role):
+        return self.client_for(role).post(f'/api/inventory/stock-alerts/{self.alert.pk}/acknowledge/')
+
+    def test_pharmacist_can_acknowledge(self):
+        response = self.acknowledge('pharmacist')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'acknowledged')
+        self.assertEqual(response.data['acknowledged_by'], 'pharmacist')
+
+    def test_pharmacist_can_retrieve(self):
+        response = self.client_for('pharmacist').get(f'/api/inventory/stock-alerts/{self.alert.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_doctor_cannot_acknowledge(self):
+        self.assertEqual(self.acknowledge('doctor').status_code, 403)
+
+
+class StockAlertEvaluationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medicine = Medicine.objects.create(name='Ibuprofen', min_quantity=10, price_per_unit='1.00', barcode='I-001')
+
+    def unresolved(self):
+        return list(StockAlert.objects.exclude(status='resolved').values_list('kind', flat=True))
+
+    def test_medicine_keeps_one_unresolved_alert(self):
+        evaluate_stock_alerts([self.medicine.pk])
+        evaluate_stock_alerts([self.medicine.pk])
+        self.assertEqual(self.unresolved(), ['out_of_stock'])
+
+        Batch.objects.create(
+            medicine=self.medicine, batch_number='B1', quantity=3,
+            expiration_date=date.today() + timedelta(days=90), cost_per_unit='1.00'
+        )
+        evaluate_stock_alerts([self.medicine.pk])
+        self.assertEqual(self.unresolved(), ['low_stock'])
+
+    @skipUnlessDBFeature('supports_partial_indexes')
+    def test_second_unresolved_alert_is_rejected(self):
+        StockAlert.objects.create(medicine=self.medicine, kind='out_of_stock', quantity=0, min_quantity=10)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StockAlert.objects.create(medicine=self.medicine, kind='low_stock', quantity=3, min_quantity=10)
+        StockAlert.objects.update(status='resolved')
+        StockAlert.objects.create(medicine=self.medicine, kind='low_stock', quantity=3, min_quantity=10)
+
+
+class ReservedStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medicine = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        cls.medicine_id = medicine.pk
+        cls.first, cls.second = [
+            Batch.objects.create(
+                medicine=medicine, batch_number=f'B{days}', quantity=10,
+                expiration_date=date.today() + timedelta(days=days), cost_per_unit='0.50'
+            )
+            for days in (10, 100)
+        ]
+
+    def quantities(self):
+        return list(Batch.objects.order_by('expiration_date').values_list('quantity', flat=True))
+
+    def test_fefo_takes_unreserved_units_first(self):
+        dispense_fefo(self.medicine_id, 12, reserved={self.first.pk: 8})
+        self.assertEqual(self.quantities(), [8, 0])
+
+    def test_fefo_without_reservations(self):
+        dispense_fefo(self.medicine_id, 12)
+        self.assertEqual(self.quantities(), [0, 8])
+
+    def test_fefo_skips_expired_batches(self):
+        today = self.first.expiration_date + timedelta(days=1)
+        with self.assertRaises(InsufficientStock):
+            dispense_fefo(self.medicine_id, 12, today=today)
+        dispense_fefo(self.medicine_id, 5, today=today)
+        self.assertEqual(self.quantities(), [10, 5])
+
+
+class BatchVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medicine = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        cls.batch = Batch.objects.create(
+            medicine=medicine, batch_number='B1', quantity=10,
+            expiration_date=date.today() + timedelta(days=100), cost_per_unit='0.50'
+        )
+        user = User.objects.create_user('admin')
+        user.userprofile.role = 'admin'
+        user.userprofile.save()
+        cls.user = user
+
+    def patch(self, version):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.patch(
+            f'/api/inventory/batches/{self.batch.pk}/', {'batch_number': 'B2', 'version': version}, format='json'
+        )
+
+    def test_current_version_is_saved(self):
+        self.assertEqual(self.patch(self.batch.version).status_code, 200)
+
+    def test_stale_version_conflicts(self):
+        self.assertEqual(self.patch(self.batch.version - 1).status_code, 409)
+
+    def test_malformed_version_is_rejected(self):
+        response = self.patch('abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'version must be an integer'})
+
+    def test_stale_instance_is_not_saved(self):
+        stale = Batch.objects.get(pk=self.batch.pk)
+        current = Batch.objects.get(pk=self.batch.pk)
+        current.quantity = 7
+        current.save()
+        stale.quantity = 3
+        with self.assertRaises(BatchVersionConflict):
+            stale.save()
+        self.assertEqual(stale.version, current.version - 1)
+        self.assertEqual(Batch.objects.get(pk=self.batch.pk).quantity, 7)
+
+
+class StockLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medicine = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        cls.batch = Batch.objects.create(
+            medicine=medicine, batch_number='B1', quantity=10,
+            expiration_date=date.today() + timedelta(days=100), cost_per_unit='0.50'
+        )
+        cls.user = User.objects.create_user('admin')
+        cls.user.userprofile.role = 'admin'
+        cls.user.userprofile.save()
+
+    def as_of(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get('/api/inventory/stock-ledger/as_of/', params)
+
+    def test_deleted_batch_keeps_its_history(self):
+        batch_id = self.batch.pk
+        self.batch.delete()
+        entries = StockLedgerEntry.objects.filter(batch_id=batch_id).order_by('id')
+        self.assertEqual([(entry.reason, entry.delta, entry.balance) for entry in entries],
+                         [('ADD', 10, 10), ('REMOVE', -10, 0)])
+        self.assertEqual(batch_balance_as_of(batch_id, date.today()), 0)
+
+    def test_as_of(self):
+        response = self.as_of(batch_id=self.batch.pk, at=date.today().isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 10)
+
+    def test_as_of_rejects_non_integer_ids(self):
+        self.assertEqual(self.as_of(batch_id='abc', at=date.today().isoformat()).status_code, 400)
+        self.assertEqual(self.as_of(medicine_id='1x', at=date.today().isoformat()).status_code, 400)
+
+
+class StreamingListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medicine = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        for number in range(5):
+            Batch.objects.create(
+                medicine=medicine, batch_number=f'B{number}', quantity=number,
+                expiration_date=date.today() + timedelta(days=100 - number), cost_per_unit='0.50'
+            )
+        cls.user = User.objects.create_user('admin')
+        cls.user.userprofile.role = 'admin'
+        cls.user.userprofile.save()
+
+    def stream(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/inventory/batches/', {'stream': 'true'})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_chunks_join_into_one_array_in_pk_order(self):
+        expected = list(Batch.objects.order_by('pk').values_list('batch_number', flat=True))
+        for chunk_size in (1, 2, 5, 500):
+            with self.subTest(chunk_size=chunk_size), override_settings(STREAMING_LIST_CHUNK_SIZE=chunk_size):
+                self.assertEqual([row['batch_number'] for row in self.stream()], expected)
+
+    @override_settings(STREAMING_LIST_CHUNK_SIZE=2)
+    def test_each_chunk_is_a_bounded_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.stream()
+        pages = [query['sql'] for query in queries if 'ORDER BY' in query['sql']]
+        self.assertEqual(len(pages), 3)
+        for sql in pages:
+            self.assertIn('LIMIT 2', sql)
+
+
+class CatalogueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        cls.user = User.objects.create_user('admin')
+        cls.user.userprofile.role = 'admin'
+        cls.user.userprofile.save()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CATALOGUE_SNAPSHOT_DIR=directory.name, CATALOGUE_SNAPSHOT_AUTO_REBUILD=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **headers):
+        return self.client.get('/api/inventory/medicines/catalogue/', **headers)
+
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return json.loads(content)
+
+    def test_gzip_only_when_accepted(self):
+        self.assertEqual(self.get(HTTP_ACCEPT_ENCODING='gzip, br').get('Content-Encoding'), 'gzip')
+        for header in ('gzip;q=0', 'identity', 'gzip; q=0.0, identity'):
+            with self.subTest(header=header):
+                response = self.get(HTTP_ACCEPT_ENCODING=header)
+                self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+                self.assertEqual(self.body(response)['medicines'][0]['name'], 'Ibuprofen')
+
+    def test_not_modified_only_for_a_matching_etag(self):
+        etag = self.get()['ETag']
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(header=header):
+                self.assertEqual(self.get(HTTP_IF_NONE_MATCH=header).status_code, 304)
+        # A tag that merely contains the current one is a different tag
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'"x{etag[1:]}').status_code, 200)
+
+    def test_pruned_snapshot_is_rebuilt(self):
+        write = snapshots.write_catalogue_snapshot
+
+        def pruned(version):
+            # A concurrent rebuild removes the file before it is opened
+            path = write(version)
+            os.remove(path)
+            mock_write.side_effect = write
+            return path
+
+        with mock.patch('inventory.views.write_catalogue_snapshot', side_effect=pruned) as mock_write:
+            response = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response)['medicines'][0]['name'], 'Ibuprofen')
+
+
+class ExpirySweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medicine = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        # Ids deliberately out of expiry order, with two batches sharing a date
+        for number, days_ago, quantity in [(1, 3, 4), (2, 10, 2), (3, 3, 1), (4, -5, 7), (5, 1, 0)]:
+            Batch.objects.create(
+                medicine=medicine, batch_number=f'B{number}', quantity=quantity,
+                expiration_date=date.today() - timedelta(days=days_ago), cost_per_unit='0.50'
+            )
+
+    def test_every_expired_batch_is_written_off_once(self):
+        self.assertEqual(expire_batches(chunk_size=1), {'batches': 3, 'units': 7, 'cost_value': Decimal('3.50')})
+        self.assertEqual(expire_batches(chunk_size=2)['batches'], 0)
+        self.assertEqual(
+            dict(Batch.objects.values_list('batch_number', 'quantity')),
+            {'B1': 0, 'B2': 0, 'B3': 0, 'B4': 7, 'B5': 0}
+        )
+        self.assertEqual(
+            sorted(InventoryLog.objects.filter(action='EXPIRE').values_list('batch__batch_number', 'cost_value')),
+            [('B1', Decimal('2.00')), ('B2', Decimal('1.00')), ('B3', Decimal('0.50'))]
+        )
+
+
+class ValuationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('admin')
+        cls.user.userprofile.role = 'admin'
+        cls.user.userprofile.save()
+        batch = Batch.objects.create(
+            medicine=Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001'),
+            batch_number='B1', quantity=10, expiration_date=date.today() + timedelta(days=90), cost_per_unit='0.50'
+        )
+        Batch.objects.filter(pk=batch.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+    def valuation(self, as_of):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get(f'/api/inventory/valuation/?as_of={as_of.isoformat()}')
+
+    def test_reconstructed_day_is_not_stored(self):
+        yesterday = date.today() - timedelta(days=1)
+        self.assertEqual(self.valuation(yesterday).data['source'], 'reconstructed')
+        self.assertFalse(ValuationSnapshot.objects.exists())
+
+        take_snapshot(yesterday)
+        self.assertEqual(self.valuation(yesterday).data['source'], 'snapshot')
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     SupplierViewSet, CategoryViewSet, MedicineViewSet,
-    BatchViewSet, InventoryLogViewSet
+    BatchViewSet, InventoryLogViewSet, ValuationViewSet, StockForecastViewSet,
+    StockLedgerViewSet, StockAlertViewSet, StockAvailabilityViewSet
 )
 
 router = DefaultRouter()
@@ -11,6 +12,11 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'medicines', MedicineViewSet)
 router.register(r'batches', BatchViewSet)
 router.register(r'inventory-logs', InventoryLogViewSet)
+router.register(r'valuation', ValuationViewSet, basename='valuation')
+router.register(r'forecasts', StockForecastViewSet)
+router.register(r'stock-ledger', StockLedgerViewSet)
+router.register(r'stock-alerts', StockAlertViewSet)
+router.register(r'stock-availability', StockAvailabilityViewSet, basename='stock-availability')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,157 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Supplier, Category, Batch, InventoryLog, ValuationSnapshot
+
+VALUE_FIELD = DecimalField(max_digits=16, decimal_places=2)
+GROUP_BY_CHOICES = ('category', 'supplier', 'category_supplier')
+
+
+def _value(quantity, price):
+    return Sum(ExpressionWrapper(quantity * price, output_field=VALUE_FIELD))
+
+
+def _rows(queryset):
+    # Aggregates are annotated as 'units' because 'quantity' would shadow the
+    # Batch.quantity column used inside the value expressions
+    return [
+        {
+            'category_id': row['category_id'],
+            'supplier_id': row['supplier_id'],
+            'quantity': row['units'] or 0,
+            'cost_value': row['cost_value'] or Decimal('0.00'),
+            'retail_value': row['retail_value'] or Decimal('0.00'),
+        }
+        for row in queryset
+    ]
+
+
+def live_valuation_rows():
+    """
+    Current stock value at cost and retail per (category, supplier),
+    aggregated in the database.
+    """
+    return _rows(
+        Batch.objects.filter(quantity__gt=0)
+        .values(category_id=F('medicine__category_id'), supplier_id=F('medicine__supplier_id'))
+        .annotate(
+            units=Sum('quantity'),
+            cost_value=_value(F('quantity'), F('cost_per_unit')),
+            retail_value=_value(F('quantity'), F('medicine__price_per_unit')),
+        )
+        .order_by()
+    )
+
+
+def reconstructed_valuation_rows(as_of):
+    """
+    Stock value at the end of ``as_of``, rebuilt from InventoryLog: each batch
+    that existed then is valued at its current quantity minus the logged
+    movements after that day. Retail uses the current price_per_unit.
+    """
+    cutoff = timezone.make_aware(datetime.combine(as_of + timedelta(days=1), time.min))
+    later_movements = (
+        InventoryLog.objects.filter(batch=OuterRef('pk'), timestamp__gte=cutoff)
+        .order_by()
+        .values('batch')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    quantity = F('quantity') - Coalesce(Subquery(later_movements), Value(0))
+    rows = _rows(
+        Batch.objects.filter(created_at__lt=cutoff)
+        .values(category_id=F('medicine__category_id'), supplier_id=F('medicine__supplier_id'))
+        .annotate(
+            units=Sum(quantity),
+            cost_value=_value(quantity, F('cost_per_unit')),
+            retail_value=_value(quantity, F('medicine__price_per_unit')),
+        )
+        .order_by()
+    )
+    return [row for row in rows if row['quantity']]
+
+
+def store_snapshot(as_of, rows):
+    with transaction.atomic():
+        ValuationSnapshot.objects.filter(as_of=as_of).delete()
+        ValuationSnapshot.objects.bulk_create([
+            ValuationSnapshot(
+                as_of=as_of,
+                category_id=row['category_id'],
+                supplier_id=row['supplier_id'],
+                quantity=row['quantity'],
+                cost_value=row['cost_value'],
+                retail_value=row['retail_value'],
+            )
+            for row in rows
+        ])
+
+
+def snapshot_rows(as_of):
+    return list(
+        ValuationSnapshot.objects.filter(as_of=as_of)
+        .values('category_id', 'supplier_id', 'quantity', 'cost_value', 'retail_value')
+    )
+
+
+def take_snapshot(as_of=None):
+    """
+    Store the valuation for ``as_of`` (default today) and return its rows.
+    """
+    today = timezone.localdate()
+    as_of = as_of or today
+    rows = live_valuation_rows() if as_of >= today else reconstructed_valuation_rows(as_of)
+    store_snapshot(as_of, rows)
+    return rows
+
+
+def get_valuation_rows(as_of=None):
+    """
+    Returns (rows, source). Today's valuation is always live; past days come
+    from the stored snapshot. A day without one is reconstructed at current
+    prices each time and not stored, so an estimate never becomes the record
+    for that day; only `manage.py snapshot_valuation` stores snapshots.
+    """
+    today = timezone.localdate()
+    if as_of is None or as_of == today:
+        return live_valuation_rows(), 'live'
+    if ValuationSnapshot.objects.filter(as_of=as_of).exists():
+        return snapshot_rows(as_of), 'snapshot'
+    return reconstructed_valuation_rows(as_of), 'reconstructed'
+
+
+def summarize(rows, group_by='category'):
+    names = {
+        'category': dict(Category.objects.values_list('id', 'name')),
+        'supplier': dict(Supplier.objects.values_list('id', 'name')),
+    }
+    groups = {}
+    totals = {'quantity': 0, 'cost_value': Decimal('0.00'), 'retail_value': Decimal('0.00')}
+    for row in rows:
+        if group_by == 'category_supplier':
+            key = (row['category_id'], row['supplier_id'])
+            label = {
+                'category_id': row['category_id'],
+                'category': names['category'].get(row['category_id']),
+                'supplier_id': row['supplier_id'],
+                'supplier': names['supplier'].get(row['supplier_id']),
+            }
+        else:
+            key = row[f'{group_by}_id']
+            label = {'id': key, 'name': names[group_by].get(key)}
+        group = groups.setdefault(key, dict(
+            label, quantity=0, cost_value=Decimal('0.00'), retail_value=Decimal('0.00')
+        ))
+        for field in ('quantity', 'cost_value', 'retail_value'):
+            group[field] += row[field]
+            totals[field] += row[field]
+
+    return {
+        'totals': totals,
+        'groups': sorted(groups.values(), key=lambda group: group['cost_value'], reverse=True),
+    }
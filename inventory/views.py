@@ -2,17 +2,63 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Supplier, Category, Medicine, Batch, InventoryLog
+from .models import (
+    Supplier, Category, Medicine, Batch, InventoryLog, StockForecast, StockLedgerEntry,
+    StockAlert, BatchVersionConflict
+)
 from .serializers import (
     SupplierSerializer, CategorySerializer, MedicineSerializer,
-    BatchSerializer, InventoryLogSerializer
+    BatchSerializer, InventoryLogSerializer, StockForecastSerializer,
+    StockLedgerEntrySerializer, StockAlertSerializer
 )
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+import gzip
+from django.db import transaction
 from django.db.models import Sum, Q
+from django.utils import timezone
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+from .alerts import ACTIVE_STATUSES
+from .availability import check_availability, parse_items
+from .ledger import batch_balance_as_of, ledger_reason, medicine_balance_as_of
+from .outbox import record_batch_added, record_inventory_adjusted
+from .snapshots import catalogue_version, write_catalogue_snapshot
+from .stock import InsufficientStock, StockConflict, change_batch_quantity, dispense_fefo
+from .valuation import GROUP_BY_CHOICES, get_valuation_rows, summarize
+from core.idempotency import idempotent
+from core.middleware import accepts_encoding
 from core.permissions import IsAdmin, IsPharmacist, IsAdminOrPharmacist, RoleBasedPermission
+from core.readers import FastListMixin
+from core.streaming import StreamingListMixin
+from .readers import batch_rows, medicine_rows
+from prescriptions.allocation import reserved_batches
 
 # Create your views here.
 
+def _read_gzip_chunks(handle, chunk_size=64 * 1024):
+    with handle, gzip.GzipFile(fileobj=handle, mode='rb') as snapshot:
+        while True:
+            chunk = snapshot.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _open_snapshot(version, attempts=3):
+    # A rebuild for a newer version may prune the file before it is opened
+    for attempt in range(attempts):
+        try:
+            return open(write_catalogue_snapshot(version), 'rb')
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+
+
+def _etag_matches(header, etag):
+    # If-None-Match uses the weak comparison
+    tags = parse_etags(header)
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
 class SupplierViewSet(viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
@@ -53,9 +99,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
         serializer = MedicineSerializer(medicines, many=True)
         return Response(serializer.data)
 
-class MedicineViewSet(viewsets.ModelViewSet):
+class MedicineViewSet(FastListMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Medicine.objects.all()
     serializer_class = MedicineSerializer
+    list_reader = staticmethod(medicine_rows)
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
 
     role_permissions = {
@@ -67,7 +114,9 @@ class MedicineViewSet(viewsets.ModelViewSet):
     }
 
     def get_queryset(self):
-        queryset = Medicine.objects.all()
+        queryset = Medicine.objects.select_related(
+            'category', 'supplier'
+        ).prefetch_related('batches')
         search = self.request.query_params.get('search', None)
         category = self.request.query_params.get('category', None)
         supplier = self.request.query_params.get('supplier', None)
@@ -87,6 +136,32 @@ class MedicineViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    @action(detail=False, methods=['get'])
+    def catalogue(self, request):
+        """
+        Serve the pre-serialised catalogue snapshot, using its version as the ETag
+        """
+        version = catalogue_version()
+        etag = f'"{version}"'
+        if _etag_matches(request.headers.get('If-None-Match', ''), etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        snapshot = _open_snapshot(version)
+        if accepts_encoding(request.headers.get('Accept-Encoding', ''), 'gzip'):
+            response = FileResponse(snapshot, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(
+                _read_gzip_chunks(snapshot),
+                content_type='application/json'
+            )
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         if not request.user.userprofile.role in ['admin', 'pharmacist']:
@@ -95,13 +170,11 @@ class MedicineViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        medicines = Medicine.objects.all()
-        low_stock_medicines = []
-        for medicine in medicines:
-            total_quantity = sum(batch.quantity for batch in medicine.batches.all())
-            if total_quantity <= medicine.min_quantity:
-                low_stock_medicines.append(medicine)
-        serializer = self.get_serializer(low_stock_medicines, many=True)
+        # Stock states are kept current in StockAlert as stock changes
+        medicines = self.get_queryset().filter(
+            stock_alerts__status__in=ACTIVE_STATUSES
+        ).distinct()
+        serializer = self.get_serializer(medicines, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
@@ -120,6 +193,7 @@ class MedicineViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def add_batch(self, request, pk=None):
         if not request.user.userprofile.role in ['admin', 'pharmacist']:
             return Response(
@@ -130,19 +204,22 @@ class MedicineViewSet(viewsets.ModelViewSet):
         medicine = self.get_object()
         serializer = BatchSerializer(data=request.data)
         if serializer.is_valid():
-            batch = serializer.save(medicine=medicine)
-            InventoryLog.objects.create(
-                medicine=medicine,
-                batch=batch,
-                action='ADD',
-                quantity=batch.quantity,
-                performed_by=request.user.username,
-                notes=f'Added new batch {batch.batch_number}'
-            )
+            with transaction.atomic():
+                batch = serializer.save(medicine=medicine)
+                InventoryLog.objects.create(
+                    medicine=medicine,
+                    batch=batch,
+                    action='ADD',
+                    quantity=batch.quantity,
+                    performed_by=request.user.username,
+                    notes=f'Added new batch {batch.batch_number}'
+                )
+                record_batch_added(batch, request.user.username)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
     @action(detail=False, methods=['post'])
+    @idempotent
     def adjust_inventory(self, request):
         """
         Adjust inventory based on completed orders or prescriptions
@@ -157,6 +234,17 @@ class MedicineViewSet(viewsets.ModelViewSet):
         source_id = request.data.get('source_id')
         items = request.data.get('items', [])
         
+        ledger_action = 'DISPENSE' if source_type == 'prescription' else 'ADD'
+        with transaction.atomic(), ledger_reason(ledger_action, f'{str(source_type).capitalize()} #{source_id}'):
+            error = self._adjust_items(request, source_type, source_id, items)
+            if error is not None:
+                return error
+
+        return Response({'status': 'success'})
+
+    def _adjust_items(self, request, source_type, source_id, items):
+        # Returns an error response, or None once every item is applied
+        logs = []
         for item in items:
             medicine_id = item.get('medicine_id')
             quantity = item.get('quantity')
@@ -172,126 +260,103 @@ class MedicineViewSet(viewsets.ModelViewSet):
                 if source_type == 'order':
                     if not batch:
                         # Check for existing batch with same order source
-                        existing_batch = Batch.objects.filter(
+                        batch = Batch.objects.filter(
                             medicine=medicine,
                             batch_number__startswith=f"ORD-{source_id}-"
                         ).first()
                         
-                        if existing_batch:
-                            # Update existing batch
-                            existing_batch.quantity += quantity
-                            existing_batch.save()
-                            batch = existing_batch
-                        else:
-                            # Create a new batch if none exists
-                            batch = Batch.objects.create(
-                                medicine=medicine,
-                                batch_number=f"ORD-{source_id}-{medicine_id}",
-                                quantity=quantity,
-                                expiration_date=item.get('expiration_date', date.today() + timedelta(days=365)),
-                                cost_per_unit=item.get('cost_per_unit', medicine.price_per_unit)
-                            )
-                    else:
+                    if batch:
                         # Update existing batch
-                        batch.quantity += quantity
-                        batch.save()
+                        change_batch_quantity(batch.id, quantity)
+                    else:
+                        # Create a new batch if none exists
+                        batch = Batch.objects.create(
+                            medicine=medicine,
+                            batch_number=f"ORD-{source_id}-{medicine_id}",
+                            quantity=quantity,
+                            expiration_date=item.get('expiration_date', date.today() + timedelta(days=365)),
+                            cost_per_unit=item.get('cost_per_unit', medicine.price_per_unit)
+                        )
                     
                     action = 'ADD'
                     
                 # For prescriptions (removing from inventory)
                 elif source_type == 'prescription':
                     if not batch:
-                        # Find batches with the earliest expiration dates first
-                        batches = Batch.objects.filter(
-                            medicine=medicine, 
-                            quantity__gt=0
-                        ).order_by('expiration_date')
-                        
-                        remaining_quantity = quantity
-                        for b in batches:
-                            if remaining_quantity <= 0:
-                                break
-                                
-                            if b.quantity >= remaining_quantity:
-                                # This batch has enough
-                                b.quantity -= remaining_quantity
-                                b.save()
-                                
-                                # Create log for this batch
-                                InventoryLog.objects.create(
-                                    medicine=medicine,
-                                    batch=b,
-                                    action='DISPENSE',
-                                    quantity=-remaining_quantity,
-                                    performed_by=request.user.username,
-                                    notes=f'Dispensed for prescription #{source_id}'
-                                )
-                                
-                                remaining_quantity = 0
-                            else:
-                                # Use all in this batch and continue to next
-                                remaining_quantity -= b.quantity
-                                
-                                # Create log for this batch
-                                InventoryLog.objects.create(
-                                    medicine=medicine,
-                                    batch=b,
-                                    action='DISPENSE',
-                                    quantity=-b.quantity,
-                                    performed_by=request.user.username,
-                                    notes=f'Dispensed for prescription #{source_id}'
-                                )
-                                
-                                b.quantity = 0
-                                b.save()
-                        
-                        if remaining_quantity > 0:
+                        # Take from the batches with the earliest expiration dates first,
+                        # leaving stock planned for other prescriptions' refills for last
+                        reserved = reserved_batches(
+                            [medicine.id], int(source_id) if str(source_id).isdigit() else None
+                        )
+                        try:
+                            changes = dispense_fefo(medicine.id, quantity, reserved=reserved)
+                        except InsufficientStock:
+                            transaction.set_rollback(True)
                             return Response(
                                 {'error': f'Insufficient stock for {medicine.name}'},
                                 status=status.HTTP_400_BAD_REQUEST
                             )
+                        for change in changes:
+                            logs.append(InventoryLog.objects.create(
+                                medicine=medicine,
+                                batch_id=change.batch_id,
+                                action='DISPENSE',
+                                quantity=change.delta,
+                                performed_by=request.user.username,
+                                notes=f'Dispensed for prescription #{source_id}'
+                            ))
                         
                         continue  # Skip the log creation below as we created them in the loop
                     else:
                         # Use specified batch
-                        if batch.quantity < quantity:
+                        try:
+                            change_batch_quantity(batch.id, -quantity)
+                        except InsufficientStock:
+                            transaction.set_rollback(True)
                             return Response(
                                 {'error': f'Insufficient stock in batch {batch.batch_number}'},
                                 status=status.HTTP_400_BAD_REQUEST
                             )
                         
-                        batch.quantity -= quantity
-                        batch.save()
-                    
                     action = 'DISPENSE'
                     quantity = -quantity
                 
                 # Create inventory log entry
-                InventoryLog.objects.create(
+                logs.append(InventoryLog.objects.create(
                     medicine=medicine,
                     batch=batch,
                     action=action,
                     quantity=quantity,
                     performed_by=request.user.username,
                     notes=f'{source_type.capitalize()} #{source_id}'
-                )
+                ))
                 
             except Medicine.DoesNotExist:
+                transaction.set_rollback(True)
                 return Response(
                     {'error': f'Medicine with ID {medicine_id} not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             except Batch.DoesNotExist:
+                transaction.set_rollback(True)
                 return Response(
                     {'error': f'Batch with ID {batch_id} not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            except StockConflict:
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': f'Stock for {medicine.name} is being updated concurrently, please retry'},
+                    status=status.HTTP_409_CONFLICT
+                )
         
-        return Response({'status': 'success'})
+        record_inventory_adjusted(source_type, source_id, logs, request.user.username)
+        return None
 
-class BatchViewSet(viewsets.ModelViewSet):
+class BatchViewSet(FastListMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Batch.objects.all()
     serializer_class = BatchSerializer
+    list_reader = staticmethod(batch_rows)
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
 
     role_permissions = {
@@ -308,6 +373,29 @@ class BatchViewSet(viewsets.ModelViewSet):
             return Batch.objects.filter(medicine_id=medicine_id)
         return Batch.objects.all()
 
+    def update(self, request, *args, **kwargs):
+        try:
+            int(request.data.get('version', 0))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'version must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            return super().update(request, *args, **kwargs)
+        except BatchVersionConflict:
+            return Response(
+                {'error': 'Batch was modified by another user, reload it and try again'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+    def perform_update(self, serializer):
+        # Clients send back the version they read; saving fails if it moved on
+        expected_version = self.request.data.get('version')
+        if expected_version is not None and int(expected_version) != serializer.instance.version:
+            raise BatchVersionConflict(f'Batch {serializer.instance.pk} is at a newer version')
+        serializer.save()
+
     @action(detail=False, methods=['get'])
     def expiring_soon(self, request):
         days = request.query_params.get('days', 30)
@@ -316,7 +404,7 @@ class BatchViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(batches, many=True)
         return Response(serializer.data)
 
-class InventoryLogViewSet(viewsets.ModelViewSet):
+class InventoryLogViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = InventoryLog.objects.all()
     serializer_class = InventoryLogSerializer
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
@@ -334,7 +422,9 @@ class InventoryLogViewSet(viewsets.ModelViewSet):
         batch_id = self.request.query_params.get('batch_id')
         action = self.request.query_params.get('action')
         
-        queryset = InventoryLog.objects.all()
+        queryset = InventoryLog.objects.select_related(
+            'medicine__category', 'medicine__supplier', 'batch'
+        ).prefetch_related('medicine__batches')
         if medicine_id:
             queryset = queryset.filter(medicine_id=medicine_id)
         if batch_id:
@@ -345,3 +435,210 @@ class InventoryLogViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(performed_by=self.request.user.username)
+
+class ValuationViewSet(viewsets.ViewSet):
+    """
+    Stock value at cost and retail, grouped by category and/or supplier
+    """
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+
+    role_permissions = {
+        'get': ['admin', 'pharmacist'],
+    }
+
+    def list(self, request):
+        group_by = request.query_params.get('group_by', 'category')
+        if group_by not in GROUP_BY_CHOICES:
+            return Response(
+                {'error': f'group_by must be one of {", ".join(GROUP_BY_CHOICES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        as_of = request.query_params.get('as_of')
+        if as_of:
+            try:
+                as_of = date.fromisoformat(as_of)
+            except ValueError:
+                return Response(
+                    {'error': 'as_of must be a date in YYYY-MM-DD format'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if as_of > timezone.localdate():
+                return Response(
+                    {'error': 'as_of cannot be in the future'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        rows, source = get_valuation_rows(as_of or None)
+        report = summarize(rows, group_by)
+        return Response({
+            'as_of': as_of or timezone.localdate(),
+            'source': source,
+            'group_by': group_by,
+            **report
+        })
+
+class StockAvailabilityViewSet(viewsets.ViewSet):
+    """
+    Check several (medicine, quantity) requests against usable stock at once
+    """
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+
+    role_permissions = {
+        'post': ['admin', 'pharmacist', 'doctor'],
+    }
+
+    def create(self, request):
+        try:
+            pairs = parse_items(request.data.get('items', []))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not pairs:
+            return Response(
+                {'error': 'At least one item is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(check_availability(pairs))
+
+class StockForecastViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Consumption forecasts and suggested reorder points, computed by the
+    forecast_consumption management command
+    """
+    queryset = StockForecast.objects.all()
+    serializer_class = StockForecastSerializer
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+
+    role_permissions = {
+        'get': ['admin', 'pharmacist'],
+    }
+
+    def get_queryset(self):
+        queryset = StockForecast.objects.select_related('medicine')
+        medicine_id = self.request.query_params.get('medicine_id')
+        needs_reorder = self.request.query_params.get('needs_reorder')
+        if medicine_id:
+            queryset = queryset.filter(medicine_id=medicine_id)
+        if needs_reorder in ('1', 'true'):
+            queryset = queryset.filter(needs_reorder=True)
+        return queryset.order_by('days_of_cover', 'medicine_id')
+
+class StockLedgerViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Per-batch stock ledger with running balances and as-of stock queries
+    """
+    queryset = StockLedgerEntry.objects.all()
+    serializer_class = StockLedgerEntrySerializer
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+
+    role_permissions = {
+        'get': ['admin', 'pharmacist'],
+    }
+
+    def get_queryset(self):
+        queryset = StockLedgerEntry.objects.order_by('-timestamp', '-id')
+        medicine_id = self.request.query_params.get('medicine_id')
+        batch_id = self.request.query_params.get('batch_id')
+        reason = self.request.query_params.get('reason')
+        if medicine_id:
+            queryset = queryset.filter(medicine_id=medicine_id)
+        if batch_id:
+            queryset = queryset.filter(batch_id=batch_id)
+        if reason:
+            queryset = queryset.filter(reason=reason)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def as_of(self, request):
+        """
+        Stock of a medicine or batch at a point in time.
+        ?at= accepts a date (end of that day) or an ISO datetime.
+        """
+        medicine_id = request.query_params.get('medicine_id')
+        batch_id = request.query_params.get('batch_id')
+        at = request.query_params.get('at')
+        if not at or not (medicine_id or batch_id):
+            return Response(
+                {'error': 'at and one of medicine_id or batch_id are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            at = datetime.fromisoformat(at) if 'T' in at else date.fromisoformat(at)
+        except ValueError:
+            return Response(
+                {'error': 'at must be an ISO date or datetime'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            batch_id = int(batch_id) if batch_id else None
+            medicine_id = int(medicine_id) if medicine_id else None
+        except ValueError:
+            return Response(
+                {'error': 'medicine_id and batch_id must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if batch_id is not None:
+            return Response({
+                'batch_id': batch_id,
+                'at': at,
+                'quantity': batch_balance_as_of(batch_id, at),
+            })
+
+        balance, checkpoint, tail_entries = medicine_balance_as_of(medicine_id, at)
+        return Response({
+            'medicine_id': medicine_id,
+            'at': at,
+            'quantity': balance,
+            'checkpoint': checkpoint.timestamp if checkpoint else None,
+            'tail_entries': tail_entries,
+        })
+
+class StockAlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Low and out of stock alerts, maintained as batch quantities change.
+    Lists open and acknowledged alerts unless ?status= is given.
+    """
+    queryset = StockAlert.objects.all()
+    serializer_class = StockAlertSerializer
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+
+    role_permissions = {
+        'get': ['admin', 'pharmacist'],
+        'post': ['admin', 'pharmacist'],
+    }
+
+    def get_permissions(self):
+        # Alerts have no owner, so RoleBasedPermission's object check would
+        # refuse every pharmacist
+        if self.action in ('retrieve', 'acknowledge'):
+            return [permissions.IsAuthenticated(), IsAdminOrPharmacist()]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        queryset = StockAlert.objects.select_related('medicine')
+        if self.action != 'list':
+            return queryset
+        alert_status = self.request.query_params.get('status')
+        kind = self.request.query_params.get('kind')
+        if alert_status:
+            queryset = queryset.filter(status=alert_status)
+        else:
+            queryset = queryset.filter(status__in=ACTIVE_STATUSES)
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        return queryset.order_by('-opened_at')
+
+    @action(detail=True, methods=['post'])
+    def acknowledge(self, request, pk=None):
+        alert = self.get_object()
+        if alert.status != 'open':
+            return Response(
+                {'error': f'Alert is already {alert.status}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        alert.status = 'acknowledged'
+        alert.acknowledged_at = timezone.now()
+        alert.acknowledged_by = request.user.username
+        alert.save()
+        return Response(self.get_serializer(alert).data)
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medstock_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from core.sse import event_stream  # noqa: E402
+
+EVENT_STREAM_PATH = '/api/events/stream/'
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENT_STREAM_PATH:
+        return await event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,24 @@
+"""
+Which prescriptions a user may see, shared by every endpoint that lists
+prescriptions or data derived from them.
+"""
+from django.db.models import Q
+
+# Prescription statuses pharmacists see and dispense from
+PHARMACIST_STATUSES = ['active', 'pending']
+
+
+def visible_to(user, prefix=''):
+    """
+    Q limiting prescriptions to those the user's role may see. ``prefix``
+    is the path to the prescription fields, e.g. 'prescription__' for items;
+    models that copy status and prescribed_by (PrescriptionSummary) can use
+    the default.
+    """
+    profile = getattr(user, 'userprofile', None)
+    role = profile.role if profile else None
+    if role == 'doctor':
+        return Q(**{f'{prefix}prescribed_by': user})
+    if role == 'pharmacist':
+        return Q(**{f'{prefix}status__in': PHARMACIST_STATUSES})
+    return Q()
@@ -0,0 +1,245 @@
+"""
+Expiry-aware assignment of batches to outstanding prescription refills.
+
+Every remaining refill of an active prescription is given a due date: the
+next one is due now (or ALLOCATION_REFILL_INTERVAL_DAYS after the last
+refill), the ones after it one interval apart, and refills that would fall
+after the prescription expires are left out. A batch can serve a refill if
+it is still in date ALLOCATION_MIN_SHELF_LIFE_DAYS after the refill is due.
+
+Each batch can serve every refill whose deadline is no later than its
+expiry date, so serving refills in deadline order from the earliest-expiring
+batch that can still serve them (a min-heap on expiry, dropping batches that
+are too short-dated for the current refill) covers the most demand and
+leaves the longest-dated stock over. This takes O((refills + batches) log
+batches) per medicine.
+
+The plan is compared with greedy FEFO, which serves refills in worklist
+order from the earliest-expiring batch regardless of when they are due.
+Units a plan leaves on batches that expire before the medicine's last
+planned refill, and units it assigns to refills due after the batch has
+expired, are counted as waste.
+
+Stock a plan assigns to refills that have not been dispensed yet is
+reserved: dispense_lines() and dispense_fefo() take unreserved units first
+and only fall back to reserved ones when nothing else is left (see
+reserved_batches()).
+"""
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from inventory.models import Batch, Medicine
+from inventory.readers import in_chunks
+from .models import AllocationPlan, AllocationPlanLine, PrescriptionItem
+
+# One outstanding refill of a prescription item
+Demand = namedtuple('Demand', 'item_id medicine_id quantity refill_number due_date need_date worklist_order')
+
+
+def refill_interval():
+    return timedelta(days=getattr(settings, 'ALLOCATION_REFILL_INTERVAL_DAYS', 30))
+
+
+def min_shelf_life():
+    return timedelta(days=getattr(settings, 'ALLOCATION_MIN_SHELF_LIFE_DAYS', 0))
+
+
+def outstanding_refills(medicine_ids, today):
+    """
+    Demand for every refill left on active prescriptions, from one query.
+    """
+    interval, shelf_life = refill_interval(), min_shelf_life()
+    rows = PrescriptionItem.objects.filter(
+        medicine_id__in=medicine_ids,
+        prescription__status='active',
+        prescription__expiry_date__gte=today,
+        prescription__refill_count__lt=F('prescription__max_refills'),
+    ).values_list(
+        'id', 'medicine_id', 'quantity', 'prescription_id', 'prescription__refill_count',
+        'prescription__max_refills', 'prescription__last_refill_date', 'prescription__expiry_date',
+        'prescription__priority_rank', 'prescription__date_prescribed',
+    )
+    demand = []
+    for (item_id, medicine_id, quantity, prescription_id, refill_count, max_refills,
+         last_refill_date, expiry_date, priority_rank, date_prescribed) in rows:
+        due = today
+        if last_refill_date is not None:
+            due = max(today, timezone.localtime(last_refill_date).date() + interval)
+        for refill_number in range(refill_count + 1, max_refills + 1):
+            if due > expiry_date:
+                break
+            demand.append(Demand(
+                item_id, medicine_id, quantity, refill_number, due, due + shelf_life,
+                (priority_rank, date_prescribed, prescription_id, refill_number, item_id),
+            ))
+            due += interval
+    return demand
+
+
+def _waste(batches, left, horizon):
+    # Stock still unassigned on batches that expire before the last refill
+    return sum(left[batch_id] for batch_id, _, expiration_date in batches if expiration_date < horizon)
+
+
+def plan_medicine(demand, batches):
+    """
+    Assign one medicine's demand to its (batch_id, quantity, expiration_date)
+    batches. Returns (allocations, unmet_units, waste_units) with
+    allocations as (demand, batch_id, quantity).
+    """
+    left = {batch_id: quantity for batch_id, quantity, _ in batches}
+    heap = [(expiration_date, batch_id) for batch_id, _, expiration_date in batches]
+    heapq.heapify(heap)
+    allocations, unmet = [], 0
+    for line in sorted(demand, key=lambda line: (line.need_date, line.worklist_order)):
+        # Too short-dated for this refill, and so for every later one
+        while heap and heap[0][0] < line.need_date:
+            heapq.heappop(heap)
+        remaining = line.quantity
+        while remaining and heap:
+            batch_id = heap[0][1]
+            take = min(left[batch_id], remaining)
+            allocations.append((line, batch_id, take))
+            left[batch_id] -= take
+            remaining -= take
+            if not left[batch_id]:
+                heapq.heappop(heap)
+        unmet += remaining
+    horizon = max((line.due_date for line in demand), default=None)
+    return allocations, unmet, _waste(batches, left, horizon) if horizon else 0
+
+
+def greedy_medicine(demand, batches):
+    """
+    Greedy FEFO baseline for plan_medicine(). Returns (unmet_units, waste_units).
+    """
+    left = {batch_id: quantity for batch_id, quantity, _ in batches}
+    heap = [(expiration_date, batch_id) for batch_id, _, expiration_date in batches]
+    heapq.heapify(heap)
+    unmet = expired = 0
+    for line in sorted(demand, key=lambda line: line.worklist_order):
+        remaining = line.quantity
+        while remaining and heap:
+            expiration_date, batch_id = heap[0]
+            take = min(left[batch_id], remaining)
+            if expiration_date < line.need_date:
+                # Held for a refill the batch will not last until
+                expired += take
+            else:
+                remaining -= take
+            left[batch_id] -= take
+            if not left[batch_id]:
+                heapq.heappop(heap)
+        unmet += remaining
+    horizon = max((line.due_date for line in demand), default=None)
+    return unmet, expired + (_waste(batches, left, horizon) if horizon else 0)
+
+
+def create_plan(medicine_ids=None, user=None, today=None):
+    """
+    Plan the given medicines (all by default) and store the plan. Lines of
+    earlier plans for those medicines are marked superseded, and earlier
+    plans left with no current lines are marked superseded as a whole.
+    Reads demand and batches with one query each per chunk of medicines.
+    Returns the AllocationPlan.
+    """
+    today = today or timezone.localdate()
+    if medicine_ids is None:
+        medicine_ids = Medicine.objects.values_list('id', flat=True)
+    medicine_ids = sorted(set(medicine_ids))
+
+    demand, batches = {}, {}
+    for chunk in in_chunks(medicine_ids):
+        for line in outstanding_refills(chunk, today):
+            demand.setdefault(line.medicine_id, []).append(line)
+        for batch_id, medicine_id, quantity, expiration_date in (
+            Batch.objects.filter(medicine_id__in=chunk, quantity__gt=0, expiration_date__gte=today)
+            .values_list('id', 'medicine_id', 'quantity', 'expiration_date')
+        ):
+            batches.setdefault(medicine_id, []).append((batch_id, quantity, expiration_date))
+
+    plan = AllocationPlan(created_by=user, as_of=today)
+    lines, report = [], []
+    for medicine_id in medicine_ids:
+        medicine_demand = demand.get(medicine_id, [])
+        medicine_batches = batches.get(medicine_id, [])
+        if not medicine_demand and not medicine_batches:
+            continue
+        allocations, unmet, waste = plan_medicine(medicine_demand, medicine_batches)
+        greedy_unmet, greedy_waste = greedy_medicine(medicine_demand, medicine_batches)
+        lines += [
+            AllocationPlanLine(
+                plan=plan, item_id=line.item_id, medicine_id=medicine_id, batch_id=batch_id,
+                refill_number=line.refill_number, due_date=line.due_date, quantity=quantity,
+            )
+            for line, batch_id, quantity in allocations
+        ]
+        report.append({
+            'medicine_id': medicine_id,
+            'demand_units': sum(line.quantity for line in medicine_demand),
+            'planned_units': sum(quantity for _, _, quantity in allocations),
+            'unmet_units': unmet,
+            'waste_units': waste,
+            'greedy_unmet_units': greedy_unmet,
+            'greedy_waste_units': greedy_waste,
+        })
+
+    plan.demand_units = sum(row['demand_units'] for row in report)
+    plan.planned_units = sum(row['planned_units'] for row in report)
+    plan.unmet_units = sum(row['unmet_units'] for row in report)
+    plan.waste_units = sum(row['waste_units'] for row in report)
+    plan.greedy_waste_units = sum(row['greedy_waste_units'] for row in report)
+    plan.report = report
+    with transaction.atomic():
+        plan.save()
+        for chunk in in_chunks(medicine_ids):
+            AllocationPlanLine.objects.filter(medicine_id__in=chunk, superseded_by__isnull=True).update(
+                superseded_by=plan
+            )
+        AllocationPlanLine.objects.bulk_create(lines, batch_size=1000)
+        AllocationPlan.objects.filter(lines__superseded_by=plan).exclude(
+            lines__superseded_by__isnull=True
+        ).update(superseded_by=plan)
+    return plan
+
+
+def planned_batches(items, refill_number):
+    """
+    {index: [(batch_id, quantity), ...]} planned for the refill of each
+    (item_id, ...) row in ``items``, in the form dispense_lines() takes.
+    """
+    index_of = {row[0]: index for index, row in enumerate(items)}
+    preferred = {}
+    for item_id, batch_id, quantity in (
+        AllocationPlanLine.objects.filter(item_id__in=index_of, refill_number=refill_number, superseded_by__isnull=True)
+        .order_by('id').values_list('item_id', 'batch_id', 'quantity')
+    ):
+        preferred.setdefault(index_of[item_id], []).append((batch_id, quantity))
+    return preferred
+
+
+def reserved_batches(medicine_ids, prescription_id=None, refill_number=None):
+    """
+    {batch_id: units} held by the current plans for refills still to be
+    dispensed, in the form dispense_lines() and dispense_fefo() take. The
+    lines of ``prescription_id`` (only those of refill ``refill_number``
+    when given) are left out, as they are the ones being dispensed.
+    """
+    lines = AllocationPlanLine.objects.filter(
+        medicine_id__in=medicine_ids,
+        superseded_by__isnull=True,
+        item__prescription__status='active',
+        refill_number__gt=F('item__prescription__refill_count'),
+    )
+    if prescription_id is not None:
+        dispensing = Q(item__prescription_id=prescription_id)
+        if refill_number is not None:
+            dispensing &= Q(refill_number=refill_number)
+        lines = lines.exclude(dispensing)
+    return dict(lines.values_list('batch_id').annotate(units=Sum('quantity')).order_by())
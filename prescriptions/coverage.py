@@ -0,0 +1,143 @@
+"""
+Outstanding prescription demand against stock, per medicine.
+
+Demand is what active, unexpired prescriptions can still draw: each item's
+quantity times the refills its prescription has left. It is compared with
+the medicine's unexpired stock, less the batches that expire within
+settings.COVERAGE_EXPIRY_HORIZON_DAYS, since those will be gone before most
+of the demand is dispensed.
+
+MedicineCoverage rows are refreshed after commit for the medicines touched
+by prescription, item and stock changes (prescriptions/signals.py); bulk
+writes of prescriptions must call schedule_refresh() themselves. Run
+`manage.py refresh_coverage` daily so batches moving into the horizon are
+picked up.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, Q, Sum
+from django.utils import timezone
+
+from inventory.models import Batch, Medicine
+from inventory.readers import in_chunks
+from .models import MedicineCoverage, PrescriptionItem
+
+COVERAGE_FIELDS = [
+    'demand', 'on_hand', 'expiring_soon', 'usable', 'shortfall', 'expiry_horizon_days', 'computed_at',
+]
+
+
+def expiry_horizon_days():
+    return getattr(settings, 'COVERAGE_EXPIRY_HORIZON_DAYS', 30)
+
+
+def outstanding_demand(medicine_ids, today):
+    """
+    {medicine_id: units} still to be dispensed, from one grouped query.
+    """
+    return dict(
+        PrescriptionItem.objects.filter(
+            medicine_id__in=medicine_ids,
+            prescription__status='active',
+            prescription__expiry_date__gte=today,
+            prescription__refill_count__lt=F('prescription__max_refills'),
+        )
+        .values_list('medicine_id')
+        .annotate(demand=Sum(
+            F('quantity') * (F('prescription__max_refills') - F('prescription__refill_count')),
+            output_field=IntegerField(),
+        ))
+        .order_by()
+    )
+
+
+def stock_levels(medicine_ids, today, horizon):
+    """
+    {medicine_id: (on_hand, expiring_soon)} over unexpired batches.
+    """
+    expiring = Q(expiration_date__lt=today + timedelta(days=horizon))
+    return {
+        medicine_id: (on_hand, expiring_soon or 0)
+        for medicine_id, on_hand, expiring_soon in (
+            Batch.objects.filter(medicine_id__in=medicine_ids, quantity__gt=0, expiration_date__gte=today)
+            .values_list('medicine_id')
+            .annotate(on_hand=Sum('quantity'), expiring_soon=Sum('quantity', filter=expiring))
+            .order_by()
+        )
+    }
+
+
+def compute_coverage(medicine_ids, today=None):
+    """
+    Unsaved MedicineCoverage objects for the given medicines.
+    """
+    today = today or timezone.localdate()
+    horizon = expiry_horizon_days()
+    demand = outstanding_demand(medicine_ids, today)
+    stock = stock_levels(medicine_ids, today, horizon)
+    computed_at = timezone.now()
+    coverage = []
+    for medicine_id in medicine_ids:
+        on_hand, expiring_soon = stock.get(medicine_id, (0, 0))
+        usable = on_hand - expiring_soon
+        needed = demand.get(medicine_id, 0)
+        coverage.append(MedicineCoverage(
+            medicine_id=medicine_id,
+            demand=needed,
+            on_hand=on_hand,
+            expiring_soon=expiring_soon,
+            usable=usable,
+            shortfall=max(needed - usable, 0),
+            expiry_horizon_days=horizon,
+            computed_at=computed_at,
+        ))
+    return coverage
+
+
+def refresh_coverage(medicine_ids, today=None):
+    """
+    Recompute and upsert the coverage of the given medicines, four queries
+    per chunk. Returns the number of rows written.
+    """
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+    unique_fields = ['medicine'] if connection.features.supports_update_conflicts_with_target else None
+    written = 0
+    for chunk in in_chunks(set(medicine_ids)):
+        # Skip medicines deleted since the refresh was scheduled
+        chunk = list(Medicine.objects.filter(id__in=chunk).values_list('id', flat=True))
+        if not chunk:
+            continue
+        written += len(MedicineCoverage.objects.bulk_create(
+            compute_coverage(chunk, today),
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=COVERAGE_FIELDS,
+        ))
+    return written
+
+
+def refresh_all_coverage(today=None):
+    return refresh_coverage(Medicine.objects.values_list('id', flat=True), today)
+
+
+def schedule_refresh(medicine_ids):
+    """
+    Refresh the coverage of the given medicines once the current
+    transaction commits.
+    """
+    medicine_ids = {medicine_id for medicine_id in medicine_ids if medicine_id is not None}
+    if medicine_ids:
+        transaction.on_commit(lambda: refresh_coverage(medicine_ids))
+
+
+def schedule_prescription_refresh(prescription_ids):
+    """
+    schedule_refresh() for the medicines on the given prescriptions.
+    """
+    prescription_ids = list(prescription_ids)
+    transaction.on_commit(lambda: refresh_coverage(
+        PrescriptionItem.objects.filter(prescription_id__in=prescription_ids)
+        .values_list('medicine_id', flat=True).distinct()
+    ))
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .coverage import schedule_prescription_refresh
+from .models import Prescription, PrescriptionHistory
+from .outbox import record_prescriptions_expired
+from .signals import publish_status_changed
+from .summaries import refresh_summaries
+
+
+def system_user():
+    """
+    Inactive account that history rows written by scheduled jobs are
+    attributed to (settings.SYSTEM_USERNAME).
+    """
+    user, created = User.objects.get_or_create(
+        username=getattr(settings, 'SYSTEM_USERNAME', 'system'),
+        defaults={'is_active': False},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    return user
+
+
+def due_prescriptions(today=None):
+    return Prescription.objects.filter(status='active', expiry_date__lt=today or timezone.localdate())
+
+
+def _expire_chunk(ids, today, performed_by):
+    # Re-read under lock so a prescription cancelled or completed since the
+    # id scan is left alone
+    prescriptions = list(
+        due_prescriptions(today).select_for_update().filter(id__in=ids)
+        .only('id', 'patient_id', 'prescribed_by_id', 'priority', 'expiry_date')
+    )
+    if not prescriptions:
+        return 0
+
+    Prescription.objects.filter(id__in=[prescription.id for prescription in prescriptions]).update(
+        status='expired', claimed_by=None, claim_expires_at=None
+    )
+    PrescriptionHistory.objects.bulk_create([
+        PrescriptionHistory(
+            prescription_id=prescription.id,
+            action='expired',
+            performed_by=performed_by,
+            notes=f'Expired on {prescription.expiry_date}'
+        )
+        for prescription in prescriptions
+    ])
+    record_prescriptions_expired(prescriptions, today)
+    refresh_summaries([prescription.id for prescription in prescriptions])
+    schedule_prescription_refresh([prescription.id for prescription in prescriptions])
+    for prescription in prescriptions:
+        prescription.status = 'expired'
+        publish_status_changed(prescription, 'active')
+    return len(prescriptions)
+
+
+def expire_prescriptions(today=None, chunk_size=1000, performed_by=None):
+    """
+    Move active prescriptions past their expiry date to 'expired', with an
+    'expired' history row for each. Prescriptions are walked in
+    (expiry_date, id) order, keyset-paginated along the (status,
+    expiry_date) index, and each chunk is committed on its own, so an
+    interrupted run can simply be started again.
+    Returns the number of prescriptions expired.
+    """
+    today = today or timezone.localdate()
+    performed_by = performed_by or system_user()
+    expired = 0
+    last = None
+    while True:
+        due = due_prescriptions(today)
+        if last is not None:
+            due = due.filter(expiry_date__gte=last[0]).exclude(expiry_date=last[0], id__lte=last[1])
+        rows = list(due.order_by('expiry_date', 'id').values_list('expiry_date', 'id')[:chunk_size])
+        if not rows:
+            return expired
+        last = rows[-1]
+        ids = [prescription_id for _, prescription_id in rows]
+        with transaction.atomic():
+            expired += _expire_chunk(ids, today, performed_by)
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from prescriptions.expiry import due_prescriptions, expire_prescriptions
+
+
+class Command(BaseCommand):
+    help = 'Mark active prescriptions past their expiry date as expired (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Treat prescriptions expiring before this day (YYYY-MM-DD) as expired; defaults to today')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--performed-by', help='Username to attribute the history rows to; defaults to settings.SYSTEM_USERNAME')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many prescriptions would be expired')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        if options['dry_run']:
+            self.stdout.write(f'{due_prescriptions(today).count()} prescriptions would be expired')
+            return
+
+        performed_by = None
+        if options['performed_by']:
+            try:
+                performed_by = User.objects.get(username=options['performed_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['performed_by']} does not exist")
+
+        expired = expire_prescriptions(today, options['chunk_size'], performed_by)
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} prescriptions'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from prescriptions.allocation import create_plan
+
+
+class Command(BaseCommand):
+    help = 'Assign batches to outstanding prescription refills so that as little stock as possible expires unused'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--medicine', type=int, action='append', dest='medicine_ids',
+                            help='Medicine to plan (repeatable); defaults to the whole catalogue')
+
+    def handle(self, *args, **options):
+        plan = create_plan(options['medicine_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Plan #{plan.pk}: {plan.planned_units}/{plan.demand_units} units planned, '
+            f'{plan.unmet_units} unmet, estimated waste {plan.waste_units} '
+            f'(greedy FEFO: {plan.greedy_waste_units})'
+        ))
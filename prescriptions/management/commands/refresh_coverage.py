@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prescriptions.coverage import refresh_all_coverage
+
+
+class Command(BaseCommand):
+    help = 'Recompute outstanding prescription demand against stock for every medicine (run daily, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Compute coverage as of this day (YYYY-MM-DD); defaults to today')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        refreshed = refresh_all_coverage(today)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed coverage of {refreshed} medicines'))
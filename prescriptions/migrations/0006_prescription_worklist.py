@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+PRIORITY_RANKS = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+def set_priority_ranks(apps, schema_editor):
+    Prescription = apps.get_model('prescriptions', 'Prescription')
+    for priority, rank in PRIORITY_RANKS.items():
+        Prescription.objects.filter(priority=priority).update(priority_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('prescriptions', '0005_prescription_prescriber_contact_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_prescriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=2),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['status', 'priority_rank', 'date_prescribed'], name='prescriptio_status_e603f7_idx'),
+        ),
+        migrations.RunPython(set_priority_ranks, migrations.RunPython.noop),
+    ]
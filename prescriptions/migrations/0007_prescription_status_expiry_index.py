@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0006_prescription_worklist'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['status', 'expiry_date'], name='prescriptio_status_240517_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    Prescription = apps.get_model('prescriptions', 'Prescription')
+    PrescriptionItem = apps.get_model('prescriptions', 'PrescriptionItem')
+    PrescriptionSummary = apps.get_model('prescriptions', 'PrescriptionSummary')
+    drug_names = {}
+    for prescription_id, drug_name, medicine_name in PrescriptionItem.objects.order_by('id').values_list(
+            'prescription_id', 'drug_name', 'medicine__name').iterator():
+        drug_names.setdefault(prescription_id, []).append(drug_name or medicine_name)
+    summaries = []
+    for prescription in Prescription.objects.iterator():
+        names = drug_names.get(prescription.id, [])
+        summaries.append(PrescriptionSummary(
+            prescription_id=prescription.id,
+            patient_id=prescription.patient_id,
+            prescribed_by_id=prescription.prescribed_by_id,
+            date_prescribed=prescription.date_prescribed,
+            expiry_date=prescription.expiry_date,
+            status=prescription.status,
+            priority=prescription.priority,
+            item_count=len(names),
+            drug_names=names,
+            refill_count=prescription.refill_count,
+            max_refills=prescription.max_refills,
+            last_refill_date=prescription.last_refill_date,
+        ))
+    PrescriptionSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('patients', '0003_patient_status'),
+        ('prescriptions', '0007_prescription_status_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionSummary',
+            fields=[
+                ('prescription', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='prescriptions.prescription')),
+                ('date_prescribed', models.DateTimeField()),
+                ('expiry_date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=20)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('drug_names', models.JSONField(default=list)),
+                ('refill_count', models.PositiveIntegerField(default=0)),
+                ('max_refills', models.PositiveIntegerField(default=0)),
+                ('last_refill_date', models.DateTimeField(blank=True, null=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='patients.patient')),
+                ('prescribed_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', '-date_prescribed', '-prescription'], name='prescriptio_patient_3b7fd7_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from prescriptions.search import prescription_terms
+
+
+def build_index(apps, schema_editor):
+    Prescription = apps.get_model('prescriptions', 'Prescription')
+    PrescriptionItem = apps.get_model('prescriptions', 'PrescriptionItem')
+    PrescriptionSearchTerm = apps.get_model('prescriptions', 'PrescriptionSearchTerm')
+    items = {}
+    for prescription_id, drug_name, medicine_name, special_instructions in PrescriptionItem.objects.values_list(
+            'prescription_id', 'drug_name', 'medicine__name', 'special_instructions').iterator():
+        items.setdefault(prescription_id, []).append((drug_name, medicine_name, special_instructions))
+    terms = []
+    for prescription_id, notes, special_instructions in Prescription.objects.values_list(
+            'id', 'notes', 'special_instructions').iterator():
+        for term, weight in prescription_terms(notes, special_instructions, items.get(prescription_id, [])).items():
+            terms.append(PrescriptionSearchTerm(prescription_id=prescription_id, term=term, weight=weight))
+    PrescriptionSearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0008_prescriptionsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('prescription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='prescriptions.prescription')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='prescriptionsearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'prescription'), name='unique_search_term_per_prescription'),
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
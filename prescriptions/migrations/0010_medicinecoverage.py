@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_batch_version'),
+        ('prescriptions', '0009_prescription_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineCoverage',
+            fields=[
+                ('medicine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='coverage', serialize=False, to='inventory.medicine')),
+                ('demand', models.PositiveIntegerField(default=0)),
+                ('on_hand', models.PositiveIntegerField(default=0)),
+                ('expiring_soon', models.PositiveIntegerField(default=0)),
+                ('usable', models.PositiveIntegerField(default=0)),
+                ('shortfall', models.PositiveIntegerField(default=0)),
+                ('expiry_horizon_days', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shortfall'], name='prescriptio_shortfa_ced373_idx')],
+            },
+        ),
+    ]
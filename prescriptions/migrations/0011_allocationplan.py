@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0008_batch_version'),
+        ('prescriptions', '0010_medicinecoverage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('as_of', models.DateField()),
+                ('demand_units', models.PositiveIntegerField(default=0)),
+                ('planned_units', models.PositiveIntegerField(default=0)),
+                ('unmet_units', models.PositiveIntegerField(default=0)),
+                ('waste_units', models.PositiveIntegerField(default=0)),
+                ('greedy_waste_units', models.PositiveIntegerField(default=0)),
+                ('report', models.JSONField(default=list)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AllocationPlanLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refill_number', models.PositiveIntegerField()),
+                ('due_date', models.DateField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.batch')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='prescriptions.prescriptionitem')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.medicine')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='prescriptions.allocationplan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'refill_number'], name='prescriptio_item_id_3eb768_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0011_allocationplan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'status'], name='prescriptio_patient_283c70_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0012_prescription_patient_status_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prescriptionhistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
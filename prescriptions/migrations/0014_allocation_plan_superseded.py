@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0013_prescriptionhistory_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationplan',
+            name='superseded_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='prescriptions.allocationplan'),
+        ),
+        migrations.AddField(
+            model_name='allocationplanline',
+            name='superseded_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='prescriptions.allocationplan'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from inventory.models import Medicine
+from django.utils import timezone
+from inventory.models import Medicine, Batch
 from patients.models import Patient
 from datetime import date
 
@@ -19,6 +20,9 @@ class Prescription(models.Model):
         ('urgent', 'Urgent'),
     ]
 
+    # Sort key for the dispensing worklist, most urgent first
+    PRIORITY_RANKS = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
     prescribed_by = models.ForeignKey(User, on_delete=models.CASCADE)
     staff_id = models.CharField(max_length=50, blank=True, null=True)
@@ -32,10 +36,44 @@ class Prescription(models.Model):
     refill_count = models.PositiveIntegerField(default=0)
     max_refills = models.PositiveIntegerField(default=0)
     last_refill_date = models.DateTimeField(null=True, blank=True)
+    # Kept in step with priority by save(); bulk inserts must set it themselves
+    priority_rank = models.PositiveSmallIntegerField(default=2)
+    # Dispensing worklist lease (see PrescriptionViewSet.claim)
+    claimed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_prescriptions'
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority_rank', 'date_prescribed']),
+            models.Index(fields=['status', 'expiry_date']),
+            # A patient's active prescriptions, for duplicate-therapy checks
+            models.Index(fields=['patient', 'status']),
+        ]
 
     def __str__(self):
         return f"Prescription for {self.patient.name} on {self.date_prescribed.date()}"
 
+    @classmethod
+    def rank_of(cls, priority):
+        return cls.PRIORITY_RANKS.get(priority, cls.PRIORITY_RANKS['medium'])
+
+    def save(self, *args, **kwargs):
+        self.priority_rank = self.rank_of(self.priority)
+        if kwargs.get('update_fields') is not None and 'priority' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'priority_rank'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so saves can publish status changes
+        instance._loaded_status = instance.__dict__.get('status')
+        # ... and the indexed text, so saves only re-index it when it changed
+        instance._loaded_text = (instance.__dict__.get('notes'), instance.__dict__.get('special_instructions'))
+        return instance
+
     def can_refill(self):
         return self.status == 'active' and self.refill_count < self.max_refills
 
@@ -50,6 +88,14 @@ class PrescriptionItem(models.Model):
     route = models.CharField(max_length=50)  # e.g., "oral", "intravenous"
     special_instructions = models.TextField(blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored medicine so moving an item refreshes the
+        # coverage of both medicines
+        instance._loaded_medicine_id = instance.__dict__.get('medicine_id')
+        return instance
+
     def __str__(self):
         return f"{self.quantity}x {self.medicine.name} for {self.prescription.patient.name}"
 
@@ -57,10 +103,127 @@ class PrescriptionHistory(models.Model):
     prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE)
     action = models.CharField(max_length=50)  # e.g., "created", "refilled", "cancelled"
     performed_by = models.ForeignKey(User, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True)
 
     def __str__(self):
         return f"{self.action} on {self.prescription} by {self.performed_by.username}"
 
+class PrescriptionSummary(models.Model):
+    """
+    Denormalised one-row view of a prescription for patient timelines,
+    rebuilt by prescriptions/summaries.py whenever the prescription or its
+    items change.
+    """
+    prescription = models.OneToOneField(
+        Prescription, on_delete=models.CASCADE, primary_key=True, related_name='summary'
+    )
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+')
+    prescribed_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    date_prescribed = models.DateTimeField()
+    expiry_date = models.DateField()
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=20)
+    item_count = models.PositiveIntegerField(default=0)
+    drug_names = models.JSONField(default=list)
+    refill_count = models.PositiveIntegerField(default=0)
+    max_refills = models.PositiveIntegerField(default=0)
+    last_refill_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['patient', '-date_prescribed', '-prescription'])]
+
+    def __str__(self):
+        return f"Summary of prescription #{self.prescription_id}"
+
+
+class PrescriptionSearchTerm(models.Model):
+    """
+    Inverted index over the searchable text of a prescription and its items,
+    maintained by prescriptions/search.py. The unique (term, prescription)
+    index also serves prefix lookups on term.
+    """
+    term = models.CharField(max_length=64)
+    prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE, related_name='+')
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'prescription'], name='unique_search_term_per_prescription'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> prescription #{self.prescription_id}"
+
+
+class MedicineCoverage(models.Model):
+    """
+    Outstanding prescription demand for a medicine against its usable
+    stock, maintained by prescriptions/coverage.py.
+    """
+    medicine = models.OneToOneField(
+        Medicine, on_delete=models.CASCADE, primary_key=True, related_name='coverage'
+    )
+    # Units still to be dispensed: item quantity x refills left, over active prescriptions
+    demand = models.PositiveIntegerField(default=0)
+    on_hand = models.PositiveIntegerField(default=0)
+    # Part of on_hand that expires within the horizon and is not counted as usable
+    expiring_soon = models.PositiveIntegerField(default=0)
+    usable = models.PositiveIntegerField(default=0)
+    shortfall = models.PositiveIntegerField(default=0)
+    expiry_horizon_days = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['shortfall'])]
+
+    def __str__(self):
+        return f"Coverage of {self.medicine_id}: {self.usable}/{self.demand}"
+
+
+class AllocationPlan(models.Model):
+    """
+    Assignment of batches to the outstanding refills of active
+    prescriptions, computed by prescriptions/allocation.py. Refills draw
+    from the batches of the latest plan covering their medicines.
+    """
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    # Set once later plans have superseded all of its lines
+    superseded_by = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    as_of = models.DateField()
+    demand_units = models.PositiveIntegerField(default=0)
+    planned_units = models.PositiveIntegerField(default=0)
+    unmet_units = models.PositiveIntegerField(default=0)
+    # Estimated units left to expire under this plan and under greedy FEFO
+    waste_units = models.PositiveIntegerField(default=0)
+    greedy_waste_units = models.PositiveIntegerField(default=0)
+    # Per-medicine breakdown of the figures above
+    report = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Allocation plan #{self.pk} as of {self.as_of}"
+
+
+class AllocationPlanLine(models.Model):
+    plan = models.ForeignKey(AllocationPlan, on_delete=models.CASCADE, related_name='lines')
+    item = models.ForeignKey(PrescriptionItem, on_delete=models.CASCADE, related_name='+')
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='+')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    # The prescription's refill_count once this refill is dispensed
+    refill_number = models.PositiveIntegerField()
+    due_date = models.DateField()
+    quantity = models.PositiveIntegerField()
+    # Set when a later plan covers the medicine; refills only draw on lines
+    # that are not superseded
+    superseded_by = models.ForeignKey(
+        AllocationPlan, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=['item', 'refill_number'])]
+
+    def __str__(self):
+        return f"{self.quantity} of batch {self.batch_id} for item {self.item_id} refill {self.refill_number}"
+
 # Create your models here.
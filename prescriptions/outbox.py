@@ -0,0 +1,65 @@
+"""
+Outbox events for prescription changes (see core/outbox.py).
+"""
+from core.outbox import enqueue, enqueue_many
+
+
+def _created_payload(prescription, items):
+    return {
+        'id': prescription.pk,
+        'patient_id': prescription.patient_id,
+        'prescribed_by_id': prescription.prescribed_by_id,
+        'status': prescription.status,
+        'priority': prescription.priority,
+        'expiry_date': prescription.expiry_date,
+        'max_refills': prescription.max_refills,
+        'items': [
+            {'id': item.pk, 'medicine_id': item.medicine_id, 'quantity': item.quantity}
+            for item in items
+        ],
+    }
+
+
+def record_prescription_created(prescription, items):
+    return enqueue('prescription.created', 'prescription', prescription.pk, _created_payload(prescription, items))
+
+
+def record_prescriptions_created(created):
+    """
+    created is a list of (prescription, items) pairs.
+    """
+    return enqueue_many(
+        ('prescription.created', 'prescription', prescription.pk, _created_payload(prescription, items))
+        for prescription, items in created
+    )
+
+
+def record_prescription_refilled(prescription, performed_by, allocation=None):
+    return enqueue('prescription.refilled', 'prescription', prescription.pk, {
+        'id': prescription.pk,
+        'refill_count': prescription.refill_count,
+        'max_refills': prescription.max_refills,
+        'last_refill_date': prescription.last_refill_date,
+        'performed_by_id': performed_by.pk,
+        'allocation': allocation or [],
+    })
+
+
+def record_prescription_cancelled(prescription, performed_by, notes=''):
+    return enqueue('prescription.cancelled', 'prescription', prescription.pk, {
+        'id': prescription.pk,
+        'performed_by_id': performed_by.pk,
+        'notes': notes,
+    })
+
+
+def record_prescriptions_expired(prescriptions, expired_on):
+    return enqueue_many(
+        ('prescription.expired', 'prescription', prescription.pk, {
+            'id': prescription.pk,
+            'patient_id': prescription.patient_id,
+            'expiry_date': prescription.expiry_date,
+            'expired_on': expired_on,
+        })
+        for prescription in prescriptions
+    )
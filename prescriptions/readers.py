@@ -0,0 +1,108 @@
+"""
+Read-only list serialisation for prescriptions that bypasses ModelSerializer.
+Output matches PrescriptionSerializer (checked in prescriptions/tests.py).
+"""
+from django.contrib.auth.models import User
+
+from inventory.readers import (
+    format_datetime, format_date, in_chunks, medicines_by_id, read_rows
+)
+from patients.models import Patient
+from patients.serializers import PatientSerializer
+from .models import Prescription, PrescriptionItem
+
+
+def patients_by_id(ids):
+    # Patient's serializer lives in another app, so run it once per distinct
+    # patient rather than re-implementing its fields here
+    patients = {}
+    for chunk in in_chunks(ids):
+        for data in PatientSerializer(Patient.objects.filter(pk__in=chunk), many=True).data:
+            patients[data['id']] = data
+    return patients
+
+
+def users_by_id(ids):
+    users = {}
+    for chunk in in_chunks(ids):
+        for user_id, username, first_name, last_name in User.objects.filter(pk__in=chunk).values_list(
+                'id', 'username', 'first_name', 'last_name'):
+            users[user_id] = {
+                'id': user_id,
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+            }
+    return users
+
+
+def items_by_prescription(prescription_ids, today=None):
+    rows = []
+    for chunk in in_chunks(prescription_ids):
+        rows.extend(PrescriptionItem.objects.filter(prescription_id__in=chunk).order_by('id').values_list(
+            'id', 'prescription_id', 'medicine_id', 'drug_name', 'dosage', 'quantity',
+            'frequency', 'duration', 'route', 'special_instructions'
+        ))
+    medicines = medicines_by_id({row[2] for row in rows}, today)
+
+    items = {}
+    for (item_id, prescription_id, medicine_id, drug_name, dosage, quantity,
+         frequency, duration, route, special_instructions) in rows:
+        items.setdefault(prescription_id, []).append({
+            'id': item_id,
+            'medicine': medicines.get(medicine_id),
+            'drug_name': drug_name,
+            'dosage': dosage,
+            'quantity': quantity,
+            'frequency': frequency,
+            'duration': duration,
+            'route': route,
+            'special_instructions': special_instructions,
+            'prescription': prescription_id,
+        })
+    return items
+
+
+def _prescription_rows(queryset, today=None):
+    rows = list(queryset.values_list(
+        'id', 'patient_id', 'prescribed_by_id', 'staff_id', 'prescriber_contact',
+        'date_prescribed', 'expiry_date', 'status', 'priority', 'notes',
+        'special_instructions', 'refill_count', 'max_refills', 'last_refill_date',
+        'claimed_by_id', 'claim_expires_at'
+    ))
+    patients = patients_by_id({row[1] for row in rows})
+    users = users_by_id({row[2] for row in rows})
+    items = items_by_prescription([row[0] for row in rows], today)
+
+    prescriptions = []
+    for (prescription_id, patient_id, prescribed_by_id, staff_id, prescriber_contact,
+         date_prescribed, expiry_date, status, priority, notes, special_instructions,
+         refill_count, max_refills, last_refill_date, claimed_by_id, claim_expires_at) in rows:
+        prescriptions.append({
+            'id': prescription_id,
+            'patient': patients.get(patient_id),
+            'prescribed_by': users.get(prescribed_by_id),
+            'items': items.get(prescription_id, []),
+            'can_refill': status == 'active' and refill_count < max_refills,
+            'staff_id': staff_id,
+            'prescriber_contact': prescriber_contact,
+            'date_prescribed': format_datetime(date_prescribed),
+            'expiry_date': format_date(expiry_date),
+            'status': status,
+            'priority': priority,
+            'notes': notes,
+            'special_instructions': special_instructions,
+            'refill_count': refill_count,
+            'max_refills': max_refills,
+            'last_refill_date': format_datetime(last_refill_date),
+            'claimed_by': claimed_by_id,
+            'claim_expires_at': format_datetime(claim_expires_at),
+        })
+    return prescriptions
+
+
+def prescription_rows(rows, today=None):
+    """
+    Fast equivalent of PrescriptionSerializer(rows, many=True).data
+    """
+    return read_rows(Prescription, rows, _prescription_rows, today=today)
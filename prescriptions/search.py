@@ -0,0 +1,130 @@
+"""
+Free-text search over prescriptions through the PrescriptionSearchTerm
+inverted index.
+
+Each prescription is indexed under the words of its notes and special
+instructions and of its items' drug names, medicine names and special
+instructions, with a weight per field. Saves of prescriptions and items,
+and medicine renames, re-index them through prescriptions/signals.py; code
+that writes with bulk_create or queryset.update() must call reindex()
+itself.
+
+A query matches the prescriptions that have every one of its words as a
+prefix of some indexed term, ranked by the summed weight of the matching
+terms, with whole-word matches counting double.
+"""
+import re
+
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+
+from inventory.readers import in_chunks
+from .models import Prescription, PrescriptionItem, PrescriptionSearchTerm
+
+TERM_MAX_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# Weight of a word by the field it comes from
+DRUG_NAME_WEIGHT = 4
+MEDICINE_NAME_WEIGHT = 3
+INSTRUCTIONS_WEIGHT = 2
+NOTES_WEIGHT = 1
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'the', 'to', 'with',
+])
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """
+    Lowercased words of ``text`` without stop words and single characters.
+    """
+    return [
+        word[:TERM_MAX_LENGTH]
+        for word in _WORD.findall((text or '').lower())
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+def prescription_terms(notes, special_instructions, items):
+    """
+    {term: weight} for a prescription's text. ``items`` are
+    (drug_name, medicine_name, special_instructions) tuples.
+    """
+    weighted = [(notes, NOTES_WEIGHT), (special_instructions, INSTRUCTIONS_WEIGHT)]
+    for drug_name, medicine_name, item_instructions in items:
+        weighted += [
+            (drug_name, DRUG_NAME_WEIGHT),
+            (medicine_name, MEDICINE_NAME_WEIGHT),
+            (item_instructions, INSTRUCTIONS_WEIGHT),
+        ]
+    terms = {}
+    for text, weight in weighted:
+        for term in tokenize(text):
+            terms[term] = terms.get(term, 0) + weight
+    return terms
+
+
+def build_terms(prescription_ids):
+    items = {}
+    for prescription_id, drug_name, medicine_name, special_instructions in (
+        PrescriptionItem.objects.filter(prescription_id__in=prescription_ids)
+        .values_list('prescription_id', 'drug_name', 'medicine__name', 'special_instructions')
+    ):
+        items.setdefault(prescription_id, []).append((drug_name, medicine_name, special_instructions))
+    return [
+        PrescriptionSearchTerm(prescription_id=prescription_id, term=term, weight=weight)
+        for prescription_id, notes, special_instructions in (
+            Prescription.objects.filter(id__in=prescription_ids)
+            .values_list('id', 'notes', 'special_instructions')
+        )
+        for term, weight in prescription_terms(notes, special_instructions, items.get(prescription_id, [])).items()
+    ]
+
+
+def reindex(prescription_ids):
+    """
+    Replace the index entries of the given prescriptions, with one delete
+    and one insert per chunk. Call inside the transaction that changed them.
+    """
+    for chunk in in_chunks(prescription_ids):
+        PrescriptionSearchTerm.objects.filter(prescription_id__in=chunk).delete()
+        PrescriptionSearchTerm.objects.bulk_create(build_terms(chunk), batch_size=1000)
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def ranked_matches(terms, visibility=Q()):
+    """
+    Values queryset of {'prescription_id', 'score'} for the prescriptions
+    matching every term, best first. ``visibility`` is a Q on the index
+    rows, e.g. visible_to(user, 'prescription__').
+    """
+    matches = Q()
+    for term in terms:
+        matches |= Q(term__startswith=term)
+    # Every query term must match at least one indexed term of the prescription
+    matched = sum(
+        (Max(Case(When(term__startswith=term, then=Value(1)), default=Value(0), output_field=IntegerField()))
+         for term in terms),
+        Value(0)
+    )
+    return (
+        PrescriptionSearchTerm.objects.filter(matches, visibility)
+        .values('prescription_id')
+        .annotate(
+            matched=matched,
+            score=Sum(Case(
+                When(term__in=terms, then=F('weight') * 2),
+                default=F('weight'),
+                output_field=IntegerField(),
+            )),
+        )
+        .filter(matched=len(terms))
+        .values('prescription_id', 'score')
+        .order_by('-score', '-prescription_id')
+    )
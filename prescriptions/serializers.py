@@ -1,8 +1,12 @@
 from rest_framework import serializers
+from core import audit
 from django.contrib.auth.models import User
 from inventory.models import Medicine
 from patients.models import Patient
-from .models import Prescription, PrescriptionItem, PrescriptionHistory
+from .models import (
+    Prescription, PrescriptionItem, PrescriptionHistory, PrescriptionSummary, MedicineCoverage,
+    AllocationPlan, AllocationPlanLine
+)
 from patients.serializers import PatientSerializer
 from inventory.serializers import MedicineSerializer
 
@@ -46,8 +50,11 @@ class PrescriptionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Prescription
-        fields = '__all__'
-        read_only_fields = ['prescribed_by', 'date_prescribed', 'refill_count', 'last_refill_date']
+        exclude = ['priority_rank']
+        read_only_fields = [
+            'prescribed_by', 'date_prescribed', 'refill_count', 'last_refill_date',
+            'claimed_by', 'claim_expires_at'
+        ]
 
     def get_can_refill(self, obj):
         return obj.can_refill()
@@ -58,7 +65,9 @@ class PrescriptionSerializer(serializers.ModelSerializer):
             prescribed_by=self.context['request'].user
         )
         # Create history entry
-        PrescriptionHistory.objects.create(
+        audit.record(
+            PrescriptionHistory,
+            key=(prescription.pk, 'created'),
             prescription=prescription,
             action='created',
             performed_by=self.context['request'].user
@@ -66,10 +75,57 @@ class PrescriptionSerializer(serializers.ModelSerializer):
         return prescription
 
     def update(self, instance, validated_data):
-        # Create history entry before update
-        PrescriptionHistory.objects.create(
+        # Create history entry before update; merged with the one
+        # PrescriptionViewSet.perform_update records for the same request
+        audit.record(
+            PrescriptionHistory,
+            key=(instance.pk, 'updated'),
             prescription=instance,
             action='updated',
             performed_by=self.context['request'].user
         )
-        return super().update(instance, validated_data) 
\ No newline at end of file
+        return super().update(instance, validated_data) 
+
+class PrescriptionSummarySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='prescription_id', read_only=True)
+    # Full prescription, for clients that need more than the summary
+    detail = serializers.HyperlinkedIdentityField(
+        view_name='prescription-detail', lookup_field='prescription_id', lookup_url_kwarg='pk'
+    )
+
+    class Meta:
+        model = PrescriptionSummary
+        fields = [
+            'id', 'date_prescribed', 'expiry_date', 'status', 'priority', 'item_count',
+            'drug_names', 'refill_count', 'max_refills', 'last_refill_date', 'prescribed_by', 'detail'
+        ]
+
+class MedicineCoverageSerializer(serializers.ModelSerializer):
+    medicine_id = serializers.IntegerField(source='medicine.id', read_only=True)
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+
+    class Meta:
+        model = MedicineCoverage
+        fields = ['medicine_id', 'medicine_name', 'demand', 'on_hand', 'expiring_soon',
+                 'usable', 'shortfall', 'expiry_horizon_days', 'computed_at']
+
+class AllocationPlanSerializer(serializers.ModelSerializer):
+    waste_avoided_units = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AllocationPlan
+        fields = ['id', 'created_by', 'created_at', 'as_of', 'superseded_by', 'demand_units', 'planned_units',
+                 'unmet_units', 'waste_units', 'greedy_waste_units', 'waste_avoided_units', 'report']
+
+    def get_waste_avoided_units(self, obj):
+        return obj.greedy_waste_units - obj.waste_units
+
+class AllocationPlanLineSerializer(serializers.ModelSerializer):
+    prescription_id = serializers.IntegerField(source='item.prescription_id', read_only=True)
+    batch_number = serializers.CharField(source='batch.batch_number', read_only=True)
+    expiration_date = serializers.DateField(source='batch.expiration_date', read_only=True)
+
+    class Meta:
+        model = AllocationPlanLine
+        fields = ['id', 'prescription_id', 'item', 'medicine', 'batch', 'batch_number',
+                 'expiration_date', 'refill_number', 'due_date', 'quantity', 'superseded_by']
@@ -0,0 +1,361 @@
+"""
+Prescription creation shared by the create endpoints in views.py and urls.py
+and the batch endpoint.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core import audit
+from inventory.availability import check_availability, parse_items, shortages
+from inventory.models import Medicine
+from patients.models import Patient
+from .coverage import schedule_refresh
+from .models import Prescription, PrescriptionItem, PrescriptionHistory
+from .outbox import record_prescription_created, record_prescriptions_created
+from .search import reindex
+from .signals import publish_created
+from .summaries import refresh_summaries
+from .therapy import therapy_warnings
+
+BATCH_MODES = ('atomic', 'partial')
+
+
+class PrescriptionError(Exception):
+    def __init__(self, message, status_code=400, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+    def as_response_data(self):
+        data = {'error': str(self)}
+        if self.details is not None:
+            data['details'] = self.details
+        return data
+
+
+def bulk_create_prescriptions(prescriptions):
+    """
+    bulk_create new prescriptions and set their primary keys. MySQL returns
+    no ids from a multi-row INSERT, so the rows are read back in id order,
+    as in bulk_create_items(): the ones above the highest id seen before the
+    INSERT, written by the same prescribers, matched to the objects in row
+    order by patient.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Prescription.objects.bulk_create(prescriptions)
+    newest = Prescription.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    prescriptions = Prescription.objects.bulk_create(prescriptions)
+    position = 0
+    for prescription_id, patient_id in (
+        Prescription.objects.filter(
+            id__gt=newest, prescribed_by_id__in={prescription.prescribed_by_id for prescription in prescriptions}
+        ).order_by('id').values_list('id', 'patient_id')
+    ):
+        if position == len(prescriptions):
+            break
+        # Skip rows inserted concurrently by other requests
+        if patient_id == prescriptions[position].patient_id:
+            prescriptions[position].pk = prescription_id
+            position += 1
+    return prescriptions
+
+
+def bulk_create_items(items):
+    """
+    bulk_create items of new prescriptions and set their primary keys. MySQL
+    returns no ids from a multi-row INSERT and need not assign them
+    consecutively, but they increase in row order, so they are read back
+    per prescription in id order.
+    """
+    items = PrescriptionItem.objects.bulk_create(items)
+    if items and items[0].pk is None:
+        ids = {}
+        for item_id, prescription_id in (
+            PrescriptionItem.objects.filter(prescription_id__in={item.prescription_id for item in items})
+            .order_by('id').values_list('id', 'prescription_id')
+        ):
+            ids.setdefault(prescription_id, []).append(item_id)
+        positions = {}
+        for item in items:
+            position = positions.get(item.prescription_id, 0)
+            item.pk = ids[item.prescription_id][position]
+            positions[item.prescription_id] = position + 1
+    return items
+
+
+def item_response(item, medicine):
+    return {
+        "id": item.id,
+        "medicine_id": medicine.id,
+        "medicine_name": medicine.name,
+        "drug_name": item.drug_name,
+        "dosage": item.dosage,
+        "quantity": item.quantity,
+        "frequency": item.frequency,
+        "duration": item.duration,
+        "route": item.route,
+        "special_instructions": item.special_instructions
+    }
+
+
+def prescription_response(prescription, patient, items, warnings=()):
+    return {
+        "message": "Prescription created successfully",
+        "id": prescription.id,
+        "patient": patient.name,
+        "patient_id": patient.id,
+        "status": prescription.status,
+        "staff_id": prescription.staff_id,
+        "prescriber_contact": prescription.prescriber_contact,
+        "date_prescribed": prescription.date_prescribed,
+        "expiry_date": prescription.expiry_date,
+        "priority": prescription.priority,
+        "notes": prescription.notes,
+        "special_instructions": prescription.special_instructions,
+        "items_count": len(items),
+        "items": [item_response(item, item.medicine) for item in items],
+        # Duplicate-therapy warnings from prescriptions/therapy.py
+        "warnings": list(warnings)
+    }
+
+
+def parse_prescription(data, strict=True):
+    """
+    Check the shape of a create request without touching the database.
+    Returns (patient_id, items_data, pairs) where pairs are the
+    (medicine_id, quantity) of each item in items_data.
+    """
+    if not isinstance(data, dict):
+        raise PrescriptionError('Each prescription must be an object')
+    patient_id = data.get('patient_id')
+    if not patient_id:
+        raise PrescriptionError('Patient ID is required')
+    try:
+        patient_id = int(patient_id)
+    except (TypeError, ValueError):
+        raise PrescriptionError('Patient ID must be an integer')
+
+    items_data = data.get('items', [])
+    if not isinstance(items_data, list):
+        raise PrescriptionError('items must be a list')
+    if not strict:
+        items_data = [item for item in items_data if isinstance(item, dict) and item.get('medicine_id')]
+    if strict and not items_data:
+        raise PrescriptionError('At least one medication item is required')
+    try:
+        pairs = parse_items(items_data)
+    except ValueError as e:
+        raise PrescriptionError(str(e))
+    return patient_id, items_data, pairs
+
+
+def insufficient_stock_error(insufficient_stock):
+    return PrescriptionError('Insufficient stock for some medications', details=[
+        {
+            'medicine': item['medicine'],
+            'required': item['requested'],
+            'available': item['available'],
+            'short_by': item['short_by'],
+        }
+        for item in insufficient_stock
+    ])
+
+
+def build_prescription(user, patient, data):
+    return Prescription(
+        patient=patient,
+        prescribed_by=user,
+        staff_id=data.get('staff_id', ''),
+        prescriber_contact=data.get('prescriber_contact', ''),
+        status=data.get('status', 'active'),
+        notes=data.get('notes', ''),
+        special_instructions=data.get('special_instructions', ''),
+        max_refills=data.get('max_refills', 0),
+        # Default to 30 days from now
+        expiry_date=data.get('expiry_date') or date.today() + timedelta(days=30),
+        priority=data.get('priority', 'medium'),
+        priority_rank=Prescription.rank_of(data.get('priority', 'medium')),
+    )
+
+
+def build_items(prescription, items_data, pairs, medicines):
+    return [
+        PrescriptionItem(
+            prescription=prescription,
+            medicine=medicines[medicine_id],
+            drug_name=item_data.get('drug_name') or medicines[medicine_id].name,
+            dosage=item_data.get('dosage', ''),
+            quantity=quantity,
+            frequency=item_data.get('frequency', ''),
+            duration=item_data.get('duration', ''),
+            route=item_data.get('route', 'oral'),
+            special_instructions=item_data.get('special_instructions', '')
+        )
+        for item_data, (medicine_id, quantity) in zip(items_data, pairs)
+    ]
+
+
+def create_prescription(user, data, strict=True):
+    """
+    Validate and create a prescription with its items and history entry in
+    one transaction, using a fixed number of queries however many items it
+    has. Returns the response body.
+
+    strict rejects an empty item list and unknown medicines; otherwise
+    items without a known medicine are skipped.
+    Raises PrescriptionError for invalid input or insufficient stock.
+    """
+    patient_id, items_data, pairs = parse_prescription(data, strict)
+    patient = Patient.objects.filter(id=patient_id).first()
+    if patient is None:
+        raise PrescriptionError(f'Patient with ID {patient_id} not found', status_code=404)
+
+    availability = check_availability(pairs)
+    if availability['missing']:
+        if strict:
+            raise PrescriptionError(
+                f"Medicine with ID {availability['missing'][0]} not found", status_code=404
+            )
+        missing = set(availability['missing'])
+        kept = [(item, pair) for item, pair in zip(items_data, pairs) if pair[0] not in missing]
+        items_data = [item for item, _ in kept]
+        pairs = [pair for _, pair in kept]
+    insufficient_stock = shortages(availability)
+    if insufficient_stock:
+        raise insufficient_stock_error(insufficient_stock)
+
+    medicines = Medicine.objects.in_bulk([medicine_id for medicine_id, _ in pairs])
+    warnings = therapy_warnings([(0, patient.id, pairs)])[0]
+
+    with transaction.atomic():
+        prescription = build_prescription(user, patient, data)
+        prescription.save()
+        items = bulk_create_items(build_items(prescription, items_data, pairs, medicines))
+        audit.record(
+            PrescriptionHistory,
+            prescription=prescription,
+            action='created',
+            performed_by=user,
+            notes='Created via API'
+        )
+        record_prescription_created(prescription, items)
+        refresh_summaries([prescription.id])
+        reindex([prescription.id])
+        schedule_refresh(medicines)
+
+    return prescription_response(prescription, patient, items, warnings)
+
+
+def _entry_error(index, error):
+    return {'index': index, 'result': 'error', 'status_code': error.status_code, **error.as_response_data()}
+
+
+def create_prescriptions(user, entries, mode='atomic'):
+    """
+    Create many prescriptions at once, e.g. a ward round. Patients, medicines
+    and stock for the whole batch are looked up with one query each, and the
+    items and history rows are inserted with one statement each, all in a
+    single transaction.
+
+    Stock is checked cumulatively in submission order, so two prescriptions
+    cannot both claim the last units. In 'atomic' mode any invalid entry
+    fails the whole batch; in 'partial' mode the valid entries are created
+    and the others reported.
+
+    Returns (body, status_code) with one result per entry in request order.
+    """
+    if mode not in BATCH_MODES:
+        raise PrescriptionError(f"mode must be one of: {', '.join(BATCH_MODES)}")
+    if not isinstance(entries, list) or not entries:
+        raise PrescriptionError('prescriptions must be a non-empty list')
+    max_size = getattr(settings, 'PRESCRIPTION_BATCH_MAX_SIZE', 200)
+    if len(entries) > max_size:
+        raise PrescriptionError(f'At most {max_size} prescriptions can be submitted at once')
+
+    results = [None] * len(entries)
+    parsed = {}
+    for index, data in enumerate(entries):
+        try:
+            parsed[index] = parse_prescription(data)
+        except PrescriptionError as e:
+            results[index] = _entry_error(index, e)
+
+    patients = Patient.objects.in_bulk({patient_id for patient_id, _, _ in parsed.values()})
+    availability = check_availability([pair for _, _, pairs in parsed.values() for pair in pairs])
+    missing = set(availability['missing'])
+    stock = {item['medicine_id']: item for item in availability['items']}
+    remaining = {medicine_id: item['available'] for medicine_id, item in stock.items()}
+
+    accepted = []
+    for index, (patient_id, items_data, pairs) in parsed.items():
+        try:
+            if patient_id not in patients:
+                raise PrescriptionError(f'Patient with ID {patient_id} not found', status_code=404)
+            unknown = next((medicine_id for medicine_id, _ in pairs if medicine_id in missing), None)
+            if unknown is not None:
+                raise PrescriptionError(f'Medicine with ID {unknown} not found', status_code=404)
+            requested = {}
+            for medicine_id, quantity in pairs:
+                requested[medicine_id] = requested.get(medicine_id, 0) + quantity
+            short = [
+                {
+                    'medicine': stock[medicine_id]['medicine'],
+                    'requested': quantity,
+                    'available': remaining[medicine_id],
+                    'short_by': quantity - remaining[medicine_id],
+                }
+                for medicine_id, quantity in requested.items()
+                if quantity > remaining[medicine_id]
+            ]
+            if short:
+                raise insufficient_stock_error(short)
+        except PrescriptionError as e:
+            results[index] = _entry_error(index, e)
+            continue
+        for medicine_id, quantity in requested.items():
+            remaining[medicine_id] -= quantity
+        accepted.append(index)
+
+    failed = len(entries) - len(accepted)
+    if not accepted or (mode == 'atomic' and failed):
+        for index in accepted:
+            results[index] = {'index': index, 'result': 'not_created'}
+        return {'mode': mode, 'created': 0, 'failed': failed, 'results': results}, 400
+
+    medicines = Medicine.objects.in_bulk(list(stock))
+    warnings = therapy_warnings([(index, parsed[index][0], parsed[index][2]) for index in accepted])
+    with transaction.atomic():
+        prescriptions = bulk_create_prescriptions([
+            build_prescription(user, patients[parsed[index][0]], entries[index])
+            for index in accepted
+        ])
+        items_per_prescription = [
+            build_items(prescription, parsed[index][1], parsed[index][2], medicines)
+            for index, prescription in zip(accepted, prescriptions)
+        ]
+        bulk_create_items([item for items in items_per_prescription for item in items])
+        PrescriptionHistory.objects.bulk_create([
+            PrescriptionHistory(
+                prescription=prescription,
+                action='created',
+                performed_by=user,
+                notes='Created via batch submission'
+            )
+            for prescription in prescriptions
+        ])
+        record_prescriptions_created(list(zip(prescriptions, items_per_prescription)))
+        refresh_summaries([prescription.id for prescription in prescriptions])
+        reindex([prescription.id for prescription in prescriptions])
+        schedule_refresh(medicines)
+        for prescription in prescriptions:
+            publish_created(prescription)
+
+    for index, prescription, items, entry_warnings in zip(accepted, prescriptions, items_per_prescription, warnings):
+        results[index] = {
+            'index': index,
+            'result': 'created',
+            **prescription_response(prescription, prescription.patient, items, entry_warnings),
+        }
+    return {'mode': mode, 'created': len(accepted), 'failed': failed, 'results': results}, 200
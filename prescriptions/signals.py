@@ -0,0 +1,141 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.events import publish_on_commit
+from inventory.ledger import stock_changed
+from inventory.models import Medicine
+from .coverage import schedule_prescription_refresh, schedule_refresh
+from .models import Prescription, PrescriptionItem
+from .search import reindex
+from .summaries import refresh_summaries
+
+
+def _prescription_event(prescription, statuses):
+    data = {
+        'id': prescription.pk,
+        'patient_id': prescription.patient_id,
+        'status': prescription.status,
+        'priority': prescription.priority,
+    }
+    audience = {
+        'kind': 'prescription',
+        'prescribed_by_id': prescription.prescribed_by_id,
+        'statuses': statuses,
+    }
+    return data, audience
+
+
+def publish_created(prescription):
+    """
+    Also called for prescriptions inserted with bulk_create, which sends no
+    post_save.
+    """
+    publish_on_commit('prescription.created', *_prescription_event(prescription, (prescription.status,)))
+
+
+def publish_status_changed(prescription, previous):
+    """
+    Also called by bulk status updates, which send no post_save.
+    """
+    data, audience = _prescription_event(prescription, (previous, prescription.status))
+    data['previous_status'] = previous
+    publish_on_commit('prescription.status_changed', data, audience)
+
+
+@receiver(post_save, sender=Prescription)
+def publish_prescription_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    if created:
+        publish_created(instance)
+    elif previous is not None and previous != instance.status:
+        publish_status_changed(instance, previous)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=Prescription)
+def refresh_prescription_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_summaries([instance.pk])
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def refresh_summary_on_item_change(sender, instance, raw=False, origin=None, **kwargs):
+    # Items deleted along with their prescription take the summary with them
+    if raw or isinstance(origin, Prescription):
+        return
+    refresh_summaries([instance.prescription_id])
+
+
+@receiver(pre_save, sender=Medicine)
+def remember_medicine_rename(sender, instance, raw=False, **kwargs):
+    # Item rows show the medicine's name when they have no drug_name of their own
+    if raw or instance._state.adding:
+        return
+    previous = Medicine.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+    instance._renamed = previous is not None and previous != instance.name
+
+
+@receiver(post_save, sender=Medicine)
+def refresh_summaries_on_medicine_rename(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_renamed', False):
+        return
+    refresh_summaries(list(
+        PrescriptionItem.objects.filter(Q(drug_name='') | Q(drug_name__isnull=True), medicine_id=instance.pk)
+        .values_list('prescription_id', flat=True).distinct()
+    ))
+
+
+@receiver(post_save, sender=Prescription)
+def reindex_prescription(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    text = (instance.notes, instance.special_instructions)
+    if created or getattr(instance, '_loaded_text', None) != text:
+        reindex([instance.pk])
+    instance._loaded_text = text
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def reindex_on_item_change(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or isinstance(origin, Prescription):
+        return
+    reindex([instance.prescription_id])
+
+
+@receiver(post_save, sender=Medicine)
+def reindex_on_medicine_rename(sender, instance, raw=False, **kwargs):
+    # Every item is indexed under its medicine's name
+    if raw or not getattr(instance, '_renamed', False):
+        return
+    reindex(list(
+        PrescriptionItem.objects.filter(medicine_id=instance.pk)
+        .values_list('prescription_id', flat=True).distinct()
+    ))
+
+
+@receiver(post_save, sender=Prescription)
+def refresh_coverage_on_prescription_change(sender, instance, created, raw=False, **kwargs):
+    # A new prescription has no items yet; they bring its demand in
+    if raw or created:
+        return
+    schedule_prescription_refresh([instance.pk])
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def refresh_coverage_on_item_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_refresh([instance.medicine_id, getattr(instance, '_loaded_medicine_id', None)])
+    instance._loaded_medicine_id = instance.medicine_id
+
+
+@receiver(stock_changed)
+def refresh_coverage_on_stock_change(sender, entries, **kwargs):
+    schedule_refresh(entry.medicine_id for entry in entries)
@@ -0,0 +1,62 @@
+"""
+Maintenance of PrescriptionSummary rows. Saves of prescriptions and items,
+and medicine renames, refresh them through prescriptions/signals.py; code
+that writes with bulk_create or queryset.update() must call
+refresh_summaries() itself.
+"""
+from django.db import connection
+
+from inventory.readers import in_chunks
+from .models import Prescription, PrescriptionItem, PrescriptionSummary
+
+SUMMARY_FIELDS = [
+    'patient', 'prescribed_by', 'date_prescribed', 'expiry_date', 'status', 'priority',
+    'item_count', 'drug_names', 'refill_count', 'max_refills', 'last_refill_date',
+]
+
+
+def build_summaries(prescription_ids):
+    rows = Prescription.objects.filter(id__in=prescription_ids).values_list(
+        'id', 'patient_id', 'prescribed_by_id', 'date_prescribed', 'expiry_date',
+        'status', 'priority', 'refill_count', 'max_refills', 'last_refill_date'
+    )
+    drug_names = {}
+    for prescription_id, drug_name, medicine_name in (
+        PrescriptionItem.objects.filter(prescription_id__in=prescription_ids)
+        .order_by('id').values_list('prescription_id', 'drug_name', 'medicine__name')
+    ):
+        drug_names.setdefault(prescription_id, []).append(drug_name or medicine_name)
+    return [
+        PrescriptionSummary(
+            prescription_id=prescription_id,
+            patient_id=patient_id,
+            prescribed_by_id=prescribed_by_id,
+            date_prescribed=date_prescribed,
+            expiry_date=expiry_date,
+            status=status,
+            priority=priority,
+            item_count=len(drug_names.get(prescription_id, [])),
+            drug_names=drug_names.get(prescription_id, []),
+            refill_count=refill_count,
+            max_refills=max_refills,
+            last_refill_date=last_refill_date,
+        )
+        for (prescription_id, patient_id, prescribed_by_id, date_prescribed, expiry_date,
+             status, priority, refill_count, max_refills, last_refill_date) in rows
+    ]
+
+
+def refresh_summaries(prescription_ids):
+    """
+    Rebuild the summaries of the given prescriptions with one upsert per
+    chunk. Call inside the transaction that changed them.
+    """
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+    unique_fields = ['prescription'] if connection.features.supports_update_conflicts_with_target else None
+    for chunk in in_chunks(prescription_ids):
+        PrescriptionSummary.objects.bulk_create(
+            build_summaries(chunk),
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=SUMMARY_FIELDS,
+        )
@@ -1,3 +1,554 @@
+from datetime import date, timedelta
+from functools import partial
+
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventory.models import Medicine, Batch
+from inventory.readers import in_chunks
+from patients.models import Patient
+from .allocation import Demand, create_plan, greedy_medicine, plan_medicine, reserved_batches
+from .coverage import refresh_coverage
+from .expiry import expire_prescriptions
+from .models import (
+    AllocationPlan, AllocationPlanLine, MedicineCoverage, Prescription, PrescriptionHistory, PrescriptionItem,
+    PrescriptionSearchTerm, PrescriptionSummary,
+)
+from .readers import prescription_rows
+from .serializers import PrescriptionSerializer
+from .therapy import therapy_warnings
+from . import services
+from .services import bulk_create_items, bulk_create_prescriptions
+from .views import PrescriptionViewSet
+
+
+def make_user(username, role):
+    user = User.objects.create_user(username)
+    user.userprofile.role = role
+    user.userprofile.save()
+    return user
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+class FastReaderParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = User.objects.create_user('doctor', first_name='Greg', last_name='House')
+        patient = Patient.objects.create(name='John Doe')
+        medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        Batch.objects.create(
+            medicine=medicine, batch_number='B1', quantity=40,
+            expiration_date=date.today() + timedelta(days=90), cost_per_unit='2.00'
+        )
+        active = Prescription.objects.create(
+            patient=patient, prescribed_by=doctor, max_refills=2,
+            expiry_date=date.today() + timedelta(days=30), notes='Take with food'
+        )
+        PrescriptionItem.objects.create(
+            prescription=active, medicine=medicine, drug_name='Amoxicillin',
+            dosage='500mg', quantity=21, frequency='3x daily', duration='7 days', route='oral'
+        )
+        Prescription.objects.create(patient=patient, prescribed_by=doctor, status='cancelled')
+
+    def test_prescription_rows_match_serializer(self):
+        prescriptions = Prescription.objects.all()
+        self.assertEqual(
+            prescription_rows(prescriptions),
+            PrescriptionSerializer(prescriptions, many=True).data
+        )
+
+
+class RefillTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', 'admin')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        cls.batch = Batch.objects.create(
+            medicine=cls.medicine, batch_number='B1', quantity=40,
+            expiration_date=date.today() + timedelta(days=90), cost_per_unit='2.00'
+        )
+        cls.prescription = Prescription.objects.create(
+            patient=cls.patient, prescribed_by=cls.admin, max_refills=1,
+            expiry_date=date.today() + timedelta(days=30)
+        )
+        PrescriptionItem.objects.create(
+            prescription=cls.prescription, medicine=cls.medicine, dosage='500mg',
+            quantity=10, frequency='3x daily', duration='7 days', route='oral'
+        )
+
+    def refill(self):
+        return client_for(self.admin).post(f'/api/prescriptions/prescriptions/{self.prescription.pk}/refill/')
+
+    def test_refill_dispenses_stock(self):
+        response = self.refill()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['refill_count'], 1)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 30)
+
+    def test_concurrent_refill_is_rechecked_under_lock(self):
+        # The request read the prescription before another refill used up
+        # its last refill; the locked re-read must stop it dispensing again
+        stale = Prescription.objects.get(pk=self.prescription.pk)
+        Prescription.objects.filter(pk=self.prescription.pk).update(refill_count=1)
+        with mock.patch.object(PrescriptionViewSet, 'get_object', return_value=stale):
+            response = self.refill()
+        self.assertEqual(response.status_code, 400)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 40)
+        self.assertEqual(Prescription.objects.get(pk=self.prescription.pk).refill_count, 1)
+
+
+class BulkCreateItemsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doctor', 'doctor')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+
+    def item(self, prescription, quantity):
+        return PrescriptionItem(
+            prescription=prescription, medicine=self.medicine, dosage='500mg',
+            quantity=quantity, frequency='daily', duration='7 days', route='oral'
+        )
+
+    def test_ids_are_read_back_when_backend_returns_none(self):
+        first, second = [
+            Prescription.objects.create(patient=self.patient, prescribed_by=self.doctor) for _ in range(2)
+        ]
+        # Leave a gap in the item ids, as concurrent inserts can on MySQL
+        self.item(first, 99).save()
+        PrescriptionItem.objects.filter(quantity=99).delete()
+        items = [self.item(first, 1), self.item(second, 2), self.item(first, 3)]
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert',
+            new_callable=mock.PropertyMock, return_value=False
+        ):
+            items = bulk_create_items(items)
+        for item in items:
+            self.assertEqual(PrescriptionItem.objects.get(pk=item.pk).quantity, item.quantity)
+            self.assertEqual(PrescriptionItem.objects.get(pk=item.pk).prescription_id, item.prescription_id)
+
+    def test_prescription_ids_are_read_back_when_backend_returns_none(self):
+        other = Patient.objects.create(name='Jane Roe')
+        # Leave a gap in the ids, as concurrent inserts can on MySQL
+        Prescription.objects.create(patient=self.patient, prescribed_by=self.doctor).delete()
+        prescriptions = [
+            Prescription(patient=patient, prescribed_by=self.doctor, notes=str(number))
+            for number, patient in enumerate([self.patient, other, self.patient])
+        ]
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert',
+            new_callable=mock.PropertyMock, return_value=False
+        ):
+            prescriptions = bulk_create_prescriptions(prescriptions)
+        for prescription in prescriptions:
+            self.assertEqual(Prescription.objects.get(pk=prescription.pk).notes, prescription.notes)
+
+
+class BatchCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doctor', 'doctor')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        Batch.objects.create(
+            medicine=cls.medicine, batch_number='B1', quantity=10,
+            expiration_date=date.today() + timedelta(days=90), cost_per_unit='2.00'
+        )
+
+    def submit(self, body):
+        return client_for(self.doctor).post('/api/prescriptions/prescriptions/batch/', body, format='json')
+
+    def entry(self, quantity):
+        return {'patient_id': self.patient.pk, 'items': [{'medicine_id': self.medicine.pk, 'quantity': quantity}]}
+
+    def test_list_body_is_rejected(self):
+        response = self.submit([1, 2])
+        self.assertEqual(response.status_code, 400)
+
+    def test_atomic_batch_with_an_invalid_entry_creates_nothing(self):
+        response = self.submit({'mode': 'atomic', 'prescriptions': [self.entry(2), self.entry(20)]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual([row['result'] for row in response.data['results']], ['not_created', 'error'])
+        self.assertFalse(Prescription.objects.exists())
+
+    def test_partial_batch_creates_the_valid_entries(self):
+        # Stock is checked cumulatively: the second entry would take the
+        # units the first one already claimed
+        response = self.submit({'mode': 'partial', 'prescriptions': [self.entry(6), self.entry(6), self.entry(4)]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual([row['result'] for row in response.data['results']], ['created', 'error', 'created'])
+        self.assertEqual(response.data['results'][1]['status_code'], 400)
+        self.assertEqual(Prescription.objects.count(), 2)
+        self.assertEqual(PrescriptionItem.objects.aggregate(total=Sum('quantity'))['total'], 10)
+
+    def test_prescriptions_are_inserted_with_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit({'prescriptions': [self.entry(1), self.entry(2), self.entry(3)]})
+        self.assertEqual(response.status_code, 200)
+        table = Prescription._meta.db_table
+        inserts = [query for query in queries if query['sql'].startswith(f'INSERT INTO "{table}"')]
+        self.assertEqual(len(inserts), 1)
+
+
+class AllocationPlanViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = make_user('pharmacist', 'pharmacist')
+        cls.colleague = make_user('colleague', 'pharmacist')
+
+    def test_plans_are_shared_between_pharmacists(self):
+        response = client_for(self.creator).post('/api/prescriptions/allocation-plans/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/prescriptions/allocation-plans/{response.data['id']}/"
+        client = client_for(self.colleague)
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(client.get(f'{url}lines/').status_code, 200)
+
+    def test_doctors_cannot_plan(self):
+        response = client_for(make_user('doctor', 'doctor')).post('/api/prescriptions/allocation-plans/', {}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class AllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', 'admin')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        cls.short_dated = Batch.objects.create(
+            medicine=cls.medicine, batch_number='B1', quantity=10,
+            expiration_date=date.today() + timedelta(days=20), cost_per_unit='2.00'
+        )
+        cls.long_dated = Batch.objects.create(
+            medicine=cls.medicine, batch_number='B2', quantity=10,
+            expiration_date=date.today() + timedelta(days=200), cost_per_unit='2.00'
+        )
+
+    def prescribe(self, quantity):
+        prescription = Prescription.objects.create(
+            patient=self.patient, prescribed_by=self.admin, max_refills=1,
+            expiry_date=date.today() + timedelta(days=30)
+        )
+        item = PrescriptionItem.objects.create(
+            prescription=prescription, medicine=self.medicine, dosage='500mg',
+            quantity=quantity, frequency='daily', duration='7 days', route='oral'
+        )
+        return prescription, item
+
+    def test_plan_beats_greedy_fefo(self):
+        today = date.today()
+        batches = [
+            (self.short_dated.pk, 10, self.short_dated.expiration_date),
+            (self.long_dated.pk, 10, self.long_dated.expiration_date),
+        ]
+        # First on the worklist but not due for two months
+        later = Demand(1, self.medicine.pk, 10, 1, today + timedelta(days=60), today + timedelta(days=60), (0,))
+        now = Demand(2, self.medicine.pk, 10, 1, today, today, (1,))
+
+        allocations, unmet, waste = plan_medicine([later, now], batches)
+        self.assertEqual((unmet, waste), (0, 0))
+        self.assertIn((now, self.short_dated.pk, 10), allocations)
+        self.assertIn((later, self.long_dated.pk, 10), allocations)
+        # Greedy FEFO spends the short-dated batch on the later refill
+        self.assertEqual(greedy_medicine([later, now], batches), (10, 10))
+
+    def test_refill_leaves_stock_planned_for_other_prescriptions(self):
+        prescription, _ = self.prescribe(5)
+        _, planned_item = self.prescribe(10)
+        plan = AllocationPlan.objects.create(created_by=self.admin, as_of=date.today())
+        AllocationPlanLine.objects.create(
+            plan=plan, item=planned_item, medicine=self.medicine, batch=self.short_dated,
+            refill_number=1, due_date=date.today(), quantity=10
+        )
+        response = client_for(self.admin).post(f'/api/prescriptions/prescriptions/{prescription.pk}/refill/')
+        self.assertEqual(response.status_code, 200)
+        self.short_dated.refresh_from_db()
+        self.long_dated.refresh_from_db()
+        self.assertEqual((self.short_dated.quantity, self.long_dated.quantity), (10, 5))
+
+    def test_reserved_stock_is_used_when_nothing_else_is_left(self):
+        prescription, _ = self.prescribe(15)
+        _, planned_item = self.prescribe(10)
+        plan = AllocationPlan.objects.create(created_by=self.admin, as_of=date.today())
+        AllocationPlanLine.objects.create(
+            plan=plan, item=planned_item, medicine=self.medicine, batch=self.short_dated,
+            refill_number=1, due_date=date.today(), quantity=10
+        )
+        response = client_for(self.admin).post(f'/api/prescriptions/prescriptions/{prescription.pk}/refill/')
+        self.assertEqual(response.status_code, 200)
+        self.short_dated.refresh_from_db()
+        self.long_dated.refresh_from_db()
+        self.assertEqual((self.short_dated.quantity, self.long_dated.quantity), (5, 0))
+
+    def test_new_plan_supersedes_earlier_lines(self):
+        self.prescribe(5)
+        first = create_plan([self.medicine.pk], user=self.admin)
+        second = create_plan(user=self.admin)
+        first.refresh_from_db()
+        self.assertEqual(first.superseded_by_id, second.pk)
+        # The earlier plan keeps its lines for reference
+        self.assertEqual(list(first.lines.values_list('superseded_by', flat=True)), [second.pk])
+        self.assertEqual(list(second.lines.values_list('superseded_by', flat=True)), [None])
+        self.assertEqual(reserved_batches([self.medicine.pk]), {self.short_dated.pk: 5})
+
+    def test_catalogue_is_planned_in_chunks(self):
+        self.prescribe(5)
+        other = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        Batch.objects.create(
+            medicine=other, batch_number='I1', quantity=10,
+            expiration_date=date.today() + timedelta(days=90), cost_per_unit='0.50'
+        )
+        with mock.patch('prescriptions.allocation.in_chunks', partial(in_chunks, size=1)):
+            plan = create_plan(user=self.admin)
+        self.assertEqual([row['medicine_id'] for row in plan.report], [self.medicine.pk, other.pk])
+        self.assertEqual(plan.planned_units, 5)
+
+
+class ClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacist = make_user('pharmacist', 'pharmacist')
+        cls.colleague = make_user('colleague', 'pharmacist')
+        patient = Patient.objects.create(name='John Doe')
+        medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        Batch.objects.create(
+            medicine=medicine, batch_number='B1', quantity=40,
+            expiration_date=date.today() + timedelta(days=90), cost_per_unit='2.00'
+        )
+        cls.first, cls.second = [
+            Prescription.objects.create(
+                patient=patient, prescribed_by=cls.pharmacist, max_refills=1,
+                expiry_date=date.today() + timedelta(days=30)
+            )
+            for _ in range(2)
+        ]
+        for prescription in (cls.first, cls.second):
+            PrescriptionItem.objects.create(
+                prescription=prescription, medicine=medicine, dosage='500mg',
+                quantity=10, frequency='daily', duration='7 days', route='oral'
+            )
+
+    def claim(self, user, count=1):
+        return client_for(user).post('/api/prescriptions/prescriptions/claim/', {'count': count}, format='json')
+
+    def post(self, user, prescription, action):
+        return client_for(user).post(f'/api/prescriptions/prescriptions/{prescription.pk}/{action}/')
+
+    def test_concurrent_claims_get_distinct_prescriptions(self):
+        self.assertEqual([row['id'] for row in self.claim(self.pharmacist).data], [self.first.pk])
+        self.assertEqual([row['id'] for row in self.claim(self.colleague).data], [self.second.pk])
+        self.assertEqual(self.claim(self.colleague).data, [])
+
+    def test_only_the_claimant_can_release(self):
+        self.claim(self.pharmacist)
+        self.assertEqual(self.post(self.colleague, self.first, 'release').status_code, 409)
+        self.assertEqual(self.post(self.pharmacist, self.first, 'release').status_code, 200)
+        self.assertEqual([row['id'] for row in self.claim(self.colleague).data], [self.first.pk])
+
+    def test_refill_is_refused_while_another_pharmacist_holds_the_claim(self):
+        self.claim(self.pharmacist)
+        self.assertEqual(self.post(self.colleague, self.first, 'refill').status_code, 409)
+        response = self.post(self.pharmacist, self.first, 'refill')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Prescription.objects.get(pk=self.first.pk).claimed_by)
+
+    def test_refill_after_the_claim_expires(self):
+        self.claim(self.pharmacist)
+        Prescription.objects.filter(pk=self.first.pk).update(claim_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.post(self.colleague, self.first, 'refill').status_code, 200)
+
+
+class ExpirySweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user('doctor', 'doctor')
+        patient = Patient.objects.create(name='John Doe')
+        # Ids deliberately out of expiry order, with two sharing a date
+        cls.prescriptions = {
+            name: Prescription.objects.create(
+                patient=patient, prescribed_by=doctor, status=prescription_status,
+                expiry_date=date.today() - timedelta(days=days_ago)
+            )
+            for name, days_ago, prescription_status in [
+                ('a', 3, 'active'), ('b', 10, 'active'), ('c', 3, 'active'),
+                ('current', -5, 'active'), ('cancelled', 1, 'cancelled'),
+            ]
+        }
+
+    def statuses(self):
+        return {
+            name: Prescription.objects.get(pk=prescription.pk).status
+            for name, prescription in self.prescriptions.items()
+        }
+
+    def test_every_due_prescription_is_expired_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_prescriptions(chunk_size=1), 3)
+            self.assertEqual(expire_prescriptions(chunk_size=2), 0)
+        self.assertEqual(self.statuses(), {
+            'a': 'expired', 'b': 'expired', 'c': 'expired', 'current': 'active', 'cancelled': 'cancelled',
+        })
+        self.assertEqual(
+            sorted(PrescriptionHistory.objects.filter(action='expired').values_list('prescription_id', flat=True)),
+            sorted(self.prescriptions[name].pk for name in 'abc')
+        )
+
+
+class MedicineRenameTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user('doctor', 'doctor')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        cls.prescription = Prescription.objects.create(patient=Patient.objects.create(name='John Doe'), prescribed_by=doctor)
+        for drug_name in ('', 'Amoxil'):
+            PrescriptionItem.objects.create(
+                prescription=cls.prescription, medicine=cls.medicine, drug_name=drug_name, dosage='500mg',
+                quantity=10, frequency='daily', duration='7 days', route='oral'
+            )
+
+    def test_summary_shows_the_new_name(self):
+        self.medicine.name = 'Amoxicillin trihydrate'
+        self.medicine.save()
+        self.assertEqual(
+            PrescriptionSummary.objects.get(prescription=self.prescription).drug_names,
+            ['Amoxicillin trihydrate', 'Amoxil']
+        )
+
+    def test_search_finds_the_new_name(self):
+        self.medicine.name = 'Augmentin'
+        self.medicine.save()
+        terms = set(PrescriptionSearchTerm.objects.filter(prescription=self.prescription).values_list('term', flat=True))
+        self.assertIn('augmentin', terms)
+        self.assertNotIn('amoxicillin', terms)
+
+
+class CoverageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user('doctor', 'doctor')
+        patient = Patient.objects.create(name='John Doe')
+        cls.medicine = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        today = date.today()
+        for number, quantity, days in [('SOON', 5, 10), ('LATER', 20, 90), ('EXPIRED', 100, -1), ('EMPTY', 0, 90)]:
+            Batch.objects.create(
+                medicine=cls.medicine, batch_number=number, quantity=quantity,
+                expiration_date=today + timedelta(days=days), cost_per_unit='2.00'
+            )
+        # Only the first prescription still has demand: two refills of 15
+        for status, refill_count, days in [('active', 1, 30), ('active', 0, -1), ('cancelled', 0, 30), ('active', 3, 30)]:
+            prescription = Prescription.objects.create(
+                patient=patient, prescribed_by=doctor, status=status, refill_count=refill_count,
+                max_refills=3, expiry_date=today + timedelta(days=days)
+            )
+            PrescriptionItem.objects.create(
+                prescription=prescription, medicine=cls.medicine, dosage='500mg', quantity=15,
+                frequency='3x daily', duration='7 days', route='oral'
+            )
+
+    def coverage(self):
+        coverage = MedicineCoverage.objects.get(medicine=self.medicine)
+        return coverage.demand, coverage.on_hand, coverage.expiring_soon, coverage.usable, coverage.shortfall
+
+    def test_demand_is_compared_with_stock_outside_the_horizon(self):
+        with self.settings(COVERAGE_EXPIRY_HORIZON_DAYS=30):
+            self.assertEqual(refresh_coverage([self.medicine.pk]), 1)
+        self.assertEqual(self.coverage(), (30, 25, 5, 20, 10))
+
+        # Refreshing again updates the row in place
+        with self.settings(COVERAGE_EXPIRY_HORIZON_DAYS=7):
+            refresh_coverage([self.medicine.pk])
+        self.assertEqual(self.coverage(), (30, 25, 0, 25, 5))
+        self.assertEqual(MedicineCoverage.objects.count(), 1)
+
+
+class TherapyWarningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user('doctor', 'doctor')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.other_patient = Patient.objects.create(name='Jane Roe')
+        cls.amoxicillin = Medicine.objects.create(name='Amoxicillin', price_per_unit='4.00', barcode='A-001')
+        cls.ibuprofen = Medicine.objects.create(name='Ibuprofen', price_per_unit='1.00', barcode='I-001')
+        today = date.today()
+        # Only the first is active therapy; the others are expired or cancelled
+        items = [
+            PrescriptionItem.objects.create(
+                prescription=Prescription.objects.create(
+                    patient=cls.patient, prescribed_by=doctor, status=status, expiry_date=today + timedelta(days=days)
+                ),
+                medicine=cls.amoxicillin, drug_name='Amoxicillin', dosage='500mg',
+                quantity=21, frequency='3x daily', duration='7 days', route='oral'
+            )
+            for status, days in [('active', 30), ('active', -1), ('cancelled', 30)]
+        ]
+        cls.active_item = items[0]
+
+    def test_duplicate_of_active_prescription(self):
+        warnings = therapy_warnings([
+            (0, self.patient.pk, [(self.ibuprofen.pk, 10), (self.amoxicillin.pk, 21)]),
+            (1, self.other_patient.pk, [(self.amoxicillin.pk, 21)]),
+        ])
+        self.assertEqual(len(warnings[0]), 1)
+        self.assertEqual(warnings[1], [])
+        warning = warnings[0][0]
+        self.assertEqual(warning['type'], 'duplicate_therapy')
+        self.assertEqual(warning['item_index'], 1)
+        self.assertEqual(warning['existing_prescription_id'], self.active_item.prescription_id)
+        self.assertEqual(warning['existing_item_id'], self.active_item.pk)
+
+    def test_medicine_repeated_for_a_patient_in_one_request(self):
+        warnings = therapy_warnings([
+            (0, self.other_patient.pk, [(self.ibuprofen.pk, 10)]),
+            (1, self.patient.pk, [(self.ibuprofen.pk, 10)]),
+            (2, self.other_patient.pk, [(self.ibuprofen.pk, 5)]),
+        ])
+        self.assertEqual(warnings[:2], [[], []])
+        self.assertEqual(
+            [(w['type'], w['first_entry_index'], w['first_item_index']) for w in warnings[2]],
+            [('repeated_in_request', 0, 0)]
+        )
+
+
+class CreatePrescriptionQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doctor', 'doctor')
+        cls.patient = Patient.objects.create(name='John Doe')
+        cls.medicines = [
+            Medicine.objects.create(name=f'Medicine {number}', price_per_unit='1.00', barcode=f'M-{number}')
+            for number in range(20)
+        ]
+        for medicine in cls.medicines:
+            Batch.objects.create(
+                medicine=medicine, batch_number='B1', quantity=100,
+                expiration_date=date.today() + timedelta(days=90), cost_per_unit='0.50'
+            )
+
+    def create(self, count):
+        return services.create_prescription(self.doctor, {
+            'patient_id': self.patient.pk,
+            'items': [{'medicine_id': medicine.pk, 'quantity': 2} for medicine in self.medicines[:count]],
+        })
 
-# Create your tests here.
+    def test_query_count_does_not_grow_with_items(self):
+        with CaptureQueriesContext(connection) as single:
+            self.assertEqual(self.create(1)['items_count'], 1)
+        with self.assertNumQueries(len(single)):
+            self.assertEqual(self.create(20)['items_count'], 20)
@@ -0,0 +1,83 @@
+"""
+Duplicate-therapy warnings for new prescriptions.
+
+A new item is flagged when the patient already has an active, unexpired
+prescription for the same medicine, or when the same submission prescribes
+that medicine to the patient more than once. Warnings do not block
+creation; they are returned with the created prescription.
+"""
+from django.utils import timezone
+
+from .models import PrescriptionItem
+
+
+def active_therapy(patient_ids, medicine_ids, today=None):
+    """
+    {(patient_id, medicine_id): [existing item, ...]} for the patients'
+    active prescriptions, read with one query through the (patient, status)
+    index.
+    """
+    today = today or timezone.localdate()
+    existing = {}
+    for row in (
+        PrescriptionItem.objects.filter(
+            prescription__patient_id__in=patient_ids,
+            prescription__status='active',
+            prescription__expiry_date__gte=today,
+            medicine_id__in=medicine_ids,
+        )
+        .order_by('prescription_id', 'id')
+        .values(
+            'id', 'prescription_id', 'medicine_id', 'drug_name', 'dosage', 'frequency',
+            'prescription__patient_id', 'prescription__prescribed_by_id', 'prescription__expiry_date',
+        )
+    ):
+        existing.setdefault((row['prescription__patient_id'], row['medicine_id']), []).append(row)
+    return existing
+
+
+def therapy_warnings(prescriptions, today=None):
+    """
+    Check new prescriptions, given as (entry_index, patient_id,
+    [(medicine_id, quantity), ...]) in submission order, against the
+    patients' active prescriptions and each other. Returns one list of
+    warnings per prescription.
+    """
+    patient_ids = {patient_id for _, patient_id, _ in prescriptions}
+    medicine_ids = {medicine_id for _, _, pairs in prescriptions for medicine_id, _ in pairs}
+    existing = active_therapy(patient_ids, medicine_ids, today) if medicine_ids else {}
+
+    seen = {}
+    warnings = []
+    for entry_index, patient_id, pairs in prescriptions:
+        found = []
+        for item_index, (medicine_id, _) in enumerate(pairs):
+            for row in existing.get((patient_id, medicine_id), []):
+                found.append({
+                    'type': 'duplicate_therapy',
+                    'item_index': item_index,
+                    'medicine_id': medicine_id,
+                    'existing_prescription_id': row['prescription_id'],
+                    'existing_item_id': row['id'],
+                    'existing_drug_name': row['drug_name'],
+                    'existing_dosage': row['dosage'],
+                    'existing_frequency': row['frequency'],
+                    'prescribed_by_id': row['prescription__prescribed_by_id'],
+                    'expiry_date': row['prescription__expiry_date'],
+                    'message': f"Patient already has active prescription #{row['prescription_id']} "
+                               f"for medicine {medicine_id}",
+                })
+            previous = seen.get((patient_id, medicine_id))
+            if previous is not None:
+                found.append({
+                    'type': 'repeated_in_request',
+                    'item_index': item_index,
+                    'medicine_id': medicine_id,
+                    'first_entry_index': previous[0],
+                    'first_item_index': previous[1],
+                    'message': f'Medicine {medicine_id} is prescribed to this patient more than once in this request',
+                })
+            else:
+                seen[(patient_id, medicine_id)] = (entry_index, item_index)
+        warnings.append(found)
+    return warnings
@@ -1,15 +1,22 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, status
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Prescription, PrescriptionItem, PrescriptionHistory
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from .models import (
+    Prescription, PrescriptionItem, PrescriptionHistory, PrescriptionSummary, MedicineCoverage,
+    AllocationPlan
+)
 from patients.models import Patient
 from .serializers import (
     PatientSerializer, PrescriptionSerializer, PrescriptionItemSerializer,
-    PrescriptionHistorySerializer
+    PrescriptionHistorySerializer, PrescriptionSummarySerializer, MedicineCoverageSerializer,
+    AllocationPlanSerializer, AllocationPlanLineSerializer
 )
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Count, Q
 from django.utils import timezone
 from core.permissions import (
@@ -17,9 +24,35 @@ from core.permissions import (
     IsAdminOrDoctor, IsAdminOrPharmacist, 
     RoleBasedPermission
 )
+from core import audit
+from core.idempotency import idempotent
+from core.readers import FastListMixin
+from core.streaming import StreamingListMixin
+from .outbox import (
+    record_prescription_created, record_prescription_refilled, record_prescription_cancelled
+)
+from .access import PHARMACIST_STATUSES, visible_to
+from .allocation import create_plan, planned_batches, reserved_batches
+from .readers import prescription_rows
+from .search import query_terms, ranked_matches
+from inventory.models import InventoryLog
+from inventory.stock import InsufficientStock, StockConflict, dispense_lines
+from . import services
+from .services import PrescriptionError
 
 # Create your views here.
 
+class TimelinePagination(CursorPagination):
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-date_prescribed', '-prescription_id')
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
@@ -32,9 +65,24 @@ class PatientViewSet(viewsets.ModelViewSet):
         serializer = PrescriptionSerializer(prescriptions, many=True)
         return Response(serializer.data)
 
-class PrescriptionViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """
+        Newest-first prescription summaries for the patient, paginated with
+        ?cursor= and ?page_size=. Each summary links to the full prescription.
+        """
+        patient = self.get_object()
+        summaries = PrescriptionSummary.objects.filter(visible_to(request.user), patient=patient)
+
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(summaries, request, view=self)
+        serializer = PrescriptionSummarySerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+class PrescriptionViewSet(FastListMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Prescription.objects.all()
     serializer_class = PrescriptionSerializer
+    list_reader = staticmethod(prescription_rows)
     permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
 
     role_permissions = {
@@ -46,30 +94,14 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
     }
 
     def get_queryset(self):
-        print("PrescriptionViewSet.get_queryset() called")
-        queryset = Prescription.objects.all()
-        
-        # Debug: Print out all prescriptions in the database
-        all_prescriptions = Prescription.objects.all()
-        print(f"All prescriptions in database: {all_prescriptions.count()}")
-        for p in all_prescriptions:
-            print(f"ID: {p.id}, Patient: {p.patient.name}, Status: {p.status}")
+        queryset = Prescription.objects.select_related(
+            'patient', 'prescribed_by'
+        ).prefetch_related(
+            'items__medicine__category', 'items__medicine__supplier', 'items__medicine__batches'
+        )
         
         # If user is not admin, filter based on role
-        role = getattr(self.request.user, 'userprofile', None)
-        if role:
-            role = role.role
-            print(f"User role: {role}")
-            if role != 'admin':
-                if role == 'doctor':
-                    print(f"Filtering for doctor: {self.request.user.username}")
-                    queryset = queryset.filter(prescribed_by=self.request.user)
-                elif role == 'pharmacist':
-                    print("Filtering for pharmacist (active/pending only)")
-                    # Pharmacists can see all active and pending prescriptions
-                    queryset = queryset.filter(status__in=['active', 'pending'])
-        else:
-            print("No user role found, providing all prescriptions")
+        queryset = queryset.filter(visible_to(self.request.user))
         
         # Filter by patient
         patient_id = self.request.query_params.get('patient_id')
@@ -98,11 +130,6 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
                 date_prescribed__range=[start_date, end_date]
             )
         
-        # Debug: Print final filtered queryset
-        print(f"Final filtered queryset: {queryset.count()} prescriptions")
-        for p in queryset:
-            print(f"ID: {p.id}, Patient: {p.patient.name}, Status: {p.status}")
-            
         return queryset
 
     def perform_create(self, serializer):
@@ -117,12 +144,14 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         print(f"Notes: {notes}")
         
         # Save with all fields
-        instance = serializer.save(
-            prescribed_by=self.request.user,
-            staff_id=staff_id,
-            prescriber_contact=prescriber_contact,
-            notes=notes
-        )
+        with transaction.atomic():
+            instance = serializer.save(
+                prescribed_by=self.request.user,
+                staff_id=staff_id,
+                prescriber_contact=prescriber_contact,
+                notes=notes
+            )
+            record_prescription_created(instance, instance.items.all())
         print(f"Prescription created with ID: {instance.id}")
         return instance
 
@@ -150,7 +179,9 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         print(f"Prescription updated: {instance.id}")
         
         # Create history entry
-        PrescriptionHistory.objects.create(
+        audit.record(
+            PrescriptionHistory,
+            key=(instance.pk, 'updated'),
             prescription=instance,
             action='updated',
             performed_by=self.request.user,
@@ -176,13 +207,124 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def expired(self, request):
-        prescriptions = self.get_queryset().filter(
-            Q(status='active') & Q(expiry_date__lt=timezone.now().date())
-        )
+        # Set by the expire_prescriptions command
+        prescriptions = self.get_queryset().filter(status='expired')
         serializer = self.get_serializer(prescriptions, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['post'])
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Prescriptions whose notes, instructions or drug names contain every
+        word of ?q= (as word prefixes), best matches first, paginated with
+        ?page= and ?page_size=. Each hit carries its relevance ``score``.
+        """
+        terms = query_terms(request.query_params.get('q', ''))
+        if not terms:
+            return Response(
+                {'error': 'q must contain at least one word of two or more characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        matches = ranked_matches(terms, visible_to(request.user, prefix='prescription__'))
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        scores = {match['prescription_id']: match['score'] for match in page}
+        rows = {row['id']: row for row in prescription_rows(Prescription.objects.filter(id__in=scores))}
+        return paginator.get_paginated_response([
+            {**rows[prescription_id], 'score': score}
+            for prescription_id, score in scores.items() if prescription_id in rows
+        ])
+
+    def _worklist(self, now):
+        """
+        Prescriptions waiting to be dispensed, most urgent and oldest first,
+        in the order of the (status, priority_rank, date_prescribed) index.
+        """
+        return Prescription.objects.filter(
+            status__in=PHARMACIST_STATUSES, expiry_date__gte=now.date()
+        ).order_by('priority_rank', 'date_prescribed', 'id')
+
+    def _limit(self, request, name, default, maximum):
+        try:
+            return min(max(int(request.query_params.get(name, request.data.get(name, default))), 1), maximum)
+        except (TypeError, ValueError):
+            return default
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsAdminOrPharmacist])
+    def worklist(self, request):
+        """
+        Unclaimed (or lease-expired) prescriptions plus the caller's own
+        claims. ?mine=true returns only the caller's claims.
+        """
+        now = timezone.now()
+        mine = Q(claimed_by=request.user, claim_expires_at__gt=now)
+        if request.query_params.get('mine') == 'true':
+            queryset = self._worklist(now).filter(mine)
+        else:
+            queryset = self._worklist(now).filter(
+                Q(claimed_by__isnull=True) | Q(claim_expires_at__lte=now) | mine
+            )
+        return Response(prescription_rows(queryset[:self._limit(request, 'limit', 50, 200)]))
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAdminOrPharmacist])
+    def claim(self, request):
+        """
+        Claim the next ``count`` prescriptions of the worklist for
+        PRESCRIPTION_CLAIM_LEASE seconds. Rows another pharmacist is claiming
+        at the same moment are skipped rather than waited for, so concurrent
+        claims get distinct prescriptions.
+        """
+        count = self._limit(request, 'count', 1, 20)
+        now = timezone.now()
+        lease = timedelta(seconds=getattr(settings, 'PRESCRIPTION_CLAIM_LEASE', 600))
+        with transaction.atomic():
+            ids = list(
+                self._worklist(now)
+                .filter(Q(claimed_by__isnull=True) | Q(claim_expires_at__lte=now))
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:count]
+            )
+            Prescription.objects.filter(id__in=ids).update(
+                claimed_by=request.user, claim_expires_at=now + lease
+            )
+        claimed = {row['id']: row for row in prescription_rows(Prescription.objects.filter(id__in=ids))}
+        return Response([claimed[prescription_id] for prescription_id in ids if prescription_id in claimed])
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAdminOrPharmacist])
+    def release(self, request, pk=None):
+        claims = Prescription.objects.filter(pk=pk, claimed_by__isnull=False)
+        if request.user.userprofile.role != 'admin':
+            claims = claims.filter(claimed_by=request.user)
+        if not claims.update(claimed_by=None, claim_expires_at=None):
+            return Response(
+                {'error': 'Prescription is not claimed by you'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'status': 'released'})
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def batch(self, request):
+        """
+        Create many prescriptions in one request. Body:
+        {"mode": "atomic" | "partial", "prescriptions": [<create_prescription body>, ...]}
+        """
+        if not isinstance(request.data, dict):
+            return Response(
+                {'error': 'Request body must be an object with a "prescriptions" list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            data, status_code = services.create_prescriptions(
+                request.user, request.data.get('prescriptions'), request.data.get('mode', 'atomic')
+            )
+        except PrescriptionError as e:
+            return Response(e.as_response_data(), status=e.status_code)
+        return Response(data, status=status_code)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAdminOrPharmacist])
+    @idempotent
     def refill(self, request, pk=None):
         if not request.user.userprofile.role in ['admin', 'pharmacist']:
             return Response(
@@ -197,19 +339,94 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        prescription.refill_count += 1
-        prescription.last_refill_date = timezone.now()
-        prescription.save()
-        
-        # Create history entry
-        PrescriptionHistory.objects.create(
-            prescription=prescription,
-            action='refilled',
-            performed_by=request.user
-        )
+        reference = f'Prescription #{prescription.id} refill'
+        with transaction.atomic():
+            # Lock the prescription so concurrent refills run one after the
+            # other and each sees the refill_count the previous one wrote
+            prescription = Prescription.objects.select_for_update().get(pk=prescription.pk)
+            if not prescription.can_refill():
+                return Response(
+                    {'error': 'Prescription cannot be refilled'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if (prescription.claimed_by_id not in (None, request.user.id)
+                    and prescription.claim_expires_at > timezone.now()):
+                return Response(
+                    {'error': 'Prescription is claimed by another pharmacist'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            items = list(prescription.items.values_list('id', 'medicine_id', 'quantity'))
+            # Follow the allocation plan for this refill where there is one,
+            # and keep stock planned for other refills for last
+            preferred = planned_batches(items, prescription.refill_count + 1)
+            reserved = reserved_batches(
+                {medicine_id for _, medicine_id, _ in items}, prescription.pk, prescription.refill_count + 1
+            )
+
+            # Dispense every item in this transaction so the refill and the
+            # stock it takes are committed or rolled back together
+            try:
+                allocations = dispense_lines(
+                    [(medicine_id, quantity) for _, medicine_id, quantity in items],
+                    reason='DISPENSE', reference=reference, preferred=preferred,
+                    reserved=reserved
+                )
+            except InsufficientStock as e:
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': 'Insufficient stock to refill prescription', 'details': [
+                        {**shortage, 'item_id': items[shortage['index']][0]}
+                        for shortage in e.shortages
+                    ]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            except StockConflict:
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': 'Stock is being updated concurrently, please retry'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            InventoryLog.objects.bulk_create([
+                InventoryLog(
+                    medicine_id=allocation.medicine_id,
+                    batch_id=allocation.batch_id,
+                    action='DISPENSE',
+                    quantity=-allocation.quantity,
+                    performed_by=request.user.username,
+                    notes=f'Dispensed for {reference}'
+                )
+                for allocation in allocations
+            ])
+
+            prescription.refill_count += 1
+            prescription.last_refill_date = timezone.now()
+            # Dispensed, so it leaves the claimant's worklist
+            prescription.claimed_by = None
+            prescription.claim_expires_at = None
+            prescription.save()
+
+            # Create history entry
+            audit.record(
+                PrescriptionHistory,
+                prescription=prescription,
+                action='refilled',
+                performed_by=request.user
+            )
+            allocation_data = [
+                {
+                    'item_id': items[allocation.index][0],
+                    'medicine_id': allocation.medicine_id,
+                    'batch_id': allocation.batch_id,
+                    'batch_number': allocation.batch_number,
+                    'expiration_date': allocation.expiration_date,
+                    'quantity': allocation.quantity,
+                }
+                for allocation in allocations
+            ]
+            record_prescription_refilled(prescription, request.user, allocation_data)
         
         serializer = self.get_serializer(prescription)
-        return Response(serializer.data)
+        return Response({**serializer.data, 'allocation': allocation_data})
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -226,16 +443,20 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        prescription.status = 'cancelled'
-        prescription.save()
-        
-        # Create history entry
-        PrescriptionHistory.objects.create(
-            prescription=prescription,
-            action='cancelled',
-            performed_by=request.user,
-            notes=request.data.get('notes', '')
-        )
+        with transaction.atomic():
+            prescription.status = 'cancelled'
+            prescription.save()
+
+            # Create history entry
+            audit.record(
+                PrescriptionHistory,
+                key=(prescription.pk, 'cancelled'),
+                prescription=prescription,
+                action='cancelled',
+                performed_by=request.user,
+                notes=request.data.get('notes', '')
+            )
+            record_prescription_cancelled(prescription, request.user, request.data.get('notes', ''))
         
         serializer = self.get_serializer(prescription)
         return Response(serializer.data)
@@ -256,15 +477,11 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset().filter(date_prescribed__gte=date_threshold)
         
         # Calculate statistics
-        total_prescriptions = queryset.count()
-        
-        active_prescriptions = queryset.filter(
-            status='active'
-        ).count()
-        
-        expired_prescriptions = queryset.filter(
-            Q(status='active') & Q(expiry_date__lt=timezone.now().date())
-        ).count()
+        counts = queryset.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(status='active')),
+            expired=Count('id', filter=Q(status='expired')),
+        )
         
         prescriptions_by_status = queryset.values('status').annotate(
             count=Count('id')
@@ -275,9 +492,9 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         )
         
         return Response({
-            'total_prescriptions': total_prescriptions,
-            'active_prescriptions': active_prescriptions,
-            'expired_prescriptions': expired_prescriptions,
+            'total_prescriptions': counts['total'],
+            'active_prescriptions': counts['active'],
+            'expired_prescriptions': counts['expired'],
             'by_status': list(prescriptions_by_status),
             'by_priority': list(prescriptions_by_priority)
         })
@@ -302,14 +519,7 @@ class PrescriptionItemViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(prescription_id=prescription_id)
             
         # If user is not admin, filter based on role
-        if not self.request.user.userprofile.role == 'admin':
-            if self.request.user.userprofile.role == 'doctor':
-                queryset = queryset.filter(prescription__prescribed_by=self.request.user)
-            elif self.request.user.userprofile.role == 'pharmacist':
-                # Pharmacists can see items from active and pending prescriptions
-                queryset = queryset.filter(prescription__status__in=['active', 'pending'])
-                
-        return queryset
+        return queryset.filter(visible_to(self.request.user, prefix='prescription__'))
 
     def perform_create(self, serializer):
         print("Creating prescription item with data:", self.request.data)
@@ -383,142 +593,81 @@ class PrescriptionItemViewSet(viewsets.ModelViewSet):
         print(f"Prescription item updated: {instance.id}")
         return instance
 
+class MedicineCoverageViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Outstanding prescription demand per medicine against usable stock,
+    largest shortfall first. ?shortage=true returns only medicines whose
+    demand exceeds usable stock.
+    """
+    queryset = MedicineCoverage.objects.all()
+    serializer_class = MedicineCoverageSerializer
+    permission_classes = [permissions.IsAuthenticated, RoleBasedPermission]
+
+    role_permissions = {
+        'get': ['admin', 'pharmacist'],
+    }
+
+    def get_queryset(self):
+        queryset = MedicineCoverage.objects.select_related('medicine')
+        medicine_id = self.request.query_params.get('medicine_id')
+        shortage = self.request.query_params.get('shortage')
+        if medicine_id:
+            queryset = queryset.filter(medicine_id=medicine_id)
+        if shortage in ('1', 'true'):
+            queryset = queryset.filter(shortfall__gt=0)
+        return queryset.order_by('-shortfall', 'medicine_id')
+
+class AllocationPlanViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                            mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Expiry-aware batch allocation plans for outstanding refills, newest
+    first, each with its estimated waste against greedy FEFO. POST creates
+    a plan, for {"medicine_ids": [...]} or the whole catalogue.
+    """
+    queryset = AllocationPlan.objects.all()
+    serializer_class = AllocationPlanSerializer
+    # Plans are shared by all pharmacists, not only the one who created them
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrPharmacist]
+
+    def get_queryset(self):
+        return AllocationPlan.objects.order_by('-created_at', '-id')
+
+    def create(self, request):
+        medicine_ids = request.data.get('medicine_ids')
+        if medicine_ids is not None:
+            try:
+                if not isinstance(medicine_ids, list):
+                    raise TypeError
+                medicine_ids = [int(medicine_id) for medicine_id in medicine_ids]
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'medicine_ids must be a list of integers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        plan = create_plan(medicine_ids, user=request.user)
+        return Response(self.get_serializer(plan).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def lines(self, request, pk=None):
+        """
+        The plan's batch assignments, by due date. Lines of medicines planned
+        again since have superseded_by set to the later plan.
+        """
+        plan = self.get_object()
+        lines = plan.lines.select_related('item', 'batch').order_by('due_date', 'id')
+        medicine_id = request.query_params.get('medicine_id')
+        if medicine_id:
+            lines = lines.filter(medicine_id=medicine_id)
+        return Response(AllocationPlanLineSerializer(lines, many=True).data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_prescription(request):
     try:
-        # Get patient
-        patient_id = request.data.get('patient_id')
-        if not patient_id:
-            return Response(
-                {'error': 'Patient ID is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            
-        try:
-            patient = Patient.objects.get(id=patient_id)
-        except Patient.DoesNotExist:
-            return Response(
-                {'error': 'Patient not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-            
-        # Validate items and check stock
-        items_data = request.data.get('items', [])
-        if not items_data:
-            return Response(
-                {'error': 'At least one medication item is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            
-        # Check stock availability for all items
-        from inventory.models import Medicine
-        insufficient_stock = []
-        for item_data in items_data:
-            medicine_id = item_data.get('medicine_id')
-            quantity = item_data.get('quantity', 1)
-            
-            try:
-                medicine = Medicine.objects.get(id=medicine_id)
-                if medicine.quantity < quantity:
-                    insufficient_stock.append({
-                        'medicine': medicine.name,
-                        'required': quantity,
-                        'available': medicine.quantity
-                    })
-            except Medicine.DoesNotExist:
-                return Response(
-                    {'error': f'Medicine with ID {medicine_id} not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-                
-        if insufficient_stock:
-            return Response(
-                {
-                    'error': 'Insufficient stock for some medications',
-                    'details': insufficient_stock
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            
-        # Calculate expiry date (default to 30 days from now)
-        expiry_date = request.data.get('expiry_date')
-        if not expiry_date:
-            expiry_date = date.today() + timedelta(days=30)
-            
-        # Create prescription
-        prescription_data = {
-            'patient': patient,
-            'prescribed_by': request.user,
-            'staff_id': request.data.get('staff_id', ''),
-            'prescriber_contact': request.data.get('prescriber_contact', ''),
-            'status': request.data.get('status', 'active'),
-            'notes': request.data.get('notes', ''),
-            'special_instructions': request.data.get('special_instructions', ''),
-            'max_refills': request.data.get('max_refills', 0),
-            'expiry_date': expiry_date,
-            'priority': request.data.get('priority', 'medium')
-        }
-        
-        prescription = Prescription.objects.create(**prescription_data)
-        
-        # Add items
-        for item_data in items_data:
-            medicine_id = item_data.get('medicine_id')
-            medicine = Medicine.objects.get(id=medicine_id)
-            
-            PrescriptionItem.objects.create(
-                prescription=prescription,
-                medicine=medicine,
-                drug_name=medicine.name,  # Use medicine name as drug name
-                dosage=item_data.get('dosage', ''),
-                quantity=item_data.get('quantity', 1),
-                frequency=item_data.get('frequency', ''),
-                duration=item_data.get('duration', ''),
-                route=item_data.get('route', 'oral'),
-                special_instructions=item_data.get('special_instructions', '')
-            )
-            
-        # Create history entry
-        PrescriptionHistory.objects.create(
-            prescription=prescription,
-            action='created',
-            performed_by=request.user,
-            notes='Created via API'
-        )
-        
-        # Generate item details for response
-        item_details = []
-        for item in prescription.items.all():
-            item_details.append({
-                "id": item.id,
-                "medicine_id": item.medicine.id,
-                "medicine_name": item.medicine.name,
-                "drug_name": item.drug_name,
-                "dosage": item.dosage,
-                "quantity": item.quantity,
-                "frequency": item.frequency,
-                "duration": item.duration,
-                "route": item.route,
-                "special_instructions": item.special_instructions
-            })
-        
-        return Response({
-            "message": "Prescription created successfully", 
-            "id": prescription.id,
-            "patient": prescription.patient.name,
-            "patient_id": prescription.patient.id,
-            "status": prescription.status,
-            "staff_id": prescription.staff_id,
-            "prescriber_contact": prescription.prescriber_contact,
-            "date_prescribed": prescription.date_prescribed,
-            "expiry_date": prescription.expiry_date,
-            "priority": prescription.priority,
-            "notes": prescription.notes,
-            "special_instructions": prescription.special_instructions,
-            "items_count": prescription.items.count(),
-            "items": item_details
-        })
+        return Response(services.create_prescription(request.user, request.data))
+    except PrescriptionError as e:
+        return Response(e.as_response_data(), status=e.status_code)
     except Exception as e:
         print(f"Error creating prescription: {str(e)}")
         import traceback
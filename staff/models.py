@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Department(models.Model):
     name = models.CharField(max_length=100)
@@ -58,7 +59,7 @@ class StaffActivity(models.Model):
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     details = models.TextField()
     performed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.action} - {self.staff} on {self.timestamp}"
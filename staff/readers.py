@@ -0,0 +1,65 @@
+"""
+Read-only list serialisation for staff that bypasses ModelSerializer.
+Output matches StaffSerializer (checked in staff/tests.py).
+"""
+from inventory.readers import format_datetime, format_date, read_rows
+from .models import Staff
+
+STATUS_LABELS = dict(Staff.STATUS_CHOICES)
+
+
+def _staff_rows(queryset):
+    rows = queryset.values_list(
+        'id', 'user_id', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+        'staff_id', 'role', 'department_id', 'department__name', 'department__description',
+        'department__created_at', 'status', 'specialization', 'qualifications',
+        'years_of_experience', 'license_number', 'phone', 'address', 'emergency_contact',
+        'joining_date', 'created_at', 'updated_at'
+    )
+    staff = []
+    for (pk, user_id, username, email, first_name, last_name, staff_id, role,
+         department_id, department_name, department_description, department_created_at,
+         status, specialization, qualifications, years_of_experience, license_number,
+         phone, address, emergency_contact, joining_date, created_at, updated_at) in rows:
+        department = None
+        if department_id is not None:
+            department = {
+                'id': department_id,
+                'name': department_name,
+                'description': department_description,
+                'created_at': format_datetime(department_created_at),
+            }
+        staff.append({
+            'id': pk,
+            'user': {
+                'id': user_id,
+                'username': username,
+                'email': email,
+                'first_name': first_name,
+                'last_name': last_name,
+            },
+            'staff_id': staff_id,
+            'role': role,
+            'department': department,
+            'status': status,
+            'status_display': STATUS_LABELS.get(status, status),
+            'specialization': specialization,
+            'qualifications': qualifications,
+            'years_of_experience': years_of_experience,
+            'license_number': license_number,
+            'phone': phone,
+            'address': address,
+            'emergency_contact': emergency_contact,
+            'joining_date': format_date(joining_date),
+            'full_name': f"{first_name} {last_name}",
+            'created_at': format_datetime(created_at),
+            'updated_at': format_datetime(updated_at),
+        })
+    return staff
+
+
+def staff_rows(rows):
+    """
+    Fast equivalent of StaffSerializer(rows, many=True).data
+    """
+    return read_rows(Staff, rows, _staff_rows)
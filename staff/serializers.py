@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core import audit
 from django.contrib.auth.models import User
 from .models import Department, Staff, StaffActivity, Training, Achievement, Schedule
 
@@ -82,7 +83,8 @@ class StaffSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         staff = Staff.objects.create(**validated_data)
-        StaffActivity.objects.create(
+        audit.record(
+            StaffActivity,
             staff=staff,
             action='created',
             details='Staff member created',
@@ -101,7 +103,9 @@ class StaffSerializer(serializers.ModelSerializer):
         
         # Create activity entry if status changed
         if old_status != new_status:
-            StaffActivity.objects.create(
+            audit.record(
+                StaffActivity,
+                key=(instance.pk, 'status_changed'),
                 staff=instance,
                 action='status_changed',
                 details=f'Status changed from {old_status} to {new_status}',
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from .models import Department, Staff
+from .readers import staff_rows
+from .serializers import StaffSerializer
+
+
+class FastReaderParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Pharmacy')
+        Staff.objects.create(
+            user=User.objects.create_user('alice', first_name='Alice', last_name='Smith'),
+            staff_id='S00001', role='pharmacist', department=department,
+            qualifications=['PharmD'], phone='123', address='1 Main St',
+            emergency_contact={'name': 'Bob'}, joining_date=date(2020, 1, 1)
+        )
+        Staff.objects.create(
+            user=User.objects.create_user('carol'), staff_id='S00002', role='nurse',
+            status='on_leave', phone='456', address='2 Main St',
+            emergency_contact={}, joining_date=date(2021, 6, 1)
+        )
+
+    def test_staff_rows_match_serializer(self):
+        staff = Staff.objects.all()
+        self.assertEqual(staff_rows(staff), StaffSerializer(staff, many=True).data)
@@ -7,6 +7,10 @@ from .serializers import (
     TrainingSerializer, AchievementSerializer, ScheduleSerializer
 )
 from django.db.models import Q, Count
+from core import audit
+from core.readers import FastListMixin
+from core.streaming import StreamingListMixin
+from .readers import staff_rows
 import uuid
 
 class DepartmentViewSet(viewsets.ModelViewSet):
@@ -21,13 +25,14 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         serializer = StaffSerializer(staff, many=True)
         return Response(serializer.data)
 
-class StaffViewSet(viewsets.ModelViewSet):
+class StaffViewSet(FastListMixin, StreamingListMixin, viewsets.ModelViewSet):
     queryset = Staff.objects.all()
     serializer_class = StaffSerializer
+    list_reader = staticmethod(staff_rows)
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Staff.objects.all()
+        queryset = Staff.objects.select_related('user', 'department')
         search = self.request.query_params.get('search')
         role = self.request.query_params.get('role')
         department = self.request.query_params.get('department')
@@ -91,7 +96,9 @@ class StaffViewSet(viewsets.ModelViewSet):
         staff.save()
 
         # Create activity entry
-        StaffActivity.objects.create(
+        audit.record(
+            StaffActivity,
+            key=(staff.pk, 'status_changed'),
             staff=staff,
             action='status_changed',
             details=f'Status changed from {old_status} to {new_status}',